@@ -209,6 +209,8 @@ task MONITOR_STATE_DATA_BYTES();
                 `REG2   : cmd_data <= reg2;
                 `REG3   : cmd_data <= reg3;
                 `REG4   : cmd_data <= reg4;
+                // telemetry group, all sampled on this clock edge
+                `REG123 : cmd_data <= {reg127, reg126, reg125, reg124};
                 `REG124 : cmd_data <= reg124;
                 `REG125 : cmd_data <= reg125;
                 `REG126 : cmd_data <= reg126;
@@ -1,12 +1,14 @@
 # Imports ######################################################################
 from MonitorConfigUART import *
+from MonitorCapture import SerialCapture, capture_serial_class
 from MonitorTest import MonitorTest
 
 import serial
 from serial.tools import list_ports as serial_list_ports
+from serial.tools.list_ports_common import ListPortInfo
 
 from typing import List
-from time import time
+from time import perf_counter, sleep
 
 # Globals ######################################################################
 
@@ -37,8 +39,17 @@ class Monitor():
                             (Clear to Send) flow control.
             write_timeout : timeout for trying to write.
             read_timeout  : timeout for trying to read.
-        device_vid : vendor ID of the serial device.
-        device_pid : product ID of the serial device.
+        io_slice    : fixed port read timeout, reads repeat in slices until
+                      their deadline instead of reconfiguring the port.
+        device_vid  : vendor ID of the serial device.
+        device_pid  : product ID of the serial device.
+        device_port : explicit port to open instead of searching by vid:pid
+                      (e.g. a pseudo-terminal from MonitorFPGAEmulator).
+        uart_class  : serial.Serial compatible class used to open the port.
+        capture_path: file every byte read and written is captured to (see
+                      MonitorCapture), None to not capture.
+        cts_spin_time, cts_sleep_min, cts_sleep_max : 
+                      CTS wait strategy, see request_to_send.
     """
     # constants ################################################################
 
@@ -69,6 +80,60 @@ class Monitor():
         """
         pass
 
+    # wait statistics ##########################################################
+    class WaitStats():
+        """
+        Statistics of the time spent waiting on a flow control signal.
+
+        Attributes:
+            no_waits     : number of waits.
+            no_immediate : number of waits where the signal was already set.
+            no_sleeps    : number of backoff sleeps over all waits.
+            no_timeouts  : number of waits that timed out.
+            total_time   : total time waited in seconds.
+            max_time     : longest wait in seconds.
+        """
+        def __init__(self):
+            """
+            Initializes empty statistics.
+            """
+            self.reset()
+        def __str__(self)->str:
+            stats = f'waits={self.no_waits} immediate={self.no_immediate} '
+            stats += f'sleeps={self.no_sleeps} timeouts={self.no_timeouts} | '
+            stats += f'mean={1e3*self.mean_time():.3f}ms max={1e3*self.max_time:.3f}ms '
+            stats += f'total={self.total_time:.3f}s'
+            return stats
+        def reset(self):
+            """
+            Clear the statistics.
+            """
+            self.no_waits     = 0
+            self.no_immediate = 0
+            self.no_sleeps    = 0
+            self.no_timeouts  = 0
+            self.total_time   = 0.0
+            self.max_time     = 0.0
+        def add(self, wait_time:float, no_sleeps:int, timed_out:bool=False):
+            """
+            Record a wait.
+
+            :param wait_time: time waited in seconds.
+            :param no_sleeps: number of backoff sleeps during the wait.
+            :param timed_out: True if the wait timed out.
+            """
+            self.no_waits   += 1
+            self.no_sleeps  += no_sleeps
+            self.total_time += wait_time
+            self.max_time    = max(self.max_time, wait_time)
+            if (wait_time == 0): self.no_immediate += 1
+            if (timed_out): self.no_timeouts += 1
+        def mean_time(self)->float:
+            """
+            Returns the mean wait time in seconds.
+            """
+            return self.total_time / self.no_waits if (self.no_waits) else 0.0
+
     # constructor ##############################################################
     def __init__(self, config:ConfigUART):
         """
@@ -83,8 +148,15 @@ class Monitor():
         self.config = config
         # uart port
         self.port = None
+        # baud rate the port is opened at, follows a device switched to another rate
+        self.baudrate = config.baudrate
         # serial uart instance
         self.uart:serial.Serial = None
+        # time spent waiting for CTS
+        self.cts_stats = self.WaitStats()
+        # capture of the port bytes
+        self.capture:SerialCapture = None
+        if (config.capture_path is not None): self.start_capture(config.capture_path)
         # connect to a port for uart communication
         self.connect_uart()
 
@@ -95,8 +167,8 @@ class Monitor():
         monitor = ''
         if (self.uart):
             monitor += f'Monitor port=\'{self.port.description}\'\n'
-            monitor += f'   baud={self.config.baudrate} | databits={self.config.datasize} parity={self.config.parity} stopbits={self.config.stopbits} | rts_cts={self.config.rtscts}\n'
-            monitor += f'   timeouts: write={self.config.write_timeout} read={self.config.read_timeout}\n'
+            monitor += f'   baud={self.uart.baudrate} | databits={self.config.datasize} parity={self.config.parity} stopbits={self.config.stopbits} | rts_cts={self.config.rtscts}\n'
+            monitor += f'   timeouts: write={self.config.write_timeout} read={self.config.read_timeout} io_slice={self.config.io_slice}\n'
             monitor += f'   WARNING: ensure system OS device driver settings match\n'
         else:
             monitor += f'Monitor uart not created'
@@ -115,8 +187,11 @@ class Monitor():
         Connects to a port for uart communication
         """
         try:
-            self.assign_port(device_vid=self.config.device_vid, 
-                        device_pid=self.config.device_pid)
+            if (self.config.device_port is not None):
+                self.assign_port_device(self.config.device_port)
+            else:
+                self.assign_port(device_vid=self.config.device_vid, 
+                            device_pid=self.config.device_pid)
             self.create_uart()
         except self.PortAssignError:
             print("could not connect")
@@ -130,15 +205,17 @@ class Monitor():
         """
         if (self.uart is not None): 
             raise self.CreateUartError("Tried creating uart when already exists")
-        self.uart = serial.Serial(port=self.port.device,
-                                  baudrate=self.config.baudrate,
-                                  bytesize=self.config.datasize,
-                                  parity=self.config.parity,
-                                  stopbits=self.config.stopbits,
-                                  rtscts=self.config.rtscts,
-                                  timeout=self.config.read_timeout,
-                                  write_timeout=self.config.write_timeout
-                                  )
+        uart_class = capture_serial_class(self.config.uart_class)
+        self.uart = uart_class(port=self.port.device,
+                               baudrate=self.baudrate,
+                               bytesize=self.config.datasize,
+                               parity=self.config.parity,
+                               stopbits=self.config.stopbits,
+                               rtscts=self.config.rtscts,
+                               timeout=self.config.io_slice,
+                               write_timeout=self.config.write_timeout
+                               )
+        self.uart.capture = self.capture
         self.setRTS(False) # only reqest to send when want to write
     def close_uart(self):
         """
@@ -156,6 +233,27 @@ class Monitor():
         Returns True if the uart port is open for communication.
         """
         return self.uart.is_open if (self.uart is not None) else False
+    def start_capture(self, path:str)->SerialCapture:
+        """
+        Start capturing every byte read and written on the uart, also across
+        reconnects, to a capture file (see MonitorCapture). A capture
+        already running is stopped.
+
+        :param path: the capture file, overwritten if it exists.
+        :return: the capture.
+        """
+        if (self.capture is not None): self.stop_capture()
+        self.capture = SerialCapture(path)
+        if (self.uart is not None): self.uart.capture = self.capture
+        return self.capture
+    def stop_capture(self):
+        """
+        Stop capturing and close the capture file.
+        """
+        if (self.capture is None): return
+        if (self.uart is not None): self.uart.capture = None
+        self.capture.close()
+        self.capture = None
 
     # communication ############################################################
     # flow control I/O #########################################################
@@ -176,22 +274,66 @@ class Monitor():
         Reads the uart CTS (Clear to Send) status from the slave device.
         """
         return self.uart.getCTS()
-    def write_byte_uart_flow(self, data:bytes, timeout:float=None):
+    def request_to_send(self, timeout:float=None):
+        """
+        Assert RTS and block until the device is clear to send (CTS).
+        RTS is left asserted.
+
+        CTS is polled without sleeping for config.cts_spin_time so short
+        handshakes keep a low latency. After that the poll sleeps between
+        reads, doubling from config.cts_sleep_min up to config.cts_sleep_max,
+        so a busy device does not keep a core spinning. Wait times are
+        recorded in self.cts_stats.
+
+        :param timeout: None to block forever, 0 to check CTS once and instantly
+            return, or the time in seconds to block for.
+        :exceptions:
+            WriteUartFail: flow control timeout waiting for CTS from device.
+        """
+        # request to send data
+        self.setRTS(True)
+        # fast path, already cleared to send
+        if (self.readCTS()):
+            self.cts_stats.add(0.0, 0)
+            return
+        # wait until cleared to send data or timeout
+        tstart   = perf_counter()
+        deadline = tstart + timeout if (timeout is not None) else None
+        spin_end = tstart + self.config.cts_spin_time
+        delay    = self.config.cts_sleep_min
+        no_sleeps = 0
+        while (not self.readCTS()):
+            now = perf_counter()
+            if (deadline is not None and now >= deadline):
+                self.cts_stats.add(now - tstart, no_sleeps, timed_out=True)
+                raise self.WriteUartFail("Timed out before CTS low")
+            if (now < spin_end): continue
+            # back off
+            if (deadline is not None): delay = min(delay, deadline - now)
+            sleep(delay)
+            no_sleeps += 1
+            delay = min(2*delay, self.config.cts_sleep_max)
+        self.cts_stats.add(perf_counter() - tstart, no_sleeps)
+    def write_byte_uart_flow(self, data:bytes, timeout:float=None, deadline:float=None):
         """
         Write a byte to the uart with flow control. Blocks until data is written.
 
         :param data: the byte to write
         :param timeout: None to block forever, 0 to try to write and instantly
             return, or the time in seconds to block for.
+        :param deadline: transaction deadline from make_deadline, overrides
+            timeout for waiting on CTS.
         :exceptions:
             WriteUartFail: flow control timeout waiting for CTS from device.
             WriteUartFail: data failed to write.
         """
-        return self.write_uart(data, timeout=timeout, flow_control=True)
-    def write_bytes_uart_flow(self, data:bytes, timeout:float=None, big_endian:bool=True)->bool:
+        return self.write_uart(data, timeout=timeout, flow_control=True, deadline=deadline)
+    def write_bytes_uart_flow(self, data:bytes, timeout:float=None, 
+                                    big_endian:bool=True, block:bool=False,
+                                    deadline:float=None)->bool:
         """
-        Write a set of bytes to the uart with flow control one at a time. 
-        Blocks until data is written.
+        Write a set of bytes to the uart with flow control one at a time, or
+        all at once in block mode. Blocks until data is written.
 
         :param data: the bytes to write.
         :param timeout: None to block forever, 0 to try to write and instantly
@@ -200,14 +342,23 @@ class Monitor():
             e.g. if data = [\x00, \x01]
                 big_endian     : write in order \x00\x01
                 not big_endian : write in order \x01\x00
+        :param block: True to write all bytes with one RTS/CTS handshake and
+            one flush instead of a handshake and flush per byte.
+        :param deadline: transaction deadline from make_deadline, overrides
+            timeout for waiting on CTS.
         :exceptions:
             WriteUartFail: flow control timeout waiting for CTS from device.
             WriteUartFail: data failed to write.
         """
+        if (deadline is None): deadline = self.make_deadline(timeout)
+        if (block):
+            wbytes = data if (big_endian) else data[::-1]
+            self.write_uart(wbytes, timeout=timeout, flow_control=True, deadline=deadline)
+            return
         wbytes = self.bytes_to_bytelist(data)
         if (not big_endian): wbytes = wbytes[::-1] # reverse byte order
         for wbyte in wbytes:
-            self.write_uart(wbyte, timeout=timeout, flow_control=True)
+            self.write_uart(wbyte, timeout=timeout, flow_control=True, deadline=deadline)
         
     # base I/O #################################################################
     def flush_uart(self):
@@ -231,7 +382,8 @@ class Monitor():
         """
         self.flush_read_buffer_uart()
         self.flush_write_buffer_uart()
-    def write_uart(self, data:bytes, timeout:float=None, flow_control=False):
+    def write_uart(self, data:bytes, timeout:float=None, flow_control=False,
+                         deadline:float=None):
         """
         Write bytes to the uart. If timeout is set, the write attempt
         will only persist for timeout seconds.
@@ -240,22 +392,19 @@ class Monitor():
         :param timeout: None to block forever, 0 to try to write and instantly
             return, or the time in seconds to block for.
         :param flow_control: True if using flow control.
+        :param deadline: transaction deadline from make_deadline, overrides
+            timeout for waiting on CTS.
         :exceptions:
             WriteUartFail: flow control timeout waiting for CTS from device.
             WriteUartFail: data failed to write.
         """
         if (not data): raise ValueError("data is empty byte string")
-        # set timeout
-        self.uart.write_timeout = timeout
+        if (deadline is None): deadline = self.make_deadline(timeout)
+        # set timeout (only reconfigures the port if it changed)
+        self.set_write_timeout(timeout)
         if (flow_control):
-            # request to send data
-            self.setRTS(True)
-            # wait until cleared to send data or timeout
-            if (timeout): tstart = time()
-            while (not self.readCTS()):
-                if (timeout):
-                    dt = time() - tstart
-                    if (dt > timeout): raise self.WriteUartFail("Timed out before CTS low")
+            # request to send data and wait until cleared to send or timeout
+            self.request_to_send(self.time_left(deadline))
         # disable request to send
         if (flow_control): self.setRTS(False)
         # write to the uart
@@ -263,61 +412,122 @@ class Monitor():
         self.flush_uart()
         # success status
         if (bytes_written == 0): raise self.WriteUartFail("Failed to write bytes")
-    def read_uart(self, num_bytes:int, timeout:float=None)->bytes:
+    def read_uart(self, num_bytes:int, timeout:float=None, deadline:float=None)->bytes:
         """
         Read num_bytes from uart, blocking until read.
 
         :param num_bytes: number of bytes to read.
         :param timeout: None to block forever, 0 to try to read and instantly
             return, or the time in seconds to block for.
+        :param deadline: transaction deadline from make_deadline, overrides
+            timeout.
         :exceptions:
             ValueError   : num_bytes None or 0
             ReadUartFail : failed to read uart data
         """
         if (not num_bytes): raise ValueError("num_bytes None or 0")
-        # set timeout
-        self.uart.timeout = timeout
-        # read data
-        data = self.uart.read(size=num_bytes)
-        # check if read failed
-        if (isinstance(data, str)): 
-            raise self.ReadUartFail("Data read fail, got string not bytes")
-        return data
-    def read_uart_until(self, pattern:bytes, timeout:float=None, size=None):
+        if (deadline is None): deadline = self.make_deadline(timeout)
+        # read data in slices until all read or the deadline passes
+        data = bytearray()
+        while True:
+            self.set_read_timeout_slice(deadline)
+            chunk = self.uart.read(size=num_bytes - len(data))
+            # check if read failed
+            if (isinstance(chunk, str)): 
+                raise self.ReadUartFail("Data read fail, got string not bytes")
+            data += chunk
+            if (len(data) >= num_bytes or self.deadline_passed(deadline)): break
+        return bytes(data)
+    def read_uart_until(self, pattern:bytes, timeout:float=None, size=None,
+                              deadline:float=None):
         """
         Read from the uart until a bytestring pattern is found.
 
         :param pattern: a bytestring to read until (e.g. b'$abc').
         :param timeout: None to block forever, 0 to try to read and instantly
             return, or the time in seconds to block for.
+        :param size: maximum number of bytes to read.
+        :param deadline: transaction deadline from make_deadline, overrides
+            timeout.
         :exceptions:
             ReadUartFail : failed to read uart data
         """
-        # set timeout
-        self.uart.timeout = timeout
-        # read data
-        data = self.uart.read_until(pattern, size)
-        # check if read failed
-        if (isinstance(data, str)): 
-            raise self.ReadUartFail("Data read fail, got string not bytes")
-        return data
-    def read_uart_line(self, timeout:float=None):
+        if (deadline is None): deadline = self.make_deadline(timeout)
+        # read data in slices until the pattern, size or the deadline
+        data = bytearray()
+        while True:
+            self.set_read_timeout_slice(deadline)
+            chunk = self.uart.read_until(pattern, None if (size is None) else size - len(data))
+            # check if read failed
+            if (isinstance(chunk, str)): 
+                raise self.ReadUartFail("Data read fail, got string not bytes")
+            data += chunk
+            if (data.endswith(pattern)): break
+            if (size is not None and len(data) >= size): break
+            if (self.deadline_passed(deadline)): break
+        return bytes(data)
+    def read_uart_line(self, timeout:float=None, deadline:float=None):
         """
         Read from the uart until a newline is found.
 
         :param timeout: None to block forever, 0 to try to read and instantly
             return, or the time in seconds to block for.
+        :param deadline: transaction deadline from make_deadline, overrides
+            timeout.
         :exceptions:
             ReadUartFail : failed to read uart data
         """
-        # set timeout
-        self.uart.timeout = timeout
-        # read data
-        data = self.uart.readline()
-        # check if read failed
-        if (isinstance(data, str)): 
-            raise self.ReadUartFail("Data read fail, got string not bytes")
-        return data
+        return self.read_uart_until(b'\n', timeout, deadline=deadline)
+    # deadlines ################################################################
+    @staticmethod
+    def make_deadline(timeout:float=None)->float:
+        """
+        Converts a timeout into a deadline for a transaction made of several
+        I/O calls.
+
+        :param timeout: None to block forever, 0 to try to R/W and instantly
+            return, or the time in seconds to block for.
+        :return: the perf_counter() time of the deadline, None for no deadline.
+        """
+        return None if (timeout is None) else perf_counter() + timeout
+    @staticmethod
+    def time_left(deadline:float=None)->float:
+        """
+        Returns the time left in seconds before deadline (at least 0), None if
+        there is no deadline.
+        """
+        return None if (deadline is None) else max(0.0, deadline - perf_counter())
+    @staticmethod
+    def deadline_passed(deadline:float=None)->bool:
+        """
+        Returns True if deadline has passed.
+        """
+        return (deadline is not None) and (perf_counter() >= deadline)
+    def set_read_timeout_slice(self, deadline:float=None):
+        """
+        Sets the port read timeout for the next read towards deadline.
+
+        The port normally keeps the fixed config.io_slice timeout and reads are
+        repeated until their deadline, so the port is not reconfigured on every
+        call. It is only shortened when less than a slice is left.
+        """
+        left = self.time_left(deadline)
+        if (left is not None and left < self.config.io_slice):
+            self.set_read_timeout(left)
+        else:
+            self.set_read_timeout(self.config.io_slice)
+    def set_read_timeout(self, timeout:float=None):
+        """
+        Sets the port read timeout. Setting a pySerial timeout reconfigures the
+        port, so it is only done if the value changed.
+        """
+        if (self.uart.timeout != timeout): self.uart.timeout = timeout
+    def set_write_timeout(self, timeout:float=None):
+        """
+        Sets the port write timeout. Setting a pySerial timeout reconfigures
+        the port, so it is only done if the value changed.
+        """
+        if (self.uart.write_timeout != timeout): self.uart.write_timeout = timeout
     # ports ####################################################################
     def assign_port(self, device_vid:int, device_pid:int):
         """
@@ -334,6 +544,14 @@ class Monitor():
                 self.port = port
                 break
         else: raise self.PortAssignError("Port with device_vid and device_pid not found")
+    def assign_port_device(self, device:str):
+        """
+        Assign a serial port directly by its device name (e.g. '/dev/ttyUSB0'
+        or a pseudo-terminal) instead of searching by vendor/product ID.
+
+        :param device: the serial device name.
+        """
+        self.port = ListPortInfo(device, skip_link_detection=True)
     @classmethod
     def list_ports(cls):
         """
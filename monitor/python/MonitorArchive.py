@@ -0,0 +1,438 @@
+# Imports ######################################################################
+from MonitorFPGA import MonitorFPGA
+from MonitorTelemetry import TelemetrySample, TelemetryStore
+
+import os
+import json
+import struct
+import numpy as np
+
+from bisect import bisect_left
+from typing import Dict, List, NamedTuple, Tuple
+
+# Globals ######################################################################
+
+
+# Library ######################################################################
+class ChunkInfo(NamedTuple):
+    """
+    Header of an archive chunk, kept in the archive index.
+
+    Attributes:
+        offset  : file offset of the chunk header.
+        count   : number of samples.
+        t_first : timestamp of the first sample.
+        t_last  : timestamp of the last sample.
+        v_min   : smallest value.
+        v_max   : largest value.
+    """
+    offset  : int
+    count   : int
+    t_first : float
+    t_last  : float
+    v_min   : int
+    v_max   : int
+
+class TelemetryArchive():
+    """
+    Compressed archive of register series for long-term history.
+
+    The samples of each register are buffered and written in chunks of up to
+    chunk_size samples. A chunk is a CHUNK_STRUCT header followed by two
+    bit-packed arrays:
+        timestamps : microseconds, stored as the delta-of-delta of the
+                     timestamps after the first timestamp and first delta in
+                     the header. Regular sampling gives deltas-of-delta near
+                     zero, only the scheduling jitter takes bits.
+        values     : deltas of the values after the first value in the header.
+    Both are zigzag encoded and packed with the bit width of their largest
+    element. The header also holds the time range and the min/max of the
+    values, so a time range query only reads and decodes the chunks it
+    overlaps, and coarse min/max summaries need no decoding at all.
+
+    The index of the chunks is rebuilt from their headers when an archive is
+    opened. A chunk cut short by a crash is dropped (truncated when the
+    archive is opened to append). Buffered samples are only written by
+    flush() and close(), use a TelemetryRecorder for a crash-safe live log
+    and archive_recording() to archive it.
+
+    Usage:
+        with TelemetryArchive('telemetry.arc', TelemetryEngine.TELEMETRY) as archive:
+            engine.subscribe(archive.extend)
+            ...
+        archive = TelemetryArchive('telemetry.arc', readonly=True)
+        times, values = archive.query(MonitorFPGA.CMD_127, start, stop)
+
+    Attributes:
+        path       : the archive file.
+        names      : the registers (command names) archived.
+        dtypes     : NumPy dtype of each register's values by name.
+        chunk_size : maximum number of samples per chunk.
+        stats      : chunk and sample counters.
+    """
+    # constants ################################################################
+    MAGIC         = b'MONARC01'
+    # header: magic, description size, then the JSON description
+    HEADER_STRUCT = struct.Struct('<8sI')
+    # chunk: magic, register index, count, timestamp bits, value bits, payload
+    #        size, first and last timestamp (us), first delta (us), first, min
+    #        and max value (as int64)
+    CHUNK_MAGIC   = b'CHNK'
+    CHUNK_STRUCT  = struct.Struct('<4sHHBBxxIqqqqqq')
+    CHUNK_SIZE    = 4096
+    MAX_CHUNK_SIZE = 0xffff
+    TIME_SCALE    = 1000000 # timestamp units per second
+
+    # exceptions ###############################################################
+    class ArchiveFileError(Exception):
+        """
+        Raised if a file is not an archive or was archived with other
+        registers.
+        """
+        pass
+
+    # constructor ##############################################################
+    def __init__(self, path:str, names:List[str]=None, dtypes:Dict[str, str]=None,
+                       chunk_size:int=CHUNK_SIZE, readonly:bool=False):
+        """
+        Creates the archive file, or opens it to append (or read) if it exists.
+
+        :param path: the archive file.
+        :param names: the registers (command names) to archive, None to use
+            the names of an existing archive.
+        :param dtypes: NumPy dtype by name, defaults to
+            TelemetryStore.dtype_for_command().
+        :param chunk_size: maximum number of samples per chunk.
+        :param readonly: open an existing archive for queries only.
+        :raises:
+            ArchiveFileError: if the existing file is not an archive of the
+                same registers.
+            ValueError: if names is missing for a new archive or chunk_size
+                is out of range.
+        """
+        if (not 2 <= chunk_size <= self.MAX_CHUNK_SIZE): raise ValueError(f'Invalid chunk_size={chunk_size}')
+        if (dtypes is None): dtypes = {}
+        self.path       = path
+        self.chunk_size = chunk_size
+        self.readonly   = readonly
+        self.fd = os.open(path, os.O_RDONLY if (readonly) else (os.O_RDWR | os.O_CREAT), 0o644)
+        if (os.fstat(self.fd).st_size == 0 and not readonly):
+            if (names is None):
+                os.close(self.fd)
+                raise ValueError('names required for a new archive')
+            self.names  = list(names)
+            self.dtypes = {name: np.dtype(dtypes.get(name) or
+                                          TelemetryStore.dtype_for_command(MonitorFPGA.commands[name]))
+                           for name in self.names}
+            self.write_header()
+        else:
+            try: self.read_header()
+            except Exception:
+                os.close(self.fd)
+                raise
+            if (names is not None and list(names) != self.names):
+                os.close(self.fd)
+                raise self.ArchiveFileError(f'Archive has registers {self.names}, expected {list(names)}')
+        self.stats   = {'chunks': 0, 'samples': 0, 'bytes': 0, 'chunks_decoded': 0}
+        self.index:Dict[str, List[ChunkInfo]] = {name: [] for name in self.names}
+        self.t_firsts:Dict[str, List[int]] = {name: [] for name in self.names}
+        self.t_lasts:Dict[str, List[int]]  = {name: [] for name in self.names}
+        self.scan()
+        # samples not yet written by register
+        self.buffers:Dict[str, Tuple[List[int], List[int]]] = {name: ([], []) for name in self.names}
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+
+    # methods ##################################################################
+    # writing ##################################################################
+    def append(self, timestamp:float, values:Dict[str, int]):
+        """
+        Archive the registers read at a timestamp.
+
+        :param timestamp: time of the read, non-decreasing per register.
+        :param values: register values by name, other names are ignored.
+        """
+        t = round(timestamp * self.TIME_SCALE)
+        for name, value in values.items():
+            buffer = self.buffers.get(name)
+            if (buffer is None): continue
+            buffer[0].append(t)
+            buffer[1].append(value)
+            if (len(buffer[0]) >= self.chunk_size): self.write_chunk(name)
+    def extend(self, samples:List[TelemetrySample]):
+        """
+        Archive TelemetrySamples (e.g. a TelemetryEngine batch).
+        """
+        for sample in samples:
+            self.append(sample.timestamp, {sample.name: sample.value})
+    def extend_series(self, name:str, timestamps:np.ndarray, values:np.ndarray):
+        """
+        Archive a series of samples of one register.
+
+        :param name: the register (command name).
+        :param timestamps: times of the reads, non-decreasing.
+        :param values: the values read.
+        """
+        times, buffer = self.buffers[name]
+        times.extend(np.round(np.asarray(timestamps) * self.TIME_SCALE).astype(np.int64).tolist())
+        buffer.extend(np.asarray(values).tolist())
+        while (len(times) >= self.chunk_size): self.write_chunk(name)
+    def flush(self):
+        """
+        Write the buffered samples of every register as (partial) chunks.
+        """
+        for name in self.names:
+            if (self.buffers[name][0]): self.write_chunk(name)
+    def close(self):
+        """
+        Flush and close the archive.
+        """
+        if (self.fd is None): return
+        if (not self.readonly): self.flush()
+        os.close(self.fd)
+        self.fd = None
+
+    # reading ##################################################################
+    def chunks(self, name:str, start:float=None, stop:float=None)->List[ChunkInfo]:
+        """
+        Returns the headers of a register's chunks overlapping [start, stop).
+
+        :param name: the register (command name).
+        :param start: start time, None from the first chunk.
+        :param stop: end time, None to the last chunk.
+        """
+        first, last = self.chunk_range(name, start, stop)
+        return self.index[name][first:last]
+    def query(self, name:str, start:float=None, stop:float=None)->Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the samples of a register in [start, stop), only decoding the
+        chunks in the range. Buffered samples not yet flushed are not
+        included.
+
+        :param name: the register (command name).
+        :param start: start time, None from the first sample.
+        :param stop: end time, None to the last sample.
+        :return: (timestamps in seconds, values of the register dtype)
+        """
+        first, last = self.chunk_range(name, start, stop)
+        dtype = self.dtypes[name]
+        if (first >= last): return np.zeros(0), np.zeros(0, dtype=dtype)
+        decoded = [self.read_chunk(name, chunk) for chunk in self.index[name][first:last]]
+        times  = np.concatenate([t for t, _ in decoded])
+        values = np.concatenate([v for _, v in decoded])
+        # only the first and last chunk can hold samples out of the range
+        keep = np.ones(len(times), dtype=bool)
+        if (start is not None): keep &= times >= round(start * self.TIME_SCALE)
+        if (stop is not None):  keep &= times <  round(stop * self.TIME_SCALE)
+        return times[keep] / self.TIME_SCALE, values[keep].astype(dtype)
+    def __len__(self)->int:
+        """
+        Returns the number of archived samples of all registers.
+        """
+        return sum(chunk.count for chunks in self.index.values() for chunk in chunks)
+
+    # file #####################################################################
+    def write_header(self):
+        """
+        Write the header of an empty archive.
+        """
+        descr = json.dumps({'names': self.names,
+                            'dtypes': [self.dtypes[name].str for name in self.names]}).encode()
+        os.write(self.fd, self.HEADER_STRUCT.pack(self.MAGIC, len(descr)) + descr)
+        self.data_offset = self.HEADER_STRUCT.size + len(descr)
+    def read_header(self):
+        """
+        Read the header of an existing archive.
+
+        :raises:
+            ArchiveFileError: if the file is not an archive.
+        """
+        header = os.pread(self.fd, self.HEADER_STRUCT.size, 0)
+        if (len(header) < self.HEADER_STRUCT.size): raise self.ArchiveFileError('Archive header is truncated')
+        magic, descr_size = self.HEADER_STRUCT.unpack(header)
+        if (magic != self.MAGIC): raise self.ArchiveFileError('Not a telemetry archive')
+        descr = os.pread(self.fd, descr_size, self.HEADER_STRUCT.size)
+        if (len(descr) < descr_size): raise self.ArchiveFileError('Archive header is truncated')
+        descr = json.loads(descr)
+        self.names  = descr['names']
+        self.dtypes = {name: np.dtype(dtype) for name, dtype in zip(self.names, descr['dtypes'])}
+        self.data_offset = self.HEADER_STRUCT.size + descr_size
+    def scan(self):
+        """
+        Build the index from the chunk headers, dropping a truncated or
+        corrupt tail.
+        """
+        size, offset = os.fstat(self.fd).st_size, self.data_offset
+        while (offset + self.CHUNK_STRUCT.size <= size):
+            header = self.CHUNK_STRUCT.unpack(os.pread(self.fd, self.CHUNK_STRUCT.size, offset))
+            magic, series, count, _, _, payload_size = header[:6]
+            end = offset + self.CHUNK_STRUCT.size + payload_size
+            if (magic != self.CHUNK_MAGIC or series >= len(self.names) or end > size): break
+            self.add_to_index(self.names[series], offset, header)
+            offset = end
+        if (offset < size and not self.readonly): os.ftruncate(self.fd, offset)
+        self.end_offset = offset
+    def write_chunk(self, name:str):
+        """
+        Encode and write up to chunk_size buffered samples of a register as a
+        chunk.
+        """
+        times, values = self.buffers[name]
+        count = min(len(times), self.chunk_size)
+        header, payload = self.encode_chunk(self.names.index(name), self.dtypes[name],
+                                            np.array(times[:count], dtype=np.int64),
+                                            np.array(values[:count], dtype=self.dtypes[name]))
+        os.pwrite(self.fd, header + payload, self.end_offset)
+        self.add_to_index(name, self.end_offset, self.CHUNK_STRUCT.unpack(header))
+        self.end_offset += len(header) + len(payload)
+        self.stats['chunks'] += 1
+        self.stats['samples'] += count
+        self.stats['bytes'] += len(header) + len(payload)
+        del times[:count]
+        del values[:count]
+    def read_chunk(self, name:str, chunk:ChunkInfo)->Tuple[np.ndarray, np.ndarray]:
+        """
+        Read and decode a chunk.
+
+        :return: (timestamps in TIME_SCALE units, values as int64)
+        """
+        header = self.CHUNK_STRUCT.unpack(os.pread(self.fd, self.CHUNK_STRUCT.size, chunk.offset))
+        payload = os.pread(self.fd, header[5], chunk.offset + self.CHUNK_STRUCT.size)
+        self.stats['chunks_decoded'] += 1
+        return self.decode_chunk(header, payload)
+    def add_to_index(self, name:str, offset:int, header:tuple):
+        """
+        Add a chunk header to the index of its register.
+        """
+        _, _, count, _, _, _, t_first, t_last, _, _, v_min, v_max = header
+        v_min, v_max = np.array([v_min, v_max], dtype=np.int64).astype(self.dtypes[name]).tolist()
+        self.index[name].append(ChunkInfo(offset, count, t_first / self.TIME_SCALE,
+                                          t_last / self.TIME_SCALE, v_min, v_max))
+        self.t_firsts[name].append(t_first)
+        self.t_lasts[name].append(t_last)
+    def chunk_range(self, name:str, start:float=None, stop:float=None)->Tuple[int, int]:
+        """
+        Returns the index range [first, last) of a register's chunks
+        overlapping [start, stop).
+        """
+        first = 0 if (start is None) else bisect_left(self.t_lasts[name], round(start * self.TIME_SCALE))
+        last  = len(self.index[name]) if (stop is None) else \
+                bisect_left(self.t_firsts[name], round(stop * self.TIME_SCALE))
+        return first, last
+
+    # helper methods ###########################################################
+    @classmethod
+    def encode_chunk(cls, series:int, dtype:np.dtype, times:np.ndarray,
+                          values:np.ndarray)->Tuple[bytes, bytes]:
+        """
+        Encodes samples as a chunk.
+
+        :param series: index of the register in the archive.
+        :param dtype: dtype of the values.
+        :param times: int64 timestamps in TIME_SCALE units.
+        :param values: the values.
+        :return: (header, payload)
+        """
+        count = len(times)
+        deltas = np.diff(times)
+        first_delta = int(deltas[0]) if (count > 1) else 0
+        time_bits, time_data = cls.pack_bits(cls.zigzag(np.diff(deltas)))
+        v = values.astype(np.int64)
+        # wrapping int64 deltas are exact for 64 bit unsigned values too
+        value_bits, value_data = cls.pack_bits(cls.zigzag(np.diff(v)))
+        v_min, v_max = np.array([values.min(), values.max()], dtype=dtype).astype(np.int64).tolist()
+        header = cls.CHUNK_STRUCT.pack(cls.CHUNK_MAGIC, series, count, time_bits, value_bits,
+                                       len(time_data) + len(value_data), int(times[0]), int(times[-1]),
+                                       first_delta, int(v[0]), v_min, v_max)
+        return header, time_data + value_data
+    @classmethod
+    def decode_chunk(cls, header:tuple, payload:bytes)->Tuple[np.ndarray, np.ndarray]:
+        """
+        Decodes a chunk.
+
+        :param header: the unpacked CHUNK_STRUCT.
+        :param payload: the packed timestamps and values.
+        :return: (timestamps in TIME_SCALE units, values as int64)
+        """
+        _, _, count, time_bits, value_bits, _, t_first, _, first_delta, v_first, _, _ = header
+        no_dods = max(0, count - 2)
+        time_size = (no_dods * time_bits + 7) // 8
+        dods = cls.unzigzag(cls.unpack_bits(payload[:time_size], no_dods, time_bits))
+        deltas = np.cumsum(np.concatenate(([first_delta], dods)))[:count - 1]
+        times = np.concatenate(([0], np.cumsum(deltas))) + t_first
+        value_deltas = cls.unzigzag(cls.unpack_bits(payload[time_size:], count - 1, value_bits))
+        values = np.concatenate(([v_first], value_deltas)).cumsum()
+        return times[:count], values
+    @staticmethod
+    def zigzag(x:np.ndarray)->np.ndarray:
+        """
+        Maps int64 to uint64 so small magnitudes get small codes:
+        0, -1, 1, -2, ... -> 0, 1, 2, 3, ...
+        """
+        x = x.astype(np.int64)
+        return ((x << 1) ^ (x >> 63)).view(np.uint64)
+    @staticmethod
+    def unzigzag(u:np.ndarray)->np.ndarray:
+        """
+        Inverse of zigzag().
+        """
+        return ((u >> np.uint64(1)) ^ (np.uint64(0) - (u & np.uint64(1)))).view(np.int64)
+    @staticmethod
+    def pack_bits(u:np.ndarray)->Tuple[int, bytes]:
+        """
+        Packs uint64 codes with the bit width of the largest one.
+
+        :return: (bit width, packed bytes)
+        """
+        if (len(u) == 0): return 0, b''
+        width = int(u.max()).bit_length()
+        if (width == 0): return 0, b''
+        bits = (u[:, None] >> np.arange(width, dtype=np.uint64)) & np.uint64(1)
+        return width, np.packbits(bits.astype(np.uint8), bitorder='little').tobytes()
+    @staticmethod
+    def unpack_bits(data:bytes, count:int, width:int)->np.ndarray:
+        """
+        Unpacks count uint64 codes of width bits.
+        """
+        if (width == 0): return np.zeros(count, dtype=np.uint64)
+        bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), count=count*width, bitorder='little')
+        bits = bits.reshape(count, width).astype(np.uint64)
+        return (bits << np.arange(width, dtype=np.uint64)).sum(axis=1, dtype=np.uint64)
+
+def archive_recording(recording_path:str, archive_path:str,
+                      chunk_size:int=TelemetryArchive.CHUNK_SIZE)->TelemetryArchive:
+    """
+    Archives the registers read in a TelemetryRecorder recording (the values
+    carried over in records where a register was not read are skipped).
+
+    :param recording_path: the recording file.
+    :param archive_path: the archive file to create.
+    :param chunk_size: maximum number of samples per chunk.
+    :return: the closed archive.
+    """
+    from MonitorRecorder import load_recording
+    records = load_recording(recording_path)
+    names = [name for name in records.dtype.names if (name not in ('timestamp', 'mask'))]
+    dtypes = {name: records.dtype[name] for name in names}
+    archive = TelemetryArchive(archive_path, names, dtypes, chunk_size)
+    for i, name in enumerate(names):
+        read = (records['mask'] & np.uint64(1 << i)) != 0
+        archive.extend_series(name, records['timestamp'][read], records[name][read])
+    archive.close()
+    return archive
+
+
+# Main #########################################################################
+def main():
+    import tempfile
+    from MonitorTest import MonitorFPGATest
+
+    with tempfile.TemporaryDirectory() as directory:
+        mtester = MonitorFPGATest(MonitorFPGA())
+        mtester.test_telemetry_archive(directory)
+        mtester.benchmark_telemetry_archive(os.path.join(directory, 'benchmark.arc'))
+
+if __name__ == '__main__':
+    main()
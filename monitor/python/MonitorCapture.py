@@ -0,0 +1,353 @@
+# Imports ######################################################################
+from MonitorConfigUART import ConfigUART
+
+import struct
+import threading
+
+from serial.serialutil import SerialBase, Timeout, PortNotOpenError
+from functools import lru_cache
+from time import time, perf_counter, perf_counter_ns, sleep
+from typing import List, NamedTuple, Tuple
+
+# Globals ######################################################################
+
+
+# Library ######################################################################
+class CaptureEvent(NamedTuple):
+    """
+    Bytes read or written on a port.
+
+    Attributes:
+        time      : seconds since the capture started.
+        direction : SerialCapture.READ or SerialCapture.WRITE.
+        data      : the bytes.
+    """
+    time      : float
+    direction : int
+    data      : bytes
+
+class SerialCapture():
+    """
+    Writer of a capture file recording every byte read and written on a port
+    with microsecond timestamps.
+
+    The file is a header (MAGIC, time.time() of the start) followed by
+    events, each a 6 byte header and the data: the microseconds since the
+    previous event and the data length and direction, packed as
+    (length << 1 | direction). Longer gaps and data are split over several
+    events, so the overhead is 6 bytes per read or write call.
+
+    Usage:
+        with SerialCapture('port.cap') as capture:
+            capture.record(SerialCapture.READ, b'$GNGGA,...')
+        start_time, events = load_capture('port.cap')
+
+    Attributes:
+        path       : the capture file.
+        start_time : time.time() the capture started.
+        stats      : event and byte counters.
+    """
+    # constants ################################################################
+    MAGIC         = b'MONCAP01'
+    HEADER_STRUCT = struct.Struct('<8sd')
+    EVENT_STRUCT  = struct.Struct('<IH')
+    READ          = 0 # bytes read from the device
+    WRITE         = 1 # bytes written to the device
+    MAX_DELAY     = 0xffffffff  # us
+    MAX_SIZE      = 0xffff >> 1 # bytes
+
+    # exceptions ###############################################################
+    class CaptureFileError(Exception):
+        """
+        Raised if a file is not a capture.
+        """
+        pass
+
+    # constructor ##############################################################
+    def __init__(self, path:str):
+        """
+        Creates the capture file.
+
+        :param path: the capture file, overwritten if it exists.
+        """
+        self.path       = path
+        self.start_time = time()
+        self.start_us   = perf_counter_ns() // 1000
+        self.last_us    = self.start_us
+        self.lock       = threading.Lock()
+        self.stats      = {'events': 0, 'read_bytes': 0, 'write_bytes': 0}
+        self.file = open(path, 'wb')
+        self.file.write(self.HEADER_STRUCT.pack(self.MAGIC, self.start_time))
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+
+    # methods ##################################################################
+    def record(self, direction:int, data:bytes):
+        """
+        Record bytes read or written now.
+
+        :param direction: READ or WRITE.
+        :param data: the bytes.
+        """
+        now_us = perf_counter_ns() // 1000
+        with self.lock:
+            if (self.file is None): return
+            delay = now_us - self.last_us
+            self.last_us = now_us
+            while (delay > self.MAX_DELAY):
+                self.file.write(self.EVENT_STRUCT.pack(self.MAX_DELAY, direction))
+                delay -= self.MAX_DELAY
+            view = memoryview(data)
+            for start in range(0, len(view), self.MAX_SIZE):
+                chunk = view[start:start + self.MAX_SIZE]
+                self.file.write(self.EVENT_STRUCT.pack(delay, len(chunk) << 1 | direction))
+                self.file.write(chunk)
+                delay = 0
+            self.stats['events'] += 1
+            self.stats['write_bytes' if (direction == self.WRITE) else 'read_bytes'] += len(view)
+    def flush(self):
+        """
+        Flush the buffered events to the file.
+        """
+        with self.lock:
+            if (self.file is not None): self.file.flush()
+    def close(self):
+        """
+        Close the capture file.
+        """
+        with self.lock:
+            if (self.file is None): return
+            self.file.close()
+            self.file = None
+
+def load_capture(path:str)->Tuple[float, List[CaptureEvent]]:
+    """
+    Reads a capture file. A truncated last event (e.g. the capturing process
+    crashed) is ignored.
+
+    :param path: the capture file.
+    :raises:
+        CaptureFileError: if the file is not a capture.
+    :return: (time.time() the capture started, the events in order)
+    """
+    with open(path, 'rb') as file: data = file.read()
+    header, event = SerialCapture.HEADER_STRUCT, SerialCapture.EVENT_STRUCT
+    if (len(data) < header.size): raise SerialCapture.CaptureFileError('Capture header is truncated')
+    magic, start_time = header.unpack_from(data)
+    if (magic != SerialCapture.MAGIC): raise SerialCapture.CaptureFileError('Not a serial capture')
+    events, pos, time_us = [], header.size, 0
+    while (pos + event.size <= len(data)):
+        delay, size = event.unpack_from(data, pos)
+        pos += event.size
+        time_us += delay
+        size, direction = size >> 1, size & 1
+        if (pos + size > len(data)): break
+        if (size): events.append(CaptureEvent(time_us * 1e-6, direction, data[pos:pos + size]))
+        pos += size
+    return start_time, events
+
+class CaptureSerial():
+    """
+    Mixin for a serial.Serial compatible class that records the bytes read
+    and written to a SerialCapture while one is set. Monitor opens its ports
+    with capture_serial_class(config.uart_class).
+
+    read_until reads with read() so it is captured too.
+
+    Attributes:
+        capture : the SerialCapture, None to not capture.
+    """
+    capture:SerialCapture = None
+
+    def read(self, size:int=1)->bytes:
+        data = super().read(size)
+        if (data and self.capture is not None): self.capture.record(SerialCapture.READ, data)
+        return data
+    def write(self, data:bytes)->int:
+        written = super().write(data)
+        if (written and self.capture is not None):
+            self.capture.record(SerialCapture.WRITE, bytes(memoryview(data)[:written]))
+        return written
+
+@lru_cache(maxsize=None)
+def capture_serial_class(uart_class:type)->type:
+    """
+    Returns the CaptureSerial subclass of a serial.Serial compatible class.
+    """
+    return type(f'Capture{uart_class.__name__}', (CaptureSerial, uart_class), {})
+
+class ReplaySerial(SerialBase):
+    """
+    serial.Serial compatible transport replaying the bytes read in a capture
+    file, opened with the capture file as the port.
+
+    Reads return the captured bytes in the captured chunks, in real time
+    scaled by speed (2.0 is twice as fast) or as fast as possible if speed is
+    None. Writes are compared with the captured writes and counted in stats.
+    The modem lines are always ready and reset_input_buffer keeps the bytes,
+    as the capture only holds the bytes the host actually read. After the
+    last event the port stays silent.
+
+    A subclass bound to a speed is created by make_replay_config().
+
+    Attributes:
+        speed : replay speed, None for as fast as possible.
+        stats : replayed bytes and write mismatches.
+    """
+    speed:float = None
+
+    # port #####################################################################
+    def open(self):
+        """
+        Load the capture file named by port.
+        """
+        _, events = load_capture(self.portstr)
+        self.reads  = [(event.time, event.data) for event in events if (event.direction == SerialCapture.READ)]
+        self.writes = b''.join(event.data for event in events if (event.direction == SerialCapture.WRITE))
+        self.rewind()
+        self.is_open = True
+    def close(self):
+        self.is_open = False
+    def rewind(self):
+        """
+        Restart the replay from the start of the capture.
+        """
+        self.index  = 0 # next read event
+        self.offset = 0 # bytes taken from it
+        self.written = 0
+        self.stats  = {'read_bytes': 0, 'write_bytes': 0, 'write_mismatches': 0}
+        self.clock_start = perf_counter()
+    def at_end(self)->bool:
+        """
+        Returns True if all the captured bytes were read.
+        """
+        return self.index >= len(self.reads)
+    def _reconfigure_port(self, force_update=False):
+        pass
+    def _update_rts_state(self):
+        pass
+    def _update_dtr_state(self):
+        pass
+    @property
+    def cts(self)->bool:
+        return True
+    @property
+    def dsr(self)->bool:
+        return True
+    @property
+    def ri(self)->bool:
+        return False
+    @property
+    def cd(self)->bool:
+        return True
+
+    # I/O ######################################################################
+    @property
+    def in_waiting(self)->int:
+        """
+        Returns the number of bytes due up to the end of the current chunk.
+        """
+        if (self.index >= len(self.reads) or not self.is_due(self.index)): return 0
+        return len(self.reads[self.index][1]) - self.offset
+    def read(self, size:int=1)->bytes:
+        """
+        Read up to size bytes, blocking until they are due or the timeout.
+        """
+        if (not self.is_open): raise PortNotOpenError()
+        timeout = Timeout(self._timeout)
+        data = bytearray()
+        while (len(data) < size):
+            if (self.index < len(self.reads) and self.is_due(self.index)):
+                chunk = self.reads[self.index][1]
+                take = chunk[self.offset:self.offset + size - len(data)]
+                data += take
+                self.offset += len(take)
+                if (self.offset == len(chunk)): self.index, self.offset = self.index + 1, 0
+                continue
+            if (timeout.expired()): break
+            # wait for the next chunk or the timeout
+            wait = timeout.time_left() if (self._timeout is not None) else 1.0
+            if (self.index < len(self.reads)):
+                wait = min(wait, self.due_time(self.index) - perf_counter())
+            if (wait > 0): sleep(wait)
+        self.stats['read_bytes'] += len(data)
+        return bytes(data)
+    def write(self, data:bytes)->int:
+        """
+        Compare data with the captured writes, nothing is sent.
+        """
+        if (not self.is_open): raise PortNotOpenError()
+        data = bytes(data)
+        expected = self.writes[self.written:self.written + len(data)]
+        if (expected != data): self.stats['write_mismatches'] += 1
+        self.written += len(data)
+        self.stats['write_bytes'] += len(data)
+        return len(data)
+    def flush(self):
+        pass
+    def reset_input_buffer(self):
+        pass
+    def reset_output_buffer(self):
+        pass
+
+    # helper methods ###########################################################
+    def due_time(self, index:int)->float:
+        """
+        Returns the perf_counter() time read event index is due.
+        """
+        return self.clock_start + self.reads[index][0] / self.speed
+    def is_due(self, index:int)->bool:
+        """
+        Returns True if read event index can be read.
+        """
+        return self.speed is None or perf_counter() >= self.due_time(index)
+
+def make_replay_config(path:str, base:ConfigUART, speed:float=None)->ConfigUART:
+    """
+    Returns a uart config that replays a capture file through ReplaySerial.
+
+    :param path: the capture file.
+    :param base: config to inherit the uart settings from (e.g. ConfigFPGA).
+    :param speed: replay speed, 1.0 for real time, None for as fast as
+        possible.
+    """
+    replay_serial = type('ReplaySerial', (ReplaySerial,), {'speed': speed})
+    class ConfigReplay(base):
+        device_port  = path
+        uart_class   = replay_serial
+        capture_path = None
+    return ConfigReplay
+
+
+# Main #########################################################################
+def main():
+    import os
+    import tempfile
+    from MonitorFPGA import MonitorFPGA
+    from MonitorFPGAEmulator import FPGAEmulator
+    from MonitorGPSReceiver import MonitorGPSReceiver
+    from MonitorGPSReceiverEmulator import GPSReceiverEmulator
+    from MonitorTest import MonitorFPGATest, MonitorGPSReceiverTest
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'fpga.cap')
+        emulator = FPGAEmulator()
+        emulator.start()
+        mtester = MonitorFPGATest(MonitorFPGA(config=emulator.make_config()))
+        mtester.test_capture_replay(path)
+        mtester.monitor.close_uart()
+        emulator.stop()
+
+        path = os.path.join(directory, 'gps.cap')
+        emulator = GPSReceiverEmulator(epoch_period=0.05)
+        emulator.start()
+        mtester = MonitorGPSReceiverTest(MonitorGPSReceiver(config=emulator.make_config()))
+        mtester.test_capture_replay(path)
+        mtester.benchmark_replay_nmea(path)
+        mtester.monitor.close_uart()
+        emulator.stop()
+
+if __name__ == '__main__':
+    main()
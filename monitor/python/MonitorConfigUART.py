@@ -21,8 +21,16 @@ class ConfigUART():
     rtscts        = False
     write_timeout = TIMEOUT_BLOCKING
     read_timeout  = TIMEOUT_BLOCKING
+    io_slice      = 0.1  # fixed port read timeout, reads repeat until their deadline
     device_vid    = None
     device_pid    = None
+    device_port   = None          # explicit port (e.g. '/dev/pts/3'), skips vid:pid lookup
+    uart_class    = serial.Serial # serial implementation used to open the port
+    capture_path  = None          # file the port bytes are captured to, None to not capture
+    # CTS wait strategy: spin, then sleep with exponential backoff (seconds)
+    cts_spin_time = 0.0002 # time to poll CTS without sleeping
+    cts_sleep_min = 0.0001 # first backoff sleep
+    cts_sleep_max = 0.005  # backoff sleep cap
 
 class ConfigFPGA(ConfigUART):
     """
@@ -41,6 +49,8 @@ class ConfigGPSReceiver(ConfigUART):
     parity        = serial.PARITY_NONE
     device_vid    = 5446
     device_pid    = 425
+    ubx_port_id      = 3    # receiver port the host is connected to (1 UART1, 3 USB)
+    upgrade_baudrate = None # baud rate set at startup on a UART port, None keeps baudrate
 
 
 # Main #########################################################################
@@ -1,8 +1,10 @@
 # Imports ######################################################################
 from Monitor import Monitor
-from MonitorConfigUART import ConfigFPGA
+from MonitorConfigUART import ConfigUART, ConfigFPGA
 from MonitorTest import MonitorFPGATest
 
+from typing import List, Tuple
+
 
 # Globals ######################################################################
 
@@ -113,6 +115,11 @@ class MonitorFPGA(Monitor):
             if (len(write_bytes) != self.no_wbytes):
                 raise self.CommandByteError("write_bytes lenght != no_wbytes.")
             self.wbytes = write_bytes
+        def setReadBytes(self, read_bytes:bytes):
+            """
+            Set rbytes from the bytes read from the FPGA (in big endian order).
+            """
+            self.rbytes = read_bytes
         def setRW(self, rw:str):
             """
             Sets the command to write or read.
@@ -182,6 +189,58 @@ class MonitorFPGA(Monitor):
             """
             return self.convert_data(self.WRITE)
 
+    class GroupCommand(Command):
+        """
+        Read only command that returns several registers in one fixed layout
+        frame. The FPGA latches all the registers on the same clock edge, so
+        the values are one consistent sample.
+
+        The frame holds the members' bytes back-to-back in big endian order
+        (first member first), e.g. for members [reg127, reg126, reg125, reg124]
+            | reg127 (2) | reg126 (2) | reg125 (2) | reg124 (4) |
+
+        Attributes:
+            members : the commands of the registers in the frame, in order.
+        """
+        # constants ############################################################
+        GROUP = 'group'
+
+        # constructor ##########################################################
+        def __init__(self, cid:int, name:str, members:list):
+            """
+            Initializes a group command.
+
+            :param members: the commands of the registers in the frame.
+            """
+            no_rbytes = sum(member.no_rbytes for member in members)
+            super().__init__(cid=cid, name=name, no_rbytes=no_rbytes, 
+                             no_wbytes=0, read_only=True, data_type=self.GROUP)
+            self.members = members
+        def __str__(self):
+            cmd = f'{self.name} '
+            cmd += ' '.join(f'{member.name}={member.get_read_data()}' for member in self.members)
+            return cmd
+        # methods ##############################################################
+        def setReadBytes(self, read_bytes:bytes):
+            """
+            Set rbytes and split the frame into the members' rbytes.
+            """
+            self.rbytes = read_bytes
+            i = 0
+            for member in self.members:
+                member.setReadBytes(read_bytes[i:i+member.no_rbytes])
+                i += member.no_rbytes
+        def get_read_data(self)->dict:
+            """
+            Returns the members' read data by command name.
+            """
+            return {member.name:member.get_read_data() for member in self.members}
+        def get_write_data(self):
+            """
+            Group commands are read only.
+            """
+            return None
+
     # constants ################################################################
     # command names (reg<i>_<reg_name>)
     CMD_0   = 'reg0_n_reset'
@@ -189,6 +248,7 @@ class MonitorFPGA(Monitor):
     CMD_2   = 'reg2_'
     CMD_3   = 'reg3_'
     CMD_4   = 'reg4_'
+    CMD_123 = 'reg123_telemetry_group'
     CMD_124 = 'reg124_integral'
     CMD_125 = 'reg125_dac_out'
     CMD_126 = 'reg126_pid_out'
@@ -209,17 +269,21 @@ class MonitorFPGA(Monitor):
         CMD_127  : Command(cid=127, no_rwbytes=2, name=CMD_127, read_only=True, data_type=Command.SIGNED_INT),
         # CMD_x  : Command(cid=x, no_rwbytes=2, name=CMD_x, read_only=True),
     }
+    # group read of reg124-reg127 sampled on the same clock edge
+    commands[CMD_123] = GroupCommand(cid=123, name=CMD_123, members=[
+        commands[CMD_127], commands[CMD_126], commands[CMD_125], commands[CMD_124],
+    ])
     commands_by_id = {cmd.cid:cmd for cmd in commands.values()}
     
 
     # constructor ##############################################################
-    def __init__(self):
+    def __init__(self, config:ConfigUART=ConfigFPGA):
         """
         Initializes the monitor.
 
         :param config: configuration for the uart.
         """
-        Monitor.__init__(self, ConfigFPGA)
+        Monitor.__init__(self, config)
     
     # methods ##################################################################
     def execute_command(self, cmd:Command, rw:str, write_bytes:bytes=None, timeout:float=None):
@@ -230,31 +294,122 @@ class MonitorFPGA(Monitor):
         :param rw: Command.READ or Command.WRITE
         :param write_bytes: bytes to write if rw == Command.WRITE
         :param timeout: None to block forever, 0 to try to R/W for and instantly
-            return, or the time in seconds to block for.
+            return, or the time in seconds to block for (whole transaction).
         :post-conditions: 
             cmd.rbytes : has read data from FPGA if read command.
         """
-        # set command to read or write
-        cmd.setRW(rw)
-        if (cmd.rw == cmd.WRITE): cmd.setWriteBytes(write_bytes)
-        # check state
-        if (cmd.read_only and cmd.rw == cmd.WRITE):
-            raise self.ExecuteCommandError('Tried to write a read only command')
-        if (cmd.rw == cmd.WRITE and cmd.no_wbytes != len(cmd.wbytes)):
-            raise self.ExecuteCommandError('Length of wbytes != no_wbytes')
+        self.prepare_command(cmd, rw, write_bytes)
+        # the whole transaction shares one deadline
+        deadline = self.make_deadline(timeout)
         # flush r/w buffers
         self.flush_buffers_uart()
         # tell the FPGA what command
-        self.write_byte_uart_flow(cmd.cbyte, timeout)
+        self.write_byte_uart_flow(cmd.cbyte, timeout, deadline=deadline)
         # tell the FPGA how many bytes of data to R/W
         i_no_bytes = cmd.no_rbytes if (cmd.rw == cmd.READ) else cmd.no_wbytes
         no_bytes = cmd.rw_no_bytes(i_no_bytes)
-        self.write_byte_uart_flow(no_bytes, timeout)
+        self.write_byte_uart_flow(no_bytes, timeout, deadline=deadline)
         # read or write data
         if (cmd.rw == cmd.READ):
-            cmd.rbytes = self.read_uart(cmd.no_rbytes, timeout)[::-1]
+            cmd.setReadBytes(self.read_uart(cmd.no_rbytes, deadline=deadline)[::-1])
         elif (cmd.rw == cmd.WRITE):
-            self.write_bytes_uart_flow(cmd.wbytes, timeout, big_endian=False)
+            self.write_bytes_uart_flow(cmd.wbytes, timeout, big_endian=False, 
+                                       block=True, deadline=deadline)
+    def execute_commands(self, requests:List[Tuple], timeout:float=None)->List[Command]:
+        """
+        Executes several FPGA commands back-to-back.
+
+        The buffers are flushed and RTS/CTS handshaked once for the whole batch.
+        RTS stays asserted so the FPGA re-enters its read command state as soon
+        as each command finishes, and the frames of consecutive writes are sent
+        as one block. The FPGA cannot accept a command while it is sending a
+        reply, so each read's reply is read (demultiplexed by no_rbytes) before
+        the following commands are sent.
+
+        E.g. read the telemetry registers in one sweep
+            cmds = [(monitor.get_command(name), Command.READ) for name in names]
+            monitor.execute_commands(cmds)
+
+        :param requests: (cmd, rw) or (cmd, rw, write_bytes) tuples in order.
+        :param timeout: None to block forever, 0 to try to R/W for and instantly
+            return, or the time in seconds to block for (whole batch).
+        :exceptions:
+            WriteUartFail : flow control timeout waiting for CTS from device.
+            ReadUartFail  : a reply was not fully read before timeout.
+        :return: the executed commands in order.
+        :post-conditions: 
+            cmd.rbytes : has read data from FPGA for each read command.
+        """
+        # prepare every command and its frame up front (a command may appear
+        # more than once, e.g. written then read back)
+        cmds, frames = [], []
+        for request in requests:
+            cmd, rw = request[0], request[1]
+            write_bytes = request[2] if (len(request) > 2) else None
+            self.prepare_command(cmd, rw, write_bytes)
+            cmds.append(cmd)
+            frames.append((cmd, cmd.rw, self.command_frame(cmd)))
+        if (not cmds): return cmds
+        # flush r/w buffers and handshake once
+        deadline = self.make_deadline(timeout)
+        self.flush_buffers_uart()
+        self.request_to_send(self.time_left(deadline))
+        try:
+            pending = bytearray()
+            for cmd, rw, frame in frames:
+                pending += frame
+                if (rw == cmd.READ):
+                    # send everything up to this read and wait for its reply
+                    self.write_uart(bytes(pending), timeout, deadline=deadline)
+                    pending.clear()
+                    rbytes = self.read_uart(cmd.no_rbytes, deadline=deadline)
+                    if (len(rbytes) != cmd.no_rbytes):
+                        raise self.ReadUartFail(f'Timed out reading {cmd.name} reply')
+                    cmd.setReadBytes(rbytes[::-1])
+            # send trailing writes
+            if (pending): self.write_uart(bytes(pending), timeout, deadline=deadline)
+        finally:
+            self.setRTS(False)
+        return cmds
+    def read_telemetry(self, timeout:float=None)->GroupCommand:
+        """
+        Reads reg124-reg127 in one frame with the group read command.
+
+        :param timeout: None to block forever, 0 to try to R/W for and instantly
+            return, or the time in seconds to block for.
+        :return: the group command, its members hold the read data.
+        """
+        cmd = self.get_command(self.CMD_123)
+        self.execute_command(cmd, cmd.READ, timeout=timeout)
+        return cmd
+    def prepare_command(self, cmd:Command, rw:str, write_bytes:bytes=None):
+        """
+        Sets a command to read or write and checks that it can be executed.
+
+        :param cmd: the command to prepare.
+        :param rw: Command.READ or Command.WRITE
+        :param write_bytes: bytes to write if rw == Command.WRITE
+        :exceptions:
+            ExecuteCommandError: if writing a read only command.
+            ExecuteCommandError: if len(wbytes) != no_wbytes.
+        """
+        # set command to read or write
+        cmd.setRW(rw)
+        if (cmd.rw == cmd.WRITE): cmd.setWriteBytes(write_bytes)
+        # check state
+        if (cmd.read_only and cmd.rw == cmd.WRITE):
+            raise cmd.ExecuteCommandError('Tried to write a read only command')
+        if (cmd.rw == cmd.WRITE and cmd.no_wbytes != len(cmd.wbytes)):
+            raise cmd.ExecuteCommandError('Length of wbytes != no_wbytes')
+    def command_frame(self, cmd:Command)->bytes:
+        """
+        Returns the bytes sent to the FPGA to execute a prepared command:
+        the command byte, the number of data bytes and, for writes, the data
+        bytes in reverse order.
+        """
+        if (cmd.rw == cmd.READ):
+            return cmd.cbyte + cmd.rw_no_bytes(cmd.no_rbytes)
+        return cmd.cbyte + cmd.rw_no_bytes(cmd.no_wbytes) + cmd.wbytes[::-1]
     
     # utility helper methods ###################################################
     def get_command(self, name:str)->Command:
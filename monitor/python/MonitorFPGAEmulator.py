@@ -0,0 +1,383 @@
+# Imports ######################################################################
+from MonitorConfigUART import ConfigUART, ConfigFPGA
+
+import os
+import tty
+import select
+import threading
+import serial
+
+from time import perf_counter, sleep
+from typing import Dict
+
+# Globals ######################################################################
+
+
+# Library ######################################################################
+class EmulatorSerial(serial.Serial):
+    """
+    serial.Serial for a port served by an emulator (FPGAEmulator or
+    GPSReceiverEmulator).
+
+    A pseudo-terminal carries the data bytes but has no modem lines, so RTS
+    and CTS are routed to the emulator instead of the port's ioctls. A
+    subclass bound to an emulator is created by the emulator's make_config().
+
+    Attributes:
+        emulator : the emulator serving the port.
+    """
+    emulator = None
+
+    def _update_rts_state(self):
+        """
+        Forward the RTS state to the emulator.
+        """
+        self.emulator.set_rts(self._rts_state)
+    def _update_dtr_state(self):
+        """
+        DTR is unused by the FPGA.
+        """
+        pass
+    @property
+    def cts(self)->bool:
+        """
+        Read the CTS state from the emulator.
+        """
+        return self.emulator.get_cts()
+
+class FPGAEmulator():
+    """
+    Hardware-free stand-in for monitor_top.sv behind a pseudo-terminal.
+
+    Implements the same command protocol as the FPGA monitor state machine:
+        1. controller asserts RTS, emulator asserts CTS when idle.
+        2. controller sends the command byte (MSB = R/W bit, rest = cid).
+        3. controller sends the number of data bytes to R/W.
+        4. read  : emulator sends the register bytes LSB first.
+           write : controller sends the data bytes LSB first.
+        5. emulator returns to idle and releases CTS.
+
+    The emulator keeps the registers from uart_globals.svh (0-4 r/w,
+    124-127 read only and the 123 telemetry group). Read only registers model
+    FPGA inputs and are set with set_register().
+
+    Usage:
+        emulator = FPGAEmulator()
+        emulator.start()
+        monitor  = MonitorFPGA(config=emulator.make_config())
+        ...
+        emulator.stop()
+
+    Attributes:
+        realtime  : if True, bytes are paced at the uart wire time of baudrate.
+        cts_delay : time in seconds before CTS is granted (emulates a busy FPGA).
+        baudrate  : baud rate used for pacing.
+        registers : current register values by cid.
+        port_name : device name of the pty for the controller to open.
+        stats     : transaction and byte counters.
+    """
+    # constants ################################################################
+    # registers (cid : (bits, reset value, read only)) from uart_globals.svh
+    REGISTERS = {
+        0   : (1,  0x1,         False), # n_reset
+        1   : (8,  0xFF,        False),
+        2   : (16, 0xF1F2,      False),
+        3   : (24, 0x060708,    False),
+        4   : (32, 0xAABBCCDD,  False),
+        124 : (32, 0,           True),  # integral
+        125 : (16, 0,           True),  # DAC out
+        126 : (16, 0,           True),  # PID out
+        127 : (16, 0,           True),  # phase error
+    }
+    # group registers (cid : member cids, first member is most significant)
+    GROUP_REGISTERS = {
+        123 : (127, 126, 125, 124),     # telemetry group
+    }
+    MAX_CMD_PAYLOAD_BYTES = 10
+    # uart frame: 1 start bit, 8 data bits, 1 parity bit, 1 stop bit
+    BITS_PER_FRAME = 11
+    # monitor state machine states
+    STATE_IDLE       = 'idle'
+    STATE_READ_CMD   = 'read_cmd'
+    STATE_DATA_BYTES = 'data_bytes'
+    STATE_WRITE      = 'write'
+    STATE_READ       = 'read'
+    # polling period of the serving thread when no data arrives
+    POLL_PERIOD = 0.05
+    # realtime pacing spins instead of sleeping for the last SPIN_TIME seconds
+    SPIN_TIME = 0.0005
+
+    # exceptions ###############################################################
+    class EmulatorStateError(Exception):
+        """
+        Raised when the emulator is started or stopped in the wrong state.
+        """
+        pass
+
+    # constructor ##############################################################
+    def __init__(self, realtime:bool=False, baudrate:int=ConfigFPGA.baudrate,
+                       cts_delay:float=0.0):
+        """
+        Creates the pseudo-terminal and resets the registers.
+
+        :param realtime: True to pace bytes at the uart wire time.
+        :param baudrate: baud rate used for pacing.
+        :param cts_delay: time in seconds before CTS is granted.
+        """
+        self.realtime  = realtime
+        self.baudrate  = baudrate
+        self.cts_delay = cts_delay
+        self.cts_time  = 0.0 # time CTS is granted at
+        self.wire_free = 0.0 # time the emulated wire is next free
+        self.registers:Dict[int, int] = {}
+        # pseudo-terminal (slave end stays open so the master never sees EIO)
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)
+        self.port_name = os.ttyname(self.slave_fd)
+        # modem lines and state machine
+        self.lock   = threading.Lock()
+        self.thread:threading.Thread = None
+        self.running = threading.Event()
+        self.stats   = {'transactions': 0, 'reads': 0, 'writes': 0,
+                        'rx_bytes': 0, 'tx_bytes': 0}
+        self.reset()
+    def __str__(self)->str:
+        """
+        Returns a string representation of the emulator.
+        """
+        emulator = f'FPGAEmulator port=\'{self.port_name}\' realtime={self.realtime}\n'
+        emulator += f'   state={self.state} rts={self.rts} cts={self.cts}\n'
+        emulator += f'   stats={self.stats}\n'
+        return emulator
+
+    # methods ##################################################################
+    # control ##################################################################
+    def start(self):
+        """
+        Start serving the pseudo-terminal in a background thread.
+
+        :raises:
+            EmulatorStateError: if already started.
+        """
+        if (self.thread is not None):
+            raise self.EmulatorStateError("Tried starting emulator when already running")
+        self.running.set()
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+    def stop(self):
+        """
+        Stop serving and close the pseudo-terminal.
+
+        :raises:
+            EmulatorStateError: if not started.
+        """
+        if (self.thread is None):
+            raise self.EmulatorStateError("Tried stopping emulator when not running")
+        self.running.clear()
+        self.thread.join()
+        self.thread = None
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+    def reset(self):
+        """
+        Reset the state machine and registers (like the FPGA reset input).
+        """
+        with self.lock:
+            self.state     = self.STATE_IDLE
+            self.rts       = False
+            self.cts       = False
+            self.cmd_rw    = 0
+            self.cmd_id    = 0
+            self.data_size = 0
+            self.cmd_data  = 0
+            self.cmd_data_idx = 0
+            for cid, (bits, reset_value, read_only) in self.REGISTERS.items():
+                self.registers[cid] = reset_value
+    def make_config(self, base:ConfigUART=ConfigFPGA)->ConfigUART:
+        """
+        Returns a uart config that connects a Monitor to this emulator.
+
+        :param base: config to inherit the uart settings from.
+        """
+        emulator_serial = type('EmulatorSerial', (EmulatorSerial,), {'emulator': self})
+        class ConfigFPGAEmulator(base):
+            parity      = serial.PARITY_NONE # ptys reject parity settings
+            device_port = self.port_name
+            uart_class  = emulator_serial
+        return ConfigFPGAEmulator
+    def set_register(self, cid:int, value:int):
+        """
+        Set a register value, e.g. to drive the read only FPGA inputs.
+
+        :param cid: the register (command id).
+        :param value: the new value, truncated to the register width.
+        """
+        bits = self.REGISTERS[cid][0]
+        with self.lock:
+            self.registers[cid] = value & ((1 << bits) - 1)
+    def get_register(self, cid:int)->int:
+        """
+        Returns a register value.
+        """
+        return self.registers[cid]
+
+    # flow control #############################################################
+    def set_rts(self, request_to_send:bool):
+        """
+        Called when the controller changes RTS.
+        """
+        with self.lock:
+            self.rts = request_to_send
+            self.update_idle()
+    def get_cts(self)->bool:
+        """
+        Returns the CTS state seen by the controller.
+        """
+        return self.cts and (perf_counter() >= self.cts_time)
+    def update_idle(self):
+        """
+        MONITOR_STATE_IDLE: grant CTS when the controller requests to send.
+        Must hold self.lock.
+        """
+        if (self.state != self.STATE_IDLE): return
+        if (self.rts):
+            self.state    = self.STATE_READ_CMD
+            self.cts      = True
+            self.cts_time = perf_counter() + self.cts_delay
+        else:
+            self.cts   = False
+
+    # serving ##################################################################
+    def serve(self):
+        """
+        Serve the pseudo-terminal until stopped.
+        """
+        while (self.running.is_set()):
+            ready, _, _ = select.select([self.master_fd], [], [], self.POLL_PERIOD)
+            if (not ready): continue
+            try: data = os.read(self.master_fd, 4096)
+            except OSError: break
+            self.pace(len(data))
+            reply = bytearray()
+            for byte in data:
+                self.stats['rx_bytes'] += 1
+                reply += self.receive_byte(byte)
+            if (reply): self.transmit(bytes(reply))
+    def receive_byte(self, byte:int)->bytes:
+        """
+        Clock a received byte through the monitor state machine.
+
+        :param byte: the received byte.
+        :return: bytes to transmit back to the controller (read commands).
+        """
+        reply = b''
+        with self.lock:
+            if (self.state == self.STATE_READ_CMD):
+                # MONITOR_STATE_READ_CMD
+                self.cmd_rw = byte >> 7
+                self.cmd_id = byte & 0x7F
+                self.state  = self.STATE_DATA_BYTES
+            elif (self.state == self.STATE_DATA_BYTES):
+                # MONITOR_STATE_DATA_BYTES
+                self.data_size    = byte
+                self.cmd_data_idx = 0
+                if (self.cmd_rw):
+                    self.state    = self.STATE_WRITE
+                    self.cmd_data = 0
+                else:
+                    # MONITOR_STATE_READ sends the register LSB first
+                    self.cmd_data = self.read_register()
+                    reply = self.read_payload()
+                    self.stats['reads'] += 1
+                    self.finish_transaction()
+            elif (self.state == self.STATE_WRITE):
+                # MONITOR_STATE_WRITE receives the data LSB first
+                self.cmd_data |= byte << (8*self.cmd_data_idx)
+                self.cmd_data_idx += 1
+                if (self.cmd_data_idx >= self.data_size):
+                    self.write_register()
+                    self.stats['writes'] += 1
+                    self.finish_transaction()
+            # bytes received while idle are ignored like on the FPGA
+        return reply
+    def read_payload(self)->bytes:
+        """
+        Returns data_size bytes of cmd_data, LSB first. Must hold self.lock.
+        """
+        size = min(self.data_size, self.MAX_CMD_PAYLOAD_BYTES)
+        return int.to_bytes(self.cmd_data, self.MAX_CMD_PAYLOAD_BYTES, 'little')[:size]
+    def read_register(self)->int:
+        """
+        Returns the value of the addressed register, group registers are
+        concatenated in one step like the FPGA. Must hold self.lock.
+        """
+        if (self.cmd_id in self.GROUP_REGISTERS):
+            value = 0
+            for cid in self.GROUP_REGISTERS[self.cmd_id]:
+                value = (value << self.REGISTERS[cid][0]) | self.registers[cid]
+            return value
+        return self.registers.get(self.cmd_id, 0)
+    def write_register(self):
+        """
+        Latch cmd_data into the addressed r/w register. Must hold self.lock.
+        """
+        if (self.cmd_id not in self.REGISTERS): return
+        bits, reset_value, read_only = self.REGISTERS[self.cmd_id]
+        if (read_only): return
+        self.registers[self.cmd_id] = self.cmd_data & ((1 << bits) - 1)
+    def finish_transaction(self):
+        """
+        Return to MONITOR_STATE_IDLE. Must hold self.lock.
+        """
+        self.stats['transactions'] += 1
+        self.state = self.STATE_IDLE
+        self.update_idle()
+    def transmit(self, data:bytes):
+        """
+        Send bytes to the controller.
+        """
+        self.pace(len(data))
+        os.write(self.master_fd, data)
+        self.stats['tx_bytes'] += len(data)
+    def pace(self, no_bytes:int):
+        """
+        Wait for the wire time of no_bytes uart frames if emulating in realtime.
+        Short waits spin since sleep() overshoots by more than a frame.
+        """
+        if (not self.realtime): return
+        frame_time = self.BITS_PER_FRAME / self.baudrate
+        self.wire_free = max(self.wire_free, perf_counter()) + no_bytes*frame_time
+        delay = self.wire_free - perf_counter()
+        if (delay > self.SPIN_TIME): sleep(delay - self.SPIN_TIME)
+        while (perf_counter() < self.wire_free): pass
+
+
+# Main #########################################################################
+def main():
+    from MonitorFPGA import MonitorFPGA
+    from MonitorTest import MonitorFPGATest
+
+    emulator = FPGAEmulator(realtime=True)
+    emulator.set_register(124, -100000)
+    emulator.set_register(125, 32768)
+    emulator.set_register(126, -1234)
+    emulator.set_register(127, 42)
+    emulator.start()
+    monitor = MonitorFPGA(config=emulator.make_config())
+    print(monitor)
+    print(emulator)
+
+    mtester = MonitorFPGATest(monitor)
+    mtester.benchmark_execute_command(iterations=100)
+    mtester.benchmark_execute_commands(iterations=100)
+    mtester.benchmark_read_telemetry(iterations=100)
+    mtester.benchmark_write_payload(iterations=100)
+    emulator.cts_delay = 0.005
+    mtester.benchmark_cts_wait(iterations=100)
+
+    monitor.close_uart()
+    emulator.stop()
+    print(emulator)
+
+if __name__ == '__main__':
+    main()
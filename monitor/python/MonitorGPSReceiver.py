@@ -1,11 +1,15 @@
 # Imports ######################################################################
 from audioop import add
 from Monitor import Monitor
-from MonitorConfigUART import ConfigGPSReceiver
+from MonitorConfigUART import ConfigUART, ConfigGPSReceiver
+from MonitorNMEA import NMEADecoder
+from MonitorUBX import UBX_HEADER_SIZE, UBX_SYNC, UBXDecoder, ubx_checksum, ubx_frame_size
+from MonitorUBX import UBX_NMEA_MESSAGES, UBX_PORT_UART1, UBX_PORT_UART2
+from MonitorUBX import AckNak, ubx_cfg_msg, ubx_cfg_prt_uart, ubx_message
 from MonitorTest import MonitorGPSReceiverTest
 
-from time import time
-from typing import List
+from functools import lru_cache
+from typing import FrozenSet, Iterator, List, NamedTuple, Union
 
 import pynmea2
 from pynmea2 import NMEASentence
@@ -45,11 +49,20 @@ class MonitorGPSReceiver(Monitor):
             - $GNVTG,,T,,M,0.022,N,0.041,K,D*3D\r\n
             - $GNGGA,002448.00,5208.71026,N,10642.83221,W,2,12,0.55,501.4,M,-22.6,M,,0000*77\r\n
             - $GNGSA,A,3,03,19,06,12,02,14,17,24,44,51,,,1.00,0.55,0.83,1*06\r\n
+
+    UBX
+        The receiver can send UBX binary messages (see MonitorUBX) on the same
+        port as NMEA. Frames of both protocols are split from the stream by
+        GPSFrameSplitter, read with readGPSFrames and told apart by their
+        first byte.
     """
     # constants ################################################################
     NMEA_FRAME_START_SEQ = b'$'
     NMEA_FRAME_END_SEQ   = b'\n'
+    NMEA_MAX_FRAME_SIZE  = 256 # longer partial frames are dropped (spec max is 82)
     USE_NMEA_CHECKSUM    = True
+    UBX_FRAME_START_SEQ  = UBX_SYNC
+    UBX_MAX_FRAME_SIZE   = 2048 # NAV-SAT for all tracked satellites is < 1 KiB
 
     # talker ids
     TALKER_ID_GPS     = 'GP' # American
@@ -68,11 +81,24 @@ class MonitorGPSReceiver(Monitor):
     GGA = 'GGA' # Global Positioning System Fix Data
     GSV = 'GSV' # Satellites in view
     GLL = 'GLL' # Geographic position, latitude and longitude (and time)
+    RMC = 'RMC' # Recommended minimum data (with the UTC date)
     SENTENCE_TYPES = [
-        GSA, GGA, GSV, GLL
+        GSA, GGA, GSV, GLL, RMC
     ]
     # TODO Check what sentence types we want to display on GUI
 
+    # output rate of each message in navigation epochs (0 disables), sent to
+    # the receiver by configureOutput so it only outputs what is consumed,
+    # RMC is the only sentence with the UTC date (GNSSSnapshot.date)
+    OUTPUT_RATES = {
+        UBX_NMEA_MESSAGES['GGA'] : 1,
+        UBX_NMEA_MESSAGES['GLL'] : 1,
+        UBX_NMEA_MESSAGES['GSA'] : 1,
+        UBX_NMEA_MESSAGES['GSV'] : 1,
+        UBX_NMEA_MESSAGES['RMC'] : 1,
+        UBX_NMEA_MESSAGES['VTG'] : 0,
+    }
+
     # exceptions ###############################################################
     class ReadNMEAFrameError(Exception):
         """
@@ -84,15 +110,194 @@ class MonitorGPSReceiver(Monitor):
         Raised if parsing an NMEA frame fails.
         """
         pass
+    class ReadUBXFrameError(Exception):
+        """
+        Raised if reading a UBX frame fails.
+        """
+        pass
+    class ParseUBXFrameError(Exception):
+        """
+        Raised if parsing a UBX frame fails.
+        """
+        pass
+    class ConfigureReceiverError(Exception):
+        """
+        Raised if the receiver rejects or does not acknowledge a configuration.
+        """
+        pass
+
+    # frame splitter ###########################################################
+    class NMEAFrameSplitter():
+        """
+        Incremental splitter of a byte stream into NMEA frames.
+
+        Data read in bulk from the port is appended to a reusable buffer and
+        complete start..end frames are taken from it one at a time. Partial
+        frames are carried over to the next feed, bytes outside frames are
+        discarded, and frames that restart or grow past max_frame_size before
+        ending are dropped.
+
+        Attributes:
+            buffer         : received bytes not yet consumed.
+            pos            : index of the first unconsumed byte in buffer.
+            no_frames      : number of frames split.
+            no_dropped     : number of truncated or oversized frames dropped.
+        """
+        def __init__(self, start_seq:bytes, end_seq:bytes, max_frame_size:int):
+            """
+            :param start_seq: byte starting a frame (e.g. b'$').
+            :param end_seq: byte ending a frame (e.g. b'\\n').
+            :param max_frame_size: maximum frame length in bytes.
+            """
+            self.start_seq      = start_seq
+            self.end_seq        = end_seq
+            self.max_frame_size = max_frame_size
+            self.buffer         = bytearray()
+            self.pos            = 0
+            self.no_frames      = 0
+            self.no_dropped     = 0
+        def clear(self):
+            """
+            Discards buffered data, e.g. when the port is reopened.
+            """
+            self.buffer.clear()
+            self.pos = 0
+        def feed(self, data:bytes):
+            """
+            Appends data read from the port to the buffer.
+            """
+            if (self.pos):
+                del self.buffer[:self.pos]
+                self.pos = 0
+            self.buffer += data
+        def next_frame(self)->bytes:
+            """
+            Returns the next complete frame including its start and end
+            sequences, None if the buffer holds no complete frame.
+            """
+            buf = self.buffer
+            while True:
+                start = buf.find(self.start_seq, self.pos)
+                if (start < 0):
+                    # no frame started, discard the bytes
+                    self.pos = len(buf)
+                    return None
+                end = buf.find(self.end_seq, start)
+                if (end < 0):
+                    # partial frame, keep it for the next feed
+                    self.pos = start
+                    if (len(buf) - start <= self.max_frame_size): return None
+                    self.no_dropped += 1
+                    self.pos = start + 1
+                    continue
+                restart = buf.find(self.start_seq, start + 1, end)
+                if (restart >= 0 or end + 1 - start > self.max_frame_size):
+                    # truncated or oversized frame, resync on the next start
+                    self.no_dropped += 1
+                    self.pos = start + 1
+                    continue
+                self.pos = end + 1
+                self.no_frames += 1
+                return bytes(buf[start:end + 1])
+    class GPSFrameSplitter(NMEAFrameSplitter):
+        """
+        NMEAFrameSplitter that also splits UBX frames, demultiplexing a stream
+        of mixed NMEA and UBX output.
+
+        A UBX frame is sized from its length field and its checksum is checked,
+        so a sync pattern found in noise is dropped and the splitter resyncs.
+        NMEA frames interrupted by a UBX frame are dropped.
+
+        Attributes:
+            ubx_start_seq      : UBX sync bytes.
+            ubx_max_frame_size : maximum UBX frame length in bytes.
+        """
+        def __init__(self, start_seq:bytes, end_seq:bytes, max_frame_size:int,
+                           ubx_start_seq:bytes, ubx_max_frame_size:int):
+            """
+            :param start_seq: byte starting a NMEA frame (e.g. b'$').
+            :param end_seq: byte ending a NMEA frame (e.g. b'\\n').
+            :param max_frame_size: maximum NMEA frame length in bytes.
+            :param ubx_start_seq: UBX sync bytes (b'\\xb5\\x62').
+            :param ubx_max_frame_size: maximum UBX frame length in bytes.
+            """
+            super().__init__(start_seq, end_seq, max_frame_size)
+            self.ubx_start_seq      = ubx_start_seq
+            self.ubx_max_frame_size = ubx_max_frame_size
+        def next_frame(self)->bytes:
+            """
+            Returns the next complete NMEA or UBX frame, None if the buffer
+            holds no complete frame.
+            """
+            buf = self.buffer
+            while True:
+                nmea = buf.find(self.start_seq, self.pos)
+                ubx  = buf.find(self.ubx_start_seq, self.pos, len(buf) if (nmea < 0) else nmea)
+                if (ubx >= 0):
+                    frame = self.next_ubx_frame(ubx)
+                    if (frame is False): continue
+                    return frame
+                if (nmea < 0):
+                    # no frame started, discard the bytes but a partial sync
+                    self.pos = len(buf)
+                    if (buf.endswith(self.ubx_start_seq[:1])): self.pos -= 1
+                    return None
+                end = buf.find(self.end_seq, nmea)
+                ubx = buf.find(self.ubx_start_seq, nmea + 1, len(buf) if (end < 0) else end)
+                if (end < 0 and ubx < 0):
+                    # partial frame, keep it for the next feed
+                    self.pos = nmea
+                    if (len(buf) - nmea <= self.max_frame_size): return None
+                    self.no_dropped += 1
+                    self.pos = nmea + 1
+                    continue
+                restart = buf.find(self.start_seq, nmea + 1, end)
+                if (ubx >= 0 or restart >= 0 or end + 1 - nmea > self.max_frame_size):
+                    # truncated or oversized frame, resync on the next start
+                    self.no_dropped += 1
+                    self.pos = nmea + 1
+                    continue
+                self.pos = end + 1
+                self.no_frames += 1
+                return bytes(buf[nmea:end + 1])
+        def next_ubx_frame(self, start:int)->bytes:
+            """
+            Takes the UBX frame starting at start from the buffer.
+
+            :return: the frame, None if it is incomplete, False if it was
+                dropped.
+            """
+            buf = self.buffer
+            self.pos = start
+            if (len(buf) - start < UBX_HEADER_SIZE): return None
+            size = ubx_frame_size(buf[start:start + UBX_HEADER_SIZE])
+            if (size <= self.ubx_max_frame_size):
+                if (len(buf) - start < size): return None
+                frame = bytes(buf[start:start + size])
+                if (ubx_checksum(memoryview(frame)[2:-2]) == frame[-2:]):
+                    self.pos = start + size
+                    self.no_frames += 1
+                    return frame
+            # oversized or corrupt frame, resync after the sync bytes
+            self.no_dropped += 1
+            self.pos = start + 1
+            return False
 
     # constructor ##############################################################
-    def __init__(self):
+    def __init__(self, config:ConfigUART=ConfigGPSReceiver):
         """
         Initializes the monitor.
 
         :param config: configuration for the uart.
         """
-        Monitor.__init__(self, ConfigGPSReceiver)
+        Monitor.__init__(self, config)
+        self.frameSplitter = self.GPSFrameSplitter(self.NMEA_FRAME_START_SEQ,
+                                                   self.NMEA_FRAME_END_SEQ,
+                                                   self.NMEA_MAX_FRAME_SIZE,
+                                                   self.UBX_FRAME_START_SEQ,
+                                                   self.UBX_MAX_FRAME_SIZE)
+        self.nmeaDecoder   = NMEADecoder(check=self.USE_NMEA_CHECKSUM)
+        self.ubxDecoder    = UBXDecoder()
 
     # methods ##################################################################
     def sentenceToStr(self, sen:NMEASentence)->str:
@@ -102,8 +307,8 @@ class MonitorGPSReceiver(Monitor):
         if sen.sentence_type == self.GGA:
             strSentence += f'TIME: {sen.timestamp}, LAT: {sen.lat}'
             strSentence += f', NUM SATS: {sen.num_sats}, ALT: {sen.altitude}'
-        # elif sen.sentence_type == self.GSV:
-        #     strSentence += f'NUM SATS: {sen.num_sats}'
+        elif sen.sentence_type == self.GSV:
+            strSentence += f'MSG: {sen.msg_num}/{sen.num_messages}, NUM SATS: {sen.num_sv_in_view}'
         elif sen.sentence_type == self.GSA:
             strSentence += f'PDOP: {sen.pdop}, HDOP: {sen.hdop}, VDOP: {sen.vdop}'
         elif sen.sentence_type == self.GLL:
@@ -122,39 +327,51 @@ class MonitorGPSReceiver(Monitor):
         E.g. if talkers = [GP, GA] and sentence_types = [GSA]
             then sentence is returned if the sentence address is in
             [GPGSA, GAGSA]
+
+        The address is taken from the raw frame and checked against a cached
+        frozenset, other frames are dropped without being parsed.
+
+        :param talkers: talker ids to search for (e.g. TALKER_IDS)
+        :param sentence_types: sentence types to search for (e.g. SENTENCE_TYPES)
+        :param timeout: None to block forever, 0 to only check the frames
+            already received, or the time in seconds to block for.
+        :exceptions:
+            ReadNMEAFrameError  : if no matching frame was read before timeout.
+            ReadUartFail        : if failed to read the uart.
+            ParseNMEAFrameError : if failed to parse NMEA frame.
+        :return: sentence matching the search criteria.
         """
-        addresses = self.formAddresses(talkers, sentence_types)
-        tstart = time()
-        while True:
-            if (timeout):
-                dt = time() - tstart
-                if (dt > timeout): raise self.ReadNMEAFrameError(f'Timed out looking for match from {addresses}')
-            sentence = self.readNMEAFrame()
-            if (self.checkNMEAFrameInAddresses(sentence, addresses)):
-                return sentence
+        addresses = self.formAddressSet(tuple(talkers), tuple(sentence_types))
+        for frame in self.readNMEAFrames(timeout):
+            if (frame[1:6] in addresses):
+                return self.parseNMEAFrame(frame)
+        raise self.ReadNMEAFrameError(f'Timed out looking for match from {sorted(addresses)}')
     def readNMEAFrameSelect(self, talker:str=None, sentence_type:str=None, 
                                   timeout:float=None)->NMEASentence:
         """
         Read a particular frame of a particular sentence type. Behaves like
         readNMEAFrame if talker and sentence_type are None.
         
+        Frames are matched on the raw address bytes, other frames are dropped
+        without being parsed.
+
         :param talker: talker id to search for (e.g. TALKER_ID_BEIDOU)
         :param sentence_type: sentence type to search for (e.g. GSA)
-        :param timeout: None to block forever, 0 to try to read and instantly
-            return, or the time in seconds to block for.
+        :param timeout: None to block forever, 0 to only check the frames
+            already received, or the time in seconds to block for.
         :exceptions:
-            ReadUartFail        : if failed to read NMEA frame.
+            ReadNMEAFrameError  : if no matching frame was read before timeout.
+            ReadUartFail        : if failed to read the uart.
             ParseNMEAFrameError : if failed to parse NMEA frame.
         :return: sentence matching the search criteria.
         """
-        tstart = time()
-        while True:
-            if (timeout):
-                dt = time() - tstart
-                if (dt > timeout): raise self.ReadNMEAFrameError(f'Timed out looking for {talker}|{sentence_type} match')
-            sentence = self.readNMEAFrame()
-            if (self.checkNMEAFrameType(sentence, talker, sentence_type)):
-                return sentence
+        talker_id = talker.encode() if (talker) else None
+        type_id   = sentence_type.encode() if (sentence_type) else None
+        for frame in self.readNMEAFrames(timeout):
+            if (talker_id and frame[1:3] != talker_id): continue
+            if (type_id and frame[3:6] != type_id): continue
+            return self.parseNMEAFrame(frame)
+        raise self.ReadNMEAFrameError(f'Timed out looking for {talker}|{sentence_type} match')
     def readNMEAFrame(self, timeout:float=None)->NMEASentence:
         """
         Reads a NMEA frame from the receiver and parses it.
@@ -162,29 +379,224 @@ class MonitorGPSReceiver(Monitor):
         :param timeout: None to block forever, 0 to try to read and instantly
             return, or the time in seconds to block for.
         :exceptions:
-            ReadUartFail        : if failed to read NMEA frame.
+            ReadNMEAFrameError  : if no NMEA frame was read before timeout.
+            ReadUartFail        : if failed to read the uart.
             ParseNMEAFrameError : if failed to parse NMEA frame.
         :return: first sentence read.
         """
-        # wait until start of frame
-        preframe = self.read_uart_until(self.NMEA_FRAME_START_SEQ, timeout)
-        # read the frame
-        frame = self.read_uart_until(self.NMEA_FRAME_END_SEQ, timeout).decode()
+        frame = next(self.readNMEAFrames(timeout), None)
+        if (frame is None): raise self.ReadNMEAFrameError('Timed out reading NMEA frame')
         # parse the frame into a NMEA sentence
         sentence = self.parseNMEAFrame(frame)
         return sentence
+    def readNMEAFrames(self, timeout:float=None)->Iterator[bytes]:
+        """
+        Generator of raw NMEA frames (b'$...\\r\\n') read from the receiver.
+        UBX frames read meanwhile are skipped.
+
+        :param timeout: None to read forever, 0 to only take the frames already
+            received, or the time in seconds to read for.
+        :exceptions:
+            ReadUartFail : failed to read uart data
+        """
+        for frame in self.readGPSFrames(timeout):
+            if (frame[:1] == self.NMEA_FRAME_START_SEQ): yield frame
+    def readUBXFrames(self, timeout:float=None)->Iterator[bytes]:
+        """
+        Generator of raw UBX frames read from the receiver. NMEA frames read
+        meanwhile are skipped.
+
+        :param timeout: None to read forever, 0 to only take the frames already
+            received, or the time in seconds to read for.
+        :exceptions:
+            ReadUartFail : failed to read uart data
+        """
+        for frame in self.readGPSFrames(timeout):
+            if (frame[:2] == self.UBX_FRAME_START_SEQ): yield frame
+    def readGPSFrames(self, timeout:float=None)->Iterator[bytes]:
+        """
+        Generator of raw NMEA and UBX frames read from the receiver.
+
+        Reads whatever the OS buffer holds in one call and splits it with
+        frameSplitter, so frames are not read a byte at a time. Partial frames
+        are kept for the next read, also across generators.
+
+        :param timeout: None to read forever, 0 to only take the frames already
+            received, or the time in seconds to read for.
+        :exceptions:
+            ReadUartFail : failed to read uart data
+        """
+        deadline = self.make_deadline(timeout)
+        while True:
+            yield from iter(self.frameSplitter.next_frame, None)
+            # block for the first byte then take the rest of the OS buffer
+            self.set_read_timeout_slice(deadline)
+            data = self.uart.read(self.uart.in_waiting or 1)
+            if (isinstance(data, str)):
+                raise self.ReadUartFail("Data read fail, got string not bytes")
+            self.frameSplitter.feed(data)
+            if (self.deadline_passed(deadline)):
+                yield from iter(self.frameSplitter.next_frame, None)
+                return
+    def readUBXMessage(self, messages:List[bytes]=None, timeout:float=None)->NamedTuple:
+        """
+        Reads a UBX message from the receiver and decodes it.
+
+        :param messages: class and id bytes of the messages to read (e.g.
+            [UBXDecoder.NAV_PVT]), None for any message UBXDecoder decodes.
+        :param timeout: None to block forever, 0 to only check the frames
+            already received, or the time in seconds to block for.
+        :exceptions:
+            ReadUBXFrameError  : if no matching frame was read before timeout.
+            ReadUartFail       : if failed to read the uart.
+            ParseUBXFrameError : if failed to parse UBX frame.
+        :return: the decoded message (see MonitorUBX records).
+        """
+        if (messages is None): messages = self.ubxDecoder.decoders.keys()
+        for frame in self.readUBXFrames(timeout):
+            if (frame[2:4] in messages):
+                return self.parseUBXFrame(frame)
+        raise self.ReadUBXFrameError(f'Timed out looking for UBX message from {[m.hex() for m in messages]}')
+    def parseGPSFrame(self, frame:bytes)->Union[NMEASentence, NamedTuple]:
+        """
+        Parses a NMEA or UBX frame from readGPSFrames.
+
+        :exceptions:
+            ParseNMEAFrameError : if failed to parse NMEA frame.
+            ParseUBXFrameError  : if failed to parse UBX frame.
+        :return: NMEA sentence or UBX message, None for UBX messages that are
+            not decoded.
+        """
+        if (frame[:1] == self.NMEA_FRAME_START_SEQ): return self.parseNMEAFrame(frame)
+        return self.parseUBXFrame(frame)
+    def parseUBXFrame(self, frame:bytes)->NamedTuple:
+        """
+        Parses a UBX frame.
+
+        :param frame: the UBX frame to parse.
+        :return: the decoded message, None if the message is not decoded.
+        :exceptions:
+            ParseUBXFrameError: if failed to parse UBX frame.
+        """
+        try: return self.ubxDecoder.decode(frame)
+        except UBXDecoder.DecodeError as e:
+            raise self.ParseUBXFrameError(f'Failed parsing UBX frame {frame}: {e}')
     def parseNMEAFrame(self, frame:bytes)->NMEASentence:
         """
         Parses a NMEA frame.
 
+        SENTENCE_TYPES are decoded by nmeaDecoder into NMEARecords with
+        the same attributes as the pynmea2 sentences, other types by pynmea2.
+
         :param frame: the NMEA frame to parse.
-        :return: NMEASentence.
+        :return: NMEARecord or NMEASentence.
         :exceptions:
             ParseNMEAFrameError: if failed to parse NMEA frame.
         """
-        try: return pynmea2.parse(frame, check=self.USE_NMEA_CHECKSUM)
-        except ValueError: raise self.ParseNMEAFrameError(f'Failed parsing NMEA frame {frame}')
+        try:
+            sentence = self.nmeaDecoder.decode(frame)
+            if (sentence is None):
+                sentence = pynmea2.parse(frame.decode(), check=self.USE_NMEA_CHECKSUM)
+            return sentence
+        except (ValueError, NMEADecoder.DecodeError):
+            raise self.ParseNMEAFrameError(f'Failed parsing NMEA frame {frame}')
     
+    # receiver configuration ###################################################
+    def configureReceiver(self, rates:dict=None, baudrate:int=None, 
+                                timeout:float=1.0):
+        """
+        Configures the receiver output at startup: sets the message output rates
+        and optionally raises the baud rate.
+
+        :param rates: see configureOutput.
+        :param baudrate: see setBaudrate, None keeps the baud rate.
+        :param timeout: time in seconds to wait for each acknowledgement.
+        :exceptions:
+            ConfigureReceiverError : if the receiver rejects a configuration or
+                does not acknowledge it before timeout.
+        """
+        self.configureOutput(rates, timeout)
+        if (baudrate is not None and baudrate != self.uart.baudrate):
+            self.setBaudrate(baudrate, timeout)
+    def configureOutput(self, rates:dict=None, timeout:float=1.0):
+        """
+        Sets the output rate of messages on the port the host is connected to
+        with UBX-CFG-MSG, so the receiver does not send messages that are not
+        consumed.
+
+        :param rates: message class and id bytes -> output rate in navigation
+            epochs (0 disables), None for OUTPUT_RATES.
+        :param timeout: time in seconds to wait for each acknowledgement.
+        :exceptions:
+            ConfigureReceiverError : see configureUBX.
+        """
+        if (rates is None): rates = self.OUTPUT_RATES
+        for message, rate in rates.items():
+            self.configureUBX(ubx_cfg_msg(message, rate), timeout)
+    def setBaudrate(self, baudrate:int, timeout:float=1.0):
+        """
+        Sets the baud rate of the receiver UART port with UBX-CFG-PRT, switches
+        the host port to match and checks the link by polling the port
+        configuration at the new baud rate. The port is reopened at the new
+        baud rate after a reconnect.
+
+        The receiver may acknowledge CFG-PRT at either baud rate so the
+        acknowledgement is not waited for.
+
+        :param baudrate: the new baud rate.
+        :param timeout: time in seconds to wait for the poll response.
+        :exceptions:
+            ConfigureReceiverError : if the receiver port is not a UART or the
+                link does not work at the new baud rate.
+        """
+        port_id = self.config.ubx_port_id
+        if (port_id not in (UBX_PORT_UART1, UBX_PORT_UART2)):
+            raise self.ConfigureReceiverError(f'Receiver port {port_id} has no baud rate')
+        # write_uart waits until the frame is transmitted at the old baud rate
+        self.write_uart(ubx_cfg_prt_uart(port_id, baudrate), timeout)
+        # reconfigure the host port and drop what was received at the old rate
+        self.uart.baudrate = self.baudrate = baudrate
+        self.flush_read_buffer_uart()
+        self.frameSplitter.clear()
+        # check the link at the new baud rate
+        self.write_uart(ubx_message(UBXDecoder.CFG_PRT, bytes((port_id,))), timeout)
+        try: port = self.readUBXMessage([UBXDecoder.CFG_PRT], timeout)
+        except self.ReadUBXFrameError:
+            raise self.ConfigureReceiverError(f'No response from receiver at {baudrate} baud')
+        if (port.baudRate != baudrate):
+            raise self.ConfigureReceiverError(f'Receiver port at {port.baudRate} baud, expected {baudrate}')
+    def configureUBX(self, frame:bytes, timeout:float=1.0):
+        """
+        Sends a UBX-CFG frame and waits for the receiver to acknowledge it.
+
+        :param frame: the configuration frame (e.g. from ubx_cfg_msg).
+        :param timeout: time in seconds to wait for the acknowledgement.
+        :exceptions:
+            ConfigureReceiverError : if the receiver rejects the frame or does
+                not acknowledge it before timeout.
+        """
+        self.write_uart(frame, timeout)
+        message = frame[2:4]
+        try:
+            deadline = self.make_deadline(timeout)
+            while True:
+                ack = self.readUBXMessage([UBXDecoder.ACK_ACK, UBXDecoder.ACK_NAK], 
+                                          self.time_left(deadline))
+                if (ack.message != message): continue
+                if (isinstance(ack, AckNak)):
+                    raise self.ConfigureReceiverError(f'Receiver rejected {frame.hex()}')
+                return
+        except self.ReadUBXFrameError:
+            raise self.ConfigureReceiverError(f'Receiver did not acknowledge {frame.hex()}')
+
+    # port #####################################################################
+    def close_uart(self):
+        """
+        Closes the uart and discards any partial frame.
+        """
+        Monitor.close_uart(self)
+        self.frameSplitter.clear()
+
     # helper methods ###########################################################
     @staticmethod
     def formAddresses(talkers:List[str], sentence_types:List[str])->List[str]:
@@ -198,6 +610,15 @@ class MonitorGPSReceiver(Monitor):
                 addresses.append(address)
         return addresses
     @staticmethod
+    @lru_cache(maxsize=None)
+    def formAddressSet(talkers:tuple, sentence_types:tuple)->FrozenSet[bytes]:
+        """
+        Returns the frozenset of raw frame addresses (e.g. b'GPGSA') formed from
+        talkers and sentence_types. Cached, so repeated selects reuse the set.
+        """
+        addresses = MonitorGPSReceiver.formAddresses(talkers, sentence_types)
+        return frozenset(address.encode() for address in addresses)
+    @staticmethod
     def checkNMEAFrameInAddresses(sentence:NMEASentence, addresses:List[str])->bool:
         """
         Checks if the sentence's address is in addresses.
@@ -238,6 +659,7 @@ def main():
     # mtester.test_readNMEAFrame()
     # mtester.test_readNMEAFrameSelect()
     mtester.test_readNMEAFramesSelect()
+    # mtester.benchmark_read_nmea()
 
 if __name__ == '__main__':
     main()
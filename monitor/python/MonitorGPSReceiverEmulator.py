@@ -0,0 +1,277 @@
+# Imports ######################################################################
+from MonitorConfigUART import ConfigUART, ConfigGPSReceiver
+from MonitorFPGAEmulator import EmulatorSerial
+from MonitorGPSReceiver import MonitorGPSReceiver
+from MonitorTest import NMEA_RECORDING
+from MonitorUBX import UBX_NMEA_MESSAGES, UBX_PORT_UART1, UBX_UART_MODE_8N1, UBX_PROTO_UBX, UBX_PROTO_NMEA
+from MonitorUBX import UBXDecoder, ubx_message
+
+import os
+import tty
+import select
+import termios
+import threading
+
+from time import perf_counter
+from typing import Dict, List
+
+# Globals ######################################################################
+
+
+# Library ######################################################################
+class GPSReceiverEmulator():
+    """
+    Hardware-free stand-in for the U-blox receiver UART behind a
+    pseudo-terminal.
+
+    Every epoch_period the emulator outputs an epoch of NMEA frames (and
+    optional UBX frames), each message only if its output rate enables it for
+    that epoch. It answers the UBX configuration the monitor sends:
+        UBX-CFG-MSG : sets the output rate of a message, ACK-ACK.
+        UBX-CFG-PRT : sets the port baud rate after ACK-ACK, or answers a poll
+                      with the port configuration.
+        other CFG   : ACK-NAK.
+    Like on a real UART, output is lost while the host port baud rate (the
+    pty's termios speed) differs from the receiver's, or when the host does
+    not read it before the pty buffer is full. Input is always
+    received, a pty does not tell at which speed the host wrote it.
+
+    Usage:
+        emulator = GPSReceiverEmulator()
+        emulator.start()
+        monitor  = MonitorGPSReceiver(config=emulator.make_config())
+        ...
+        emulator.stop()
+
+    Attributes:
+        epoch_period : seconds between output epochs.
+        nmea_epoch   : NMEA frames output each epoch.
+        ubx_epoch    : UBX frames output each epoch.
+        rates        : output rate by message class and id bytes.
+        baudrate     : receiver port baud rate.
+        received     : UBX frames received from the host, in order.
+        port_name    : device name of the pty for the monitor to open.
+        stats        : epoch and byte counters.
+    """
+    # constants ################################################################
+    PORT_ID = UBX_PORT_UART1
+    # u-blox M8 default output
+    DEFAULT_RATES = {
+        UBX_NMEA_MESSAGES['GGA'] : 1,
+        UBX_NMEA_MESSAGES['GLL'] : 1,
+        UBX_NMEA_MESSAGES['GSA'] : 1,
+        UBX_NMEA_MESSAGES['GSV'] : 1,
+        UBX_NMEA_MESSAGES['RMC'] : 1,
+        UBX_NMEA_MESSAGES['VTG'] : 1,
+    }
+    # termios speed codes to baud rates
+    TERMIOS_BAUDRATES = {getattr(termios, f'B{baudrate}') : baudrate for baudrate in
+        (4800, 9600, 19200, 38400, 57600, 115200, 230400, 460800, 921600)}
+    # polling period of the serving thread when no data arrives
+    POLL_PERIOD = 0.05
+
+    # exceptions ###############################################################
+    class EmulatorStateError(Exception):
+        """
+        Raised when the emulator is started or stopped in the wrong state.
+        """
+        pass
+
+    # constructor ##############################################################
+    def __init__(self, epoch_period:float=1.0, nmea_epoch:List[bytes]=NMEA_RECORDING,
+                       ubx_epoch:List[bytes]=[],
+                       baudrate:int=ConfigGPSReceiver.baudrate):
+        """
+        Creates the pseudo-terminal with the receiver at its default output.
+
+        :param epoch_period: seconds between output epochs.
+        :param nmea_epoch: NMEA frames output each epoch.
+        :param ubx_epoch: UBX frames output each epoch, disabled until their
+            rate is set.
+        :param baudrate: receiver port baud rate.
+        """
+        self.epoch_period = epoch_period
+        self.nmea_epoch   = list(nmea_epoch)
+        self.ubx_epoch    = list(ubx_epoch)
+        self.rates:Dict[bytes, int] = dict(self.DEFAULT_RATES)
+        self.baudrate     = baudrate
+        self.received:List[bytes] = []
+        self.splitter = MonitorGPSReceiver.GPSFrameSplitter(
+            MonitorGPSReceiver.NMEA_FRAME_START_SEQ, MonitorGPSReceiver.NMEA_FRAME_END_SEQ,
+            MonitorGPSReceiver.NMEA_MAX_FRAME_SIZE, MonitorGPSReceiver.UBX_FRAME_START_SEQ,
+            MonitorGPSReceiver.UBX_MAX_FRAME_SIZE)
+        # pseudo-terminal (slave end stays open so the master never sees EIO)
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)
+        # like a UART, output the host does not read in time is lost
+        os.set_blocking(self.master_fd, False)
+        self.port_name = os.ttyname(self.slave_fd)
+        self.thread:threading.Thread = None
+        self.running = threading.Event()
+        self.stats   = {'epochs': 0, 'rx_bytes': 0, 'tx_bytes': 0, 'tx_lost': 0}
+    def __str__(self)->str:
+        """
+        Returns a string representation of the emulator.
+        """
+        emulator = f'GPSReceiverEmulator port=\'{self.port_name}\' baudrate={self.baudrate}\n'
+        emulator += f'   rates={ {message.hex(): rate for message, rate in self.rates.items()} }\n'
+        emulator += f'   stats={self.stats}\n'
+        return emulator
+
+    # methods ##################################################################
+    # control ##################################################################
+    def start(self):
+        """
+        Start serving the pseudo-terminal in a background thread.
+
+        :raises:
+            EmulatorStateError: if already started.
+        """
+        if (self.thread is not None):
+            raise self.EmulatorStateError("Tried starting emulator when already running")
+        self.running.set()
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+    def stop(self):
+        """
+        Stop serving and close the pseudo-terminal.
+
+        :raises:
+            EmulatorStateError: if not started.
+        """
+        if (self.thread is None):
+            raise self.EmulatorStateError("Tried stopping emulator when not running")
+        self.running.clear()
+        self.thread.join()
+        self.thread = None
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+    def make_config(self, base:ConfigUART=ConfigGPSReceiver)->ConfigUART:
+        """
+        Returns a uart config that connects a MonitorGPSReceiver to this
+        emulator.
+
+        :param base: config to inherit the uart settings from.
+        """
+        emulator_serial = type('EmulatorSerial', (EmulatorSerial,), {'emulator': self})
+        class ConfigGPSReceiverEmulator(base):
+            device_port = self.port_name
+            uart_class  = emulator_serial
+            ubx_port_id = self.PORT_ID
+        return ConfigGPSReceiverEmulator
+
+    # modem lines ##############################################################
+    def set_rts(self, request_to_send:bool):
+        """
+        The receiver UART has no flow control, RTS is ignored.
+        """
+        pass
+    def get_cts(self)->bool:
+        """
+        The receiver UART has no flow control, CTS is always set.
+        """
+        return True
+    def host_baudrate(self)->int:
+        """
+        Returns the baud rate the host set on its end of the pseudo-terminal.
+        """
+        speed = termios.tcgetattr(self.slave_fd)[5]
+        return self.TERMIOS_BAUDRATES.get(speed, speed)
+
+    # serving ##################################################################
+    def serve(self):
+        """
+        Serve the pseudo-terminal until stopped.
+        """
+        next_epoch = perf_counter()
+        while (self.running.is_set()):
+            wait = min(self.POLL_PERIOD, max(0.0, next_epoch - perf_counter()))
+            ready, _, _ = select.select([self.master_fd], [], [], wait)
+            if (ready):
+                try: data = os.read(self.master_fd, 4096)
+                except OSError: break
+                self.receive(data)
+            if (perf_counter() >= next_epoch):
+                self.output_epoch()
+                next_epoch += self.epoch_period
+    def receive(self, data:bytes):
+        """
+        Handle bytes received from the host.
+        """
+        self.stats['rx_bytes'] += len(data)
+        self.splitter.feed(data)
+        for frame in iter(self.splitter.next_frame, None):
+            if (frame[:2] == MonitorGPSReceiver.UBX_FRAME_START_SEQ):
+                self.received.append(frame)
+                self.receive_ubx(frame)
+    def receive_ubx(self, frame:bytes):
+        """
+        Answer a UBX frame received from the host.
+        """
+        message, payload = frame[2:4], frame[6:-2]
+        if (message == UBXDecoder.CFG_MSG and len(payload) in (3, 8)):
+            # rate on the current port or rates for all ports
+            rate = payload[2] if (len(payload) == 3) else payload[2 + self.PORT_ID]
+            self.rates[payload[:2]] = rate
+            self.transmit(ubx_message(UBXDecoder.ACK_ACK, message))
+        elif (message == UBXDecoder.CFG_PRT and len(payload) == 1):
+            # poll
+            protocols = UBX_PROTO_UBX | UBX_PROTO_NMEA
+            port = UBXDecoder.CFG_PRT_STRUCT.pack(self.PORT_ID, 0, UBX_UART_MODE_8N1,
+                                                  self.baudrate, protocols, protocols, 0)
+            self.transmit(ubx_message(UBXDecoder.CFG_PRT, port))
+        elif (message == UBXDecoder.CFG_PRT and len(payload) == UBXDecoder.CFG_PRT_STRUCT.size):
+            port_id, _, _, baudrate, _, _, _ = UBXDecoder.CFG_PRT_STRUCT.unpack(payload)
+            self.transmit(ubx_message(UBXDecoder.ACK_ACK, message))
+            if (port_id == self.PORT_ID): self.baudrate = baudrate
+        elif (message[:1] == UBXDecoder.CFG_MSG[:1]):
+            # other CFG class messages are not emulated
+            self.transmit(ubx_message(UBXDecoder.ACK_NAK, message))
+    def output_epoch(self):
+        """
+        Output the messages enabled for this epoch.
+        """
+        epoch = self.stats['epochs']
+        data = bytearray()
+        for frame in self.nmea_epoch:
+            rate = self.rates.get(UBX_NMEA_MESSAGES.get(frame[3:6].decode()), 0)
+            if (rate and epoch % rate == 0): data += frame
+        for frame in self.ubx_epoch:
+            rate = self.rates.get(frame[2:4], 0)
+            if (rate and epoch % rate == 0): data += frame
+        self.stats['epochs'] += 1
+        if (data): self.transmit(bytes(data))
+    def transmit(self, data:bytes):
+        """
+        Send bytes to the host, lost if the host is at another baud rate or
+        the pty buffer is full.
+        """
+        if (self.host_baudrate() != self.baudrate):
+            self.stats['tx_lost'] += len(data)
+            return
+        try: written = os.write(self.master_fd, data)
+        except BlockingIOError: written = 0
+        self.stats['tx_bytes'] += written
+        self.stats['tx_lost']  += len(data) - written
+
+
+# Main #########################################################################
+def main():
+    from MonitorTest import MonitorGPSReceiverTest
+
+    emulator = GPSReceiverEmulator(epoch_period=0.05)
+    emulator.start()
+    monitor = MonitorGPSReceiver(config=emulator.make_config())
+    print(monitor)
+    print(emulator)
+
+    mtester = MonitorGPSReceiverTest(monitor)
+    mtester.test_configure_receiver(emulator)
+    mtester.test_reconnect_upgraded(emulator)
+
+    monitor.close_uart()
+    emulator.stop()
+    print(emulator)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,756 @@
+# Imports ######################################################################
+from MonitorGPSReceiver import MonitorGPSReceiver
+from MonitorUBX import NavSat
+
+import datetime
+import threading
+import serial
+import numpy as np
+
+from time import time, sleep
+from typing import Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Tuple, Union
+
+# Globals ######################################################################
+
+
+# Library ######################################################################
+class GPSMessage(NamedTuple):
+    """
+    A timestamped decoded GPS message.
+
+    Attributes:
+        timestamp : time.time() the frame was read.
+        address   : NMEA address (e.g. 'GNGGA') or UBX class and id bytes.
+        message   : the NMEA sentence or UBX record.
+        frame     : the raw frame.
+    """
+    timestamp : float
+    address   : Union[str, bytes]
+    message   : object
+    frame     : bytes
+
+class SatelliteInfo(NamedTuple):
+    """
+    A satellite in view from a GSV group.
+
+    Attributes:
+        talker    : talker id of the constellation (e.g. 'GP').
+        prn       : satellite id.
+        elevation : elevation in degrees, None if unknown.
+        azimuth   : azimuth in degrees, None if unknown.
+        snr       : carrier to noise ratio in dB-Hz, None if not tracked.
+        signal_id : NMEA 4.10 signal id, '' if not reported.
+    """
+    talker    : str
+    prn       : int
+    elevation : int
+    azimuth   : int
+    snr       : int
+    signal_id : str
+
+class GNSSSnapshot(NamedTuple):
+    """
+    The receiver state at the end of a navigation epoch. Fields not reported
+    by the receiver are None.
+
+    Attributes:
+        timestamp   : time.time() the epoch completed.
+        time        : UTC time of the fix.
+        date        : UTC date of the fix (RMC only, output by
+                      MonitorGPSReceiver.OUTPUT_RATES).
+        fix_quality : GGA fix quality, 0 for no fix.
+        fix_type    : GSA fix type, 1 no fix, 2 2D, 3 3D.
+        latitude    : latitude in signed decimal degrees.
+        longitude   : longitude in signed decimal degrees.
+        altitude    : altitude above mean sea level in meters.
+        num_sats    : number of satellites used in the fix.
+        pdop        : position dilution of precision.
+        hdop        : horizontal dilution of precision.
+        vdop        : vertical dilution of precision.
+        used        : ids of the satellites used in the fix.
+        satellites  : satellites in view, by talker, signal and prn.
+    """
+    timestamp   : float
+    time        : datetime.time
+    date        : datetime.date
+    fix_quality : int
+    fix_type    : int
+    latitude    : float
+    longitude   : float
+    altitude    : float
+    num_sats    : int
+    pdop        : float
+    hdop        : float
+    vdop        : float
+    used        : FrozenSet[int]
+    satellites  : Tuple[SatelliteInfo, ...]
+
+class GNSSState():
+    """
+    Receiver state updated incrementally from decoded NMEA sentences.
+
+    Each sentence updates the fields it reports. GSV sentences are collected
+    per talker and signal until their group is complete, then replace that
+    group's satellites; incomplete or out of order groups are dropped.
+
+    A GNSSSnapshot is published when the epoch_end sentence is received, or
+    when a sentence with the time of a new epoch arrives before it (e.g. if
+    epoch_end is disabled), so consumers get one consistent update per
+    epoch.
+
+    Usage:
+        state = GNSSState()
+        state.subscribe(lambda snapshot: print(snapshot.hdop))
+        for frame in monitor.readNMEAFrames():
+            state.update(monitor.parseNMEAFrame(frame))
+
+    Attributes:
+        epoch_end : sentence type that ends an epoch.
+        snapshot  : the last published GNSSSnapshot, None before the first.
+        stats     : sentence, epoch and GSV group counters.
+    """
+    # constants ################################################################
+    EPOCH_END = 'GLL' # last sentence of the u-blox epoch output
+
+    # constructor ##############################################################
+    def __init__(self, epoch_end:str=EPOCH_END):
+        """
+        :param epoch_end: sentence type that ends an epoch.
+        """
+        self.epoch_end = epoch_end
+        self.snapshot:GNSSSnapshot = None
+        self.subscribers:List[Callable] = []
+        self.stats = {'sentences': 0, 'epochs': 0, 'gsv_groups': 0, 'gsv_dropped': 0}
+        # current epoch
+        self.fields = dict.fromkeys(GNSSSnapshot._fields)
+        self.used = set()
+        self.epoch_time:datetime.time = None
+        self.published = True
+        # satellites of the complete GSV groups and parts of the pending ones
+        self.satellites:Dict[Tuple[str, str], List[SatelliteInfo]] = {}
+        self.gsv_pending:Dict[Tuple[str, str], List[SatelliteInfo]] = {}
+        self.gsv_next:Dict[Tuple[str, str], int] = {}
+        self.handlers = {
+            'GGA' : self.update_gga,
+            'RMC' : self.update_rmc,
+            'GLL' : self.update_gll,
+            'GSA' : self.update_gsa,
+            'GSV' : self.update_gsv,
+        }
+
+    # methods ##################################################################
+    def subscribe(self, callback:Callable[[GNSSSnapshot], None]):
+        """
+        Subscribe to snapshots. callback is called with each GNSSSnapshot from
+        the thread calling update.
+        """
+        self.subscribers.append(callback)
+    def update(self, sentence, timestamp:float=None)->GNSSSnapshot:
+        """
+        Update the state from a decoded NMEA sentence (NMEARecord or pynmea2
+        sentence). Other sentence types and UBX messages are ignored.
+
+        :param sentence: the decoded sentence.
+        :param timestamp: time.time() the sentence was read, None for now.
+        :return: the snapshot if the sentence completed an epoch, else None.
+        """
+        handler = self.handlers.get(getattr(sentence, 'sentence_type', None))
+        if (handler is None): return None
+        if (timestamp is None): timestamp = time()
+        self.stats['sentences'] += 1
+        snapshot = handler(sentence, timestamp)
+        self.published = False
+        if (sentence.sentence_type == self.epoch_end):
+            snapshot = self.publish(timestamp)
+        return snapshot
+    def publish(self, timestamp:float)->GNSSSnapshot:
+        """
+        End the current epoch and publish its snapshot to the subscribers.
+        """
+        satellites = [satellite for key in sorted(self.satellites) 
+                      for satellite in self.satellites[key]]
+        self.fields.update(timestamp=timestamp, used=frozenset(self.used),
+                           satellites=tuple(satellites))
+        self.snapshot = GNSSSnapshot(**self.fields)
+        self.used.clear()
+        self.published = True
+        self.stats['epochs'] += 1
+        for callback in self.subscribers:
+            callback(self.snapshot)
+        return self.snapshot
+
+    # sentence handlers ########################################################
+    def update_time(self, fix_time:datetime.time, timestamp:float)->GNSSSnapshot:
+        """
+        Start a new epoch if fix_time is the time of a new epoch, publishing
+        the current one if it did not end with epoch_end.
+
+        :return: the published snapshot, else None.
+        """
+        if (not isinstance(fix_time, datetime.time) or fix_time == self.epoch_time):
+            return None
+        snapshot = None
+        if (not self.published and self.epoch_time is not None):
+            snapshot = self.publish(timestamp)
+        self.epoch_time = fix_time
+        self.fields['time'] = fix_time
+        return snapshot
+    def update_position(self, sentence):
+        """
+        Update the position from a sentence with lat/lon fields.
+        """
+        if (sentence.lat and sentence.lon):
+            self.fields['latitude']  = sentence.latitude
+            self.fields['longitude'] = sentence.longitude
+    def update_gga(self, sentence, timestamp:float)->GNSSSnapshot:
+        """
+        Update the time, position, fix quality and altitude from a GGA.
+        """
+        snapshot = self.update_time(sentence.timestamp, timestamp)
+        self.update_position(sentence)
+        self.fields['fix_quality'] = self.to_number(sentence.gps_qual, int)
+        self.fields['num_sats']    = self.to_number(sentence.num_sats, int)
+        self.fields['altitude']    = self.to_number(sentence.altitude, float)
+        return snapshot
+    def update_rmc(self, sentence, timestamp:float)->GNSSSnapshot:
+        """
+        Update the time, date and position from an RMC.
+        """
+        snapshot = self.update_time(sentence.timestamp, timestamp)
+        self.update_position(sentence)
+        if (isinstance(sentence.datestamp, datetime.date)):
+            self.fields['date'] = sentence.datestamp
+        return snapshot
+    def update_gll(self, sentence, timestamp:float)->GNSSSnapshot:
+        """
+        Update the time and position from a GLL.
+        """
+        snapshot = self.update_time(sentence.timestamp, timestamp)
+        self.update_position(sentence)
+        return snapshot
+    def update_gsa(self, sentence, timestamp:float)->GNSSSnapshot:
+        """
+        Update the fix type, DOPs and used satellites from a GSA. There is one
+        GSA per constellation, the DOPs are those of the combined fix.
+        """
+        self.fields['fix_type'] = self.to_number(sentence.mode_fix_type, int)
+        self.fields['pdop']     = self.to_number(sentence.pdop, float)
+        self.fields['hdop']     = self.to_number(sentence.hdop, float)
+        self.fields['vdop']     = self.to_number(sentence.vdop, float)
+        self.used.update(int(sv) for sv in sentence.data[2:14] if (sv.isdigit()))
+        return None
+    def update_gsv(self, sentence, timestamp:float)->GNSSSnapshot:
+        """
+        Add the satellites of a GSV to its group, replacing the group's
+        satellites when it is complete.
+        """
+        data = sentence.data
+        try:
+            num_messages, msg_num = int(data[0]), int(data[1])
+        except (ValueError, IndexError):
+            self.stats['gsv_dropped'] += 1
+            return None
+        # 4 fields per satellite after 3 header fields, then the signal id
+        no_sats = (len(data) - 3) // 4
+        signal_id = data[3 + 4*no_sats] if (len(data) > 3 + 4*no_sats) else ''
+        key = (sentence.talker, signal_id)
+        if (msg_num == 1):
+            if (key in self.gsv_pending): self.stats['gsv_dropped'] += 1
+            self.gsv_pending[key] = []
+        elif (self.gsv_next.get(key) != msg_num):
+            # missed a part, drop the group
+            if (self.gsv_pending.pop(key, None) is not None): self.stats['gsv_dropped'] += 1
+            self.gsv_next.pop(key, None)
+            return None
+        satellites = self.gsv_pending[key]
+        for i in range(3, 3 + 4*no_sats, 4):
+            prn = self.to_number(data[i], int)
+            if (prn is None): continue
+            satellites.append(SatelliteInfo(sentence.talker, prn, 
+                self.to_number(data[i+1], int), self.to_number(data[i+2], int),
+                self.to_number(data[i+3], int), signal_id))
+        if (msg_num >= num_messages):
+            self.satellites[key] = self.gsv_pending.pop(key)
+            self.gsv_next.pop(key, None)
+            self.stats['gsv_groups'] += 1
+        else:
+            self.gsv_next[key] = msg_num + 1
+        return None
+
+    # helper methods ###########################################################
+    @staticmethod
+    def to_number(value, convert:type):
+        """
+        Returns value converted by convert, None if empty or invalid.
+        """
+        if (value is None or value == ''): return None
+        try: return convert(value)
+        except (TypeError, ValueError): return None
+
+class SatelliteHistory():
+    """
+    Fixed capacity columnar history of the carrier to noise ratio (SNR) and
+    elevation of each satellite, for holdover diagnostics.
+
+    Each row is one epoch with a timestamp. Each satellite, keyed by
+    (talker id, NMEA prn), gets a column of a uint8 SNR array and an int8
+    elevation array the first time it is seen, so an hour of a full sky at
+    1 Hz takes under 2 MB. Satellites not tracked in a row read as NO_SNR
+    and NO_ELEVATION. Rows are written twice, at i and i + capacity like in
+    TelemetryStore, so the newest rows are always one contiguous slice and
+    queries run vectorized over views.
+
+    Rows come from GNSSSnapshots (GSV) or UBX-NAV-SAT messages, feed it from
+    one of the two so epochs are not recorded twice.
+
+    Usage:
+        history = SatelliteHistory(seconds=4*60*60, rate=1.0)
+        drain.state.subscribe(history.extend_snapshot)
+        snr = history.mean_snr(min_elevation=15, seconds=10*60)
+
+    Attributes:
+        capacity       : maximum number of rows kept.
+        max_satellites : maximum number of satellites kept.
+        index          : column of each satellite by (talker id, prn).
+        stats          : row and overflow counters.
+    """
+    # constants ################################################################
+    TIME_DTYPE      = np.float64
+    SNR_DTYPE       = np.uint8
+    ELEVATION_DTYPE = np.int8
+    NO_SNR          = 0    # not tracked
+    NO_ELEVATION    = -128 # unknown
+    MAX_SATELLITES  = 128
+    # UBX-NAV-SAT gnssId to NMEA talker id
+    NAV_SAT_TALKERS = {0: 'GP', 1: 'GP', 2: 'GA', 3: 'GB', 5: 'GQ', 6: 'GL'}
+
+    # constructor ##############################################################
+    def __init__(self, capacity:int=None, seconds:float=None, rate:float=None,
+                       max_satellites:int=MAX_SATELLITES):
+        """
+        Allocates the history.
+
+        :param capacity: number of rows (epochs) to keep, or
+        :param seconds: seconds of history to keep at rate rows per second.
+        :param rate: rows per second, used with seconds.
+        :param max_satellites: maximum number of satellites kept, others are
+            counted in stats['overflow'].
+        :raises:
+            ValueError: if neither capacity nor seconds and rate are given.
+        """
+        if (capacity is None):
+            if (seconds is None or rate is None):
+                raise ValueError("capacity or seconds and rate required")
+            capacity = int(np.ceil(seconds * rate))
+        if (capacity <= 0): raise ValueError(f'Invalid capacity={capacity}')
+        self.capacity       = capacity
+        self.max_satellites = max_satellites
+        self.size = 0 # number of rows stored
+        self.head = 0 # index of the oldest row
+        self.index:Dict[Tuple[str, int], int] = {}
+        self.time_col  = np.zeros(2*capacity, dtype=self.TIME_DTYPE)
+        self.snr       = np.full((2*capacity, max_satellites), self.NO_SNR, dtype=self.SNR_DTYPE)
+        self.elevation = np.full((2*capacity, max_satellites), self.NO_ELEVATION,
+                                 dtype=self.ELEVATION_DTYPE)
+        self.stats = {'rows': 0, 'overflow': 0}
+    def __len__(self)->int:
+        return self.size
+
+    # methods ##################################################################
+    def append(self, timestamp:float, satellites:Iterable[Tuple[Tuple[str, int], int, int]]):
+        """
+        Append a row. Satellites missing from the row are not tracked in it.
+
+        :param timestamp: time of the row, not older than the previous row.
+        :param satellites: (key, elevation, snr) of each satellite, where key
+            is (talker id, prn) and elevation or snr may be None. A satellite
+            listed more than once (one per signal) keeps its best SNR.
+        """
+        if (self.size < self.capacity):
+            i = self.size
+            self.size += 1
+        else:
+            # overwrite the oldest row
+            i = self.head
+            self.head = (self.head + 1) % self.capacity
+        snr_row, elevation_row = self.snr[i], self.elevation[i]
+        snr_row.fill(self.NO_SNR)
+        elevation_row.fill(self.NO_ELEVATION)
+        for key, elevation, snr in satellites:
+            column = self.index.get(key)
+            if (column is None):
+                if (len(self.index) == self.max_satellites):
+                    self.stats['overflow'] += 1
+                    continue
+                column = self.index[key] = len(self.index)
+            if (elevation is not None): elevation_row[column] = elevation
+            if (snr and snr > snr_row[column]): snr_row[column] = min(snr, 255)
+        j = i + self.capacity
+        self.time_col[i] = self.time_col[j] = timestamp
+        self.snr[j] = snr_row
+        self.elevation[j] = elevation_row
+        self.stats['rows'] += 1
+    def extend_snapshot(self, snapshot:GNSSSnapshot):
+        """
+        Append the satellites in view of a GNSSSnapshot (e.g. subscribed to a
+        GNSSState).
+        """
+        self.append(snapshot.timestamp, [((sat.talker, sat.prn), sat.elevation, sat.snr)
+                                         for sat in snapshot.satellites])
+    def extend_nav_sat(self, nav_sat:NavSat, timestamp:float=None):
+        """
+        Append the satellites of a UBX-NAV-SAT message, numbered like in GSV.
+
+        :param nav_sat: the decoded message.
+        :param timestamp: time.time() the message was read, None for now.
+        """
+        if (timestamp is None): timestamp = time()
+        self.append(timestamp, [(self.nav_sat_key(sv.gnssId, sv.svId), sv.elev, sv.cno)
+                                for sv in nav_sat.svs])
+    def update(self, message:GPSMessage):
+        """
+        Append the UBX-NAV-SAT messages of a GPSDrain, other messages are
+        ignored (subscribe to the drain).
+        """
+        if (isinstance(message.message, NavSat)):
+            self.extend_nav_sat(message.message, message.timestamp)
+    def clear(self):
+        """
+        Remove all rows, the satellites keep their columns.
+        """
+        self.size = 0
+        self.head = 0
+    def keys(self)->List[Tuple[str, int]]:
+        """
+        Returns the (talker id, prn) of the satellites seen.
+        """
+        return list(self.index)
+
+    # queries ##################################################################
+    def times(self, seconds:float=None)->np.ndarray:
+        """
+        Returns a view of the timestamps, oldest first.
+
+        :param seconds: only the rows in the last seconds before the newest.
+        """
+        return self.time_col[self.window(seconds)]
+    def series(self, key:Tuple[str, int], seconds:float=None):
+        """
+        Returns views (times, snr, elevation) of a satellite, oldest first.
+
+        :param key: (talker id, prn) of the satellite.
+        :param seconds: only the rows in the last seconds before the newest.
+        :raises:
+            KeyError: if the satellite was never seen.
+        """
+        window, column = self.window(seconds), self.index[key]
+        return self.time_col[window], self.snr[window, column], self.elevation[window, column]
+    def mean_snr(self, min_elevation:float=0, seconds:float=None, 
+                       keys:Iterable[Tuple[str, int]]=None)->float:
+        """
+        Returns the mean SNR in dB-Hz of the tracked satellites above an
+        elevation, NaN if there are none.
+
+        :param min_elevation: minimum elevation in degrees.
+        :param seconds: only the rows in the last seconds before the newest.
+        :param keys: only these satellites, None for all.
+        """
+        snr, mask = self.tracked(min_elevation, seconds, keys)
+        count = np.count_nonzero(mask)
+        if (not count): return float('nan')
+        return float(np.sum(snr, where=mask, dtype=np.uint64)) / count
+    def mean_snr_by_satellite(self, min_elevation:float=0, 
+                                    seconds:float=None)->Dict[Tuple[str, int], float]:
+        """
+        Returns the mean SNR in dB-Hz of each satellite tracked above an
+        elevation.
+
+        :param min_elevation: minimum elevation in degrees.
+        :param seconds: only the rows in the last seconds before the newest.
+        """
+        snr, mask = self.tracked(min_elevation, seconds)
+        counts = np.count_nonzero(mask, axis=0)
+        sums   = np.sum(snr, axis=0, where=mask, dtype=np.uint64)
+        return {key: float(sums[column]) / counts[column]
+                for key, column in self.index.items() if (counts[column])}
+    def tracked(self, min_elevation:float=0, seconds:float=None,
+                      keys:Iterable[Tuple[str, int]]=None):
+        """
+        Returns (snr, mask) views of the window, where mask selects the
+        samples tracked above min_elevation.
+        """
+        window = self.window(seconds)
+        columns = slice(0, len(self.index)) if (keys is None) else \
+                  [self.index[key] for key in keys if (key in self.index)]
+        snr = self.snr[window, columns]
+        mask = (snr != self.NO_SNR) & (self.elevation[window, columns] >= min_elevation)
+        return snr, mask
+    def window(self, seconds:float=None)->slice:
+        """
+        Returns the slice of the mirrored rows in the last seconds before the
+        newest row, all rows if seconds is None.
+        """
+        end = self.head + self.size
+        if (seconds is None or not self.size): return slice(end - self.size, end)
+        times = self.time_col[end - self.size:end]
+        start = int(np.searchsorted(times, times[-1] - seconds, side='left'))
+        return slice(end - self.size + start, end)
+
+    # helper methods ###########################################################
+    @classmethod
+    def nav_sat_key(cls, gnss_id:int, sv_id:int)->Tuple[str, int]:
+        """
+        Returns the (talker id, NMEA prn) of a UBX-NAV-SAT satellite. SBAS
+        (120-158) and GLONASS (1-32) ids are numbered like in GSV.
+        """
+        if (gnss_id == 1 and 120 <= sv_id <= 158): sv_id -= 87
+        elif (gnss_id == 6 and 1 <= sv_id <= 32): sv_id += 64
+        return cls.NAV_SAT_TALKERS.get(gnss_id, 'GN'), sv_id
+
+class GPSDrain():
+    """
+    Reader that owns a MonitorGPSReceiver and drains its port continuously
+    from its own thread.
+
+    Every frame the receiver outputs is read as it arrives, so the OS buffer
+    never fills and no output is lost between reads. Frames whose address is
+    selected are parsed and kept in a table holding the latest message of
+    each address, with per-address frame counters, and update a GNSSState.
+
+    The table is only written by the drain thread, and each entry is an
+    immutable GPSMessage replaced by a single dict assignment, which is atomic
+    in CPython. Consumers read it from any thread in O(1) without a lock and
+    without touching the port.
+
+    Usage:
+        drain = GPSDrain(monitor)
+        drain.start()
+        ...
+        fix = drain.latest('GNGGA')
+        drain.stop()
+
+    Attributes:
+        monitor   : the GPS receiver monitor.
+        addresses : addresses parsed into the table, None for all.
+        table     : latest GPSMessage by address.
+        state     : GNSSState updated from the parsed sentences.
+        counts    : frames read by address, parsed or not.
+        stats     : frame, error and connection counters.
+    """
+    # constants ################################################################
+    RECONNECT_PERIOD = 5.0 # seconds between connection attempts
+    READ_PERIOD      = 0.1 # seconds between checks of the running flag
+
+    # exceptions ###############################################################
+    class DrainStateError(Exception):
+        """
+        Raised when the drain is started or stopped in the wrong state.
+        """
+        pass
+
+    # constructor ##############################################################
+    def __init__(self, monitor:MonitorGPSReceiver, addresses:Iterable[Union[str, bytes]]=None,
+                       configure:bool=True, log:Callable[[str], None]=None,
+                       state:GNSSState=None):
+        """
+        Initializes the drain.
+
+        :param monitor: the GPS receiver monitor, only used from the drain
+            thread.
+        :param addresses: NMEA addresses (e.g. 'GNGGA') and UBX class and id
+            bytes to parse into the table, None for all.
+        :param configure: True to configure the receiver output and baud rate
+            (monitor.config.upgrade_baudrate) once connected.
+        :param log: called from the drain thread with connection messages.
+        :param state: GNSSState to update, None for a new one.
+        """
+        self.monitor   = monitor
+        self.addresses = None if (addresses is None) else frozenset(addresses)
+        self.configure = configure
+        self.log       = log
+        self.state     = GNSSState() if (state is None) else state
+        self.subscribers:List[Callable] = []
+        self.table:Dict[Union[str, bytes], GPSMessage] = {}
+        self.counts:Dict[Union[str, bytes], int] = {}
+        self.stats     = {'frames': 0, 'parsed': 0, 'parse_errors': 0,
+                          'read_errors': 0, 'connects': 0, 'dropped': 0}
+        self.thread:threading.Thread = None
+        self.running = threading.Event()
+        # set to interrupt the waits between connection attempts
+        self.stopped = threading.Event()
+
+    # methods ##################################################################
+    # control ##################################################################
+    def start(self):
+        """
+        Start draining in a background thread.
+
+        :raises:
+            DrainStateError: if already started.
+        """
+        if (self.thread is not None):
+            raise self.DrainStateError("Tried starting drain when already running")
+        self.running.set()
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    def stop(self):
+        """
+        Stop draining and wait for the thread to finish.
+
+        :raises:
+            DrainStateError: if not started.
+        """
+        if (self.thread is None):
+            raise self.DrainStateError("Tried stopping drain when not running")
+        self.running.clear()
+        self.stopped.set()
+        self.thread.join()
+        self.thread = None
+    def is_running(self)->bool:
+        """
+        Returns True if the drain thread is running.
+        """
+        return self.thread is not None
+
+    # consumers ################################################################
+    def latest(self, address:Union[str, bytes])->GPSMessage:
+        """
+        Returns the latest message of an address, None if none was read.
+
+        :param address: NMEA address (e.g. 'GNGGA') or UBX class and id bytes
+            (e.g. UBXDecoder.NAV_PVT).
+        """
+        return self.table.get(address)
+    def snapshot(self)->Dict[Union[str, bytes], GPSMessage]:
+        """
+        Returns a copy of the table of latest messages.
+        """
+        return dict(self.table)
+    def subscribe(self, callback:Callable[[GPSMessage], None]):
+        """
+        Subscribe to the parsed messages. callback is called from the drain
+        thread with each GPSMessage stored in the table.
+        """
+        self.subscribers.append(callback)
+
+    # drain thread #############################################################
+    def run(self):
+        """
+        Drain thread loop.
+        """
+        configured = False
+        while (self.running.is_set()):
+            if (not self.monitor.is_connected()):
+                configured = False
+                if (not self.connect()):
+                    self.stopped.wait(self.RECONNECT_PERIOD)
+                    continue
+            if (not configured):
+                if (self.configure): self.configure_receiver()
+                configured = True
+                if (not self.monitor.is_connected()): continue
+            self.drain(self.READ_PERIOD)
+    def connect(self)->bool:
+        """
+        Connect to the receiver.
+
+        :return: True if connected.
+        """
+        self.emit_log('Attempting to connect to GPS...')
+        self.monitor.connect_uart()
+        if (not self.monitor.is_connected()): return False
+        self.stats['connects'] += 1
+        self.emit_log('Connected to GPS')
+        return True
+    def configure_receiver(self):
+        """
+        Have the receiver only output the messages the monitor reads, at
+        monitor.config.upgrade_baudrate.
+
+        If the receiver does not answer at a baud rate it was switched to
+        (e.g. it was reset), the port is closed to reconnect at
+        monitor.config.baudrate.
+        """
+        try:
+            self.monitor.configureReceiver(baudrate=self.monitor.config.upgrade_baudrate)
+        except self.monitor.ConfigureReceiverError as e:
+            self.emit_log(f'Failed to configure GPS: {e}')
+            if (self.monitor.baudrate != self.monitor.config.baudrate):
+                self.monitor.baudrate = self.monitor.config.baudrate
+                self.monitor.close_uart()
+    def drain(self, timeout:float):
+        """
+        Read and handle frames for timeout seconds.
+        """
+        try:
+            for frame in self.monitor.readGPSFrames(timeout):
+                self.handle_frame(frame)
+        except (self.monitor.ReadUartFail, serial.SerialException) as e:
+            self.stats['read_errors'] += 1
+            self.emit_log(f'GPS read failed: {e}')
+            self.monitor.close_uart()
+        self.stats['dropped'] = self.monitor.frameSplitter.no_dropped
+    def handle_frame(self, frame:bytes):
+        """
+        Count a frame and, if its address is selected, store it in the table
+        and update the state.
+        """
+        timestamp = time()
+        if (frame[:1] == self.monitor.NMEA_FRAME_START_SEQ):
+            address = frame[1:6].decode('ascii', 'replace')
+        else:
+            address = frame[2:4]
+        self.stats['frames'] += 1
+        self.counts[address] = self.counts.get(address, 0) + 1
+        if (self.addresses is not None and address not in self.addresses): return
+        try: message = self.monitor.parseGPSFrame(frame)
+        except (self.monitor.ParseNMEAFrameError, self.monitor.ParseUBXFrameError):
+            self.stats['parse_errors'] += 1
+            return
+        if (message is None): return # UBX message not decoded
+        self.stats['parsed'] += 1
+        self.table[address] = entry = GPSMessage(timestamp, address, message, frame)
+        self.state.update(message, timestamp)
+        for callback in self.subscribers:
+            callback(entry)
+    def emit_log(self, message:str):
+        """
+        Pass a message to the log callback.
+        """
+        if (self.log): self.log(message)
+
+
+# Main #########################################################################
+def main():
+    from MonitorGPSReceiverEmulator import GPSReceiverEmulator
+    from MonitorTest import MonitorGPSReceiverTest
+
+    emulator = GPSReceiverEmulator(epoch_period=0.1)
+    emulator.start()
+    monitor = MonitorGPSReceiver(config=emulator.make_config())
+    drain = GPSDrain(monitor)
+    drain.start()
+    try:
+        for i in range(5):
+            sleep(0.5)
+            fix = drain.latest('GNGGA')
+            if (fix): print(f'{fix.timestamp:.3f} {monitor.sentenceToStr(fix.message)}')
+            print(drain.state.snapshot)
+    except KeyboardInterrupt:
+        pass
+    drain.stop()
+    print(drain.counts)
+    print(drain.stats)
+
+    mtester = MonitorGPSReceiverTest(monitor)
+    mtester.test_gps_drain(emulator)
+    mtester.test_gps_drain_reconnect()
+    mtester.test_gnss_state()
+    mtester.test_satellite_history()
+    mtester.benchmark_satellite_history()
+    monitor.close_uart()
+    emulator.stop()
+
+if __name__ == '__main__':
+    main()
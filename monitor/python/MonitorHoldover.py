@@ -0,0 +1,254 @@
+# Imports ######################################################################
+from MonitorFPGA import MonitorFPGA
+from MonitorTelemetry import TelemetrySample
+
+import numpy as np
+
+from typing import List, Tuple
+
+# Globals ######################################################################
+
+
+# Library ######################################################################
+class HoldoverPredictor():
+    """
+    Incremental predictor of the DAC output that keeps the oscillator on
+    frequency, to steer it in holdover when the GPS drops out.
+
+    Two small recursive filters are updated with every DAC sample, in O(1)
+    time and memory regardless of the run length:
+        - A recursive least-squares fit, with exponential forgetting, of
+          the DAC against the loop integral: dac = gain*integral + offset.
+          The integral is the frequency part of the control, so the fitted
+          value is the DAC without the proportional term's phase noise.
+          The integral is centered on its forgetting-weighted mean so the
+          fit stays well conditioned, and the fit covariance is kept
+          symmetric with its trace capped, so forgetting cannot wind it up
+          in directions the integral does not excite on long runs.
+        - A Kalman filter with a constant aging model, state (DAC level,
+          drift rate, aging) driven by white noise on the aging, observing
+          the fitted DAC (or the DAC itself while the fit warms up or when no
+          integral is given). The measurement noise is estimated from the
+          innovations and the covariance is updated in Joseph form.
+    predict() and trajectory() extrapolate the state and its covariance,
+    giving the predicted DAC and a confidence bound that widens with the
+    holdover time.
+
+    Usage:
+        predictor = HoldoverPredictor()
+        engine.subscribe(predictor.extend)
+        ...
+        dac, bound = predictor.predict(time.time() + 3600)
+        word = predictor.dac_word(time.time() + 3600)
+
+    Attributes:
+        process_noise : spectral density of the aging noise (DAC^2/s^5).
+        forgetting    : RLS forgetting factor per sample.
+        confidence    : number of standard deviations of the bounds.
+        theta         : the fitted (gain, offset).
+        stats         : update counters.
+    """
+    # constants ################################################################
+    DAC      = MonitorFPGA.CMD_125
+    INTEGRAL = MonitorFPGA.CMD_124
+    # samples before the integral fit is used as the measurement
+    RLS_WARMUP = 100
+    # initial uncertainty of the state and the integral fit
+    INITIAL_VARIANCE = 1e6
+    # largest trace of the integral fit covariance
+    MAX_FIT_VARIANCE = 1e6
+    # smallest measurement noise variance (DAC^2), about the quantization
+    MIN_MEASUREMENT_NOISE = 1/12
+    # weight of a new innovation in the measurement noise estimate
+    NOISE_WEIGHT = 0.01
+
+    # constructor ##############################################################
+    def __init__(self, process_noise:float=1e-21, forgetting:float=0.9999,
+                       confidence:float=2.0, use_integral:bool=True):
+        """
+        :param process_noise: spectral density of the aging noise (DAC^2/s^5).
+        :param forgetting: RLS forgetting factor per sample, 1 to never
+            forget.
+        :param confidence: number of standard deviations of the bounds.
+        :param use_integral: observe the DAC fitted from the integral.
+        """
+        self.process_noise = process_noise
+        self.forgetting    = forgetting
+        self.confidence    = confidence
+        self.use_integral  = use_integral
+        self.clear()
+
+    # methods ##################################################################
+    def update(self, timestamp:float, dac:float, integral:float=None):
+        """
+        Add a sample of the locked loop.
+
+        :param timestamp: time of the sample, increasing.
+        :param dac: the DAC output.
+        :param integral: the loop integral read with it, None if not read.
+        """
+        if (self.t is None):
+            self.t = timestamp
+            self.x[0] = dac
+        measurement = dac
+        if (integral is not None and self.use_integral):
+            fitted = self.update_fit(dac, integral)
+            if (self.stats['fits'] > self.RLS_WARMUP): measurement = fitted
+        dt = timestamp - self.t
+        if (dt < 0): return
+        # predict
+        F = self.transition(dt)
+        self.x = F @ self.x
+        self.P = F @ self.P @ F.T + self.process_covariance(dt)
+        # correct
+        innovation = measurement - self.x[0]
+        self.R = max(self.MIN_MEASUREMENT_NOISE,
+                     (1 - self.NOISE_WEIGHT) * self.R + self.NOISE_WEIGHT * (innovation**2 - self.P[0, 0]))
+        S = self.P[0, 0] + self.R
+        K = self.P[:, 0] / S
+        self.x = self.x + K * innovation
+        # Joseph form (I - KH) P (I - KH)' + K R K' keeps P positive definite,
+        # expanded for H = (1, 0, 0)
+        KP = np.outer(K, self.P[0, :])
+        P = self.P - KP - KP.T + S * np.outer(K, K)
+        self.P = (P + P.T) / 2
+        self.t = timestamp
+        self.stats['updates'] += 1
+    def extend(self, samples:List[TelemetrySample]):
+        """
+        Add the DAC and integral samples in TelemetrySamples (e.g. a
+        TelemetryEngine batch). Samples with the same timestamp are one
+        update.
+        """
+        row, timestamp = {}, None
+        for sample in samples:
+            if (timestamp is not None and sample.timestamp != timestamp):
+                self.update_row(timestamp, row)
+                row = {}
+            timestamp = sample.timestamp
+            row[sample.name] = sample.value
+        if (timestamp is not None): self.update_row(timestamp, row)
+    def clear(self):
+        """
+        Forget the learned model.
+        """
+        self.t  = None # time of the last update
+        self.x  = np.zeros(3)
+        self.P  = np.diag([self.INITIAL_VARIANCE, 1.0, 1e-6])
+        self.R  = 1.0
+        self.fit_mean = None # center of the integral regressor
+        self.fit = np.zeros(2) # gain, offset at the center
+        self.fit_P = np.eye(2) * self.INITIAL_VARIANCE
+        self.stats = {'updates': 0, 'fits': 0}
+    def predict(self, timestamp:float)->Tuple[float, float]:
+        """
+        Returns the predicted DAC at a time and its confidence bound.
+
+        :param timestamp: time of the prediction, usually after the last
+            update.
+        :return: (predicted DAC, bound), the DAC is within +-bound with the
+            confidence.
+        """
+        dac, bound = self.trajectory(np.array([timestamp]))
+        return float(dac[0]), float(bound[0])
+    def trajectory(self, timestamps:np.ndarray)->Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the predicted DAC trajectory and its confidence bounds,
+        vectorized over the times. The bounds include the quantization of
+        the DAC register.
+
+        :param timestamps: times of the predictions.
+        :return: (predicted DACs, bounds)
+        """
+        if (self.t is None): raise ValueError('No samples to predict from')
+        dt = np.maximum(0.0, np.asarray(timestamps, dtype=np.float64) - self.t)
+        # first row of F @ x and of F @ P @ F.T + Q
+        h = np.stack((np.ones_like(dt), dt, dt**2 / 2), axis=1)
+        dac = h @ self.x
+        variance = (np.einsum('ij,jk,ik->i', h, self.P, h) + self.process_noise * dt**5 / 20
+                    + self.MIN_MEASUREMENT_NOISE)
+        return dac, self.confidence * np.sqrt(variance)
+    def dac_word(self, timestamp:float)->int:
+        """
+        Returns the predicted DAC at a time as a DAC register value, clipped
+        to the register range, to write back in holdover.
+        """
+        cmd = MonitorFPGA.commands[self.DAC]
+        dac, _ = self.predict(timestamp)
+        return int(np.clip(round(dac), 0, (1 << 8*cmd.no_rbytes) - 1))
+    @property
+    def drift(self)->Tuple[float, float]:
+        """
+        Returns the learned (drift rate in DAC/s, aging in DAC/s^2).
+        """
+        return float(self.x[1]), float(self.x[2])
+    @property
+    def theta(self)->np.ndarray:
+        """
+        Returns the fitted (gain, offset) of dac = gain*integral + offset.
+        """
+        gain, offset = self.fit
+        center = self.fit_mean if (self.fit_mean is not None) else 0.0
+        return np.array([gain, offset - gain*center])
+
+    # helper methods ###########################################################
+    def update_row(self, timestamp:float, row:dict):
+        """
+        Update with the registers read at one timestamp if the DAC was read.
+        """
+        if (self.DAC in row): self.update(timestamp, row[self.DAC], row.get(self.INTEGRAL))
+    def update_fit(self, dac:float, integral:float)->float:
+        """
+        Recursive least-squares update of the DAC against the integral,
+        centered on the forgetting-weighted mean of the integral.
+
+        :return: the DAC fitted from the integral after the update.
+        """
+        if (self.fit_mean is None): self.fit_mean = integral
+        # move the center, the offset at the new center keeps the same fit
+        shift = (1 - self.forgetting) * (integral - self.fit_mean)
+        self.fit_mean += shift
+        T = np.array([[1.0, 0.0], [shift, 1.0]])
+        self.fit = T @ self.fit
+        self.fit_P = T @ self.fit_P @ T.T
+        phi = np.array([integral - self.fit_mean, 1.0])
+        fitted = float(phi @ self.fit)
+        Pphi = self.fit_P @ phi
+        k = Pphi / (self.forgetting + phi @ Pphi)
+        self.fit = self.fit + k * (dac - fitted)
+        P = (self.fit_P - np.outer(k, Pphi)) / self.forgetting
+        P = (P + P.T) / 2
+        # bound the windup of directions the integral does not excite
+        trace = P[0, 0] + P[1, 1]
+        if (trace > self.MAX_FIT_VARIANCE): P *= self.MAX_FIT_VARIANCE / trace
+        self.fit_P = P
+        self.stats['fits'] += 1
+        return float(phi @ self.fit)
+    @staticmethod
+    def transition(dt:float)->np.ndarray:
+        """
+        Returns the state transition of the aging model over dt seconds.
+        """
+        return np.array([[1.0, dt, dt*dt / 2], [0.0, 1.0, dt], [0.0, 0.0, 1.0]])
+    def process_covariance(self, dt:float)->np.ndarray:
+        """
+        Returns the covariance of the state noise over dt seconds for white
+        noise on the aging.
+        """
+        return self.process_noise * np.array([
+            [dt**5 / 20, dt**4 / 8, dt**3 / 6],
+            [dt**4 / 8,  dt**3 / 3, dt**2 / 2],
+            [dt**3 / 6,  dt**2 / 2, dt]])
+
+
+# Main #########################################################################
+def main():
+    from MonitorTest import MonitorFPGATest
+
+    mtester = MonitorFPGATest(MonitorFPGA())
+    mtester.test_holdover_predictor()
+    mtester.test_holdover_long_run()
+    mtester.benchmark_holdover_predictor()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+# Imports ######################################################################
+import datetime
+from typing import Dict, List
+
+# Globals ######################################################################
+
+
+# Library ######################################################################
+# field conversions ############################################################
+def nmea_timestamp(s:str)->datetime.time:
+    """
+    Converts a "hhmmss[.ss]" NMEA time to a datetime.time.
+    """
+    us = int(float(s[6:]) * 1000000) if (s[6:]) else 0
+    return datetime.time(int(s[0:2]), int(s[2:4]), int(s[4:6]), us)
+def nmea_datestamp(s:str)->datetime.date:
+    """
+    Converts a "ddmmyy" NMEA date to a datetime.date.
+    """
+    return datetime.date(2000 + int(s[4:6]), int(s[2:4]), int(s[0:2]))
+def dm_to_sd(dm:str)->float:
+    """
+    Converts a "dddmm.mmmm" NMEA coordinate to decimal degrees.
+    """
+    if (not dm or dm == '0'): return 0.
+    split = dm.find('.') - 2
+    if (split < 0): split = len(dm) - 2
+    return float(dm[:split] or 0) + float(dm[split:]) / 60
+def nmea_checksum(body:bytes)->int:
+    """
+    Returns the XOR of all bytes in body (the NMEA checksum of the bytes
+    between '$' and '*').
+
+    The bytes are XORed as one integer folded onto its lowest byte in
+    power of two steps, which is faster in Python than a loop over the bytes.
+    """
+    x = int.from_bytes(body, 'little')
+    no_bytes = 1 << (len(body) - 1).bit_length() if (body) else 1
+    while no_bytes > 1:
+        no_bytes >>= 1
+        x ^= x >> (no_bytes << 3)
+    return x & 0xff
+
+# records ######################################################################
+class NMEAField():
+    """
+    Descriptor converting one field of an NMEARecord on access.
+
+    Like the pynmea2 sentence attributes, empty or missing fields read as ''
+    without a conversion and None with one, and fields that fail to convert
+    read as their string.
+    """
+    __slots__ = ('index', 'convert')
+
+    def __init__(self, index:int, convert=None):
+        """
+        :param index: index of the field in the record data.
+        :param convert: conversion from the field string, None for a string.
+        """
+        self.index   = index
+        self.convert = convert
+    def __get__(self, record, owner=None):
+        if (record is None): return self
+        data = record.data
+        value = data[self.index] if (self.index < len(data)) else ''
+        if (self.convert is None): return value
+        if (not value): return None
+        try: return self.convert(value)
+        except ValueError: return value
+
+class NMEARecord():
+    """
+    Compact decoded NMEA sentence.
+
+    Only the field strings are kept, fields are converted when accessed.
+    Attribute names follow pynmea2 so records and pynmea2 sentences can be
+    used interchangeably.
+
+    Attributes:
+        talker        : talker id (e.g. 'GN').
+        sentence_type : sentence type (e.g. 'GGA').
+        data          : field strings after the address.
+        checksum      : checksum of the frame, None if not computed.
+    """
+    __slots__ = ('talker', 'sentence_type', 'data', 'checksum')
+
+    def __init__(self, talker:str, sentence_type:str, data:List[str], 
+                       checksum:int=None):
+        self.talker        = talker
+        self.sentence_type = sentence_type
+        self.data          = data
+        self.checksum      = checksum
+    def __str__(self)->str:
+        """
+        Renders the sentence like pynmea2 (without the line ending).
+        """
+        body = ','.join([self.talker + self.sentence_type] + self.data)
+        checksum = nmea_checksum(body.encode()) if (self.checksum is None) else self.checksum
+        return f'${body}*{checksum:02X}'
+    def __repr__(self)->str:
+        return f'<{type(self).__name__}({self})>'
+
+class LatLonRecord(NMEARecord):
+    """
+    NMEARecord with lat, lat_dir, lon and lon_dir fields.
+    """
+    __slots__ = ()
+
+    @property
+    def latitude(self)->float:
+        """
+        Latitude in signed decimal degrees.
+        """
+        sd = dm_to_sd(self.lat)
+        return sd if (self.lat_dir == 'N') else -sd if (self.lat_dir == 'S') else 0.
+    @property
+    def longitude(self)->float:
+        """
+        Longitude in signed decimal degrees.
+        """
+        sd = dm_to_sd(self.lon)
+        return sd if (self.lon_dir == 'E') else -sd if (self.lon_dir == 'W') else 0.
+
+class GGARecord(LatLonRecord):
+    """
+    Global Positioning System Fix Data.
+    """
+    __slots__ = ()
+    timestamp      = NMEAField(0, nmea_timestamp)
+    lat            = NMEAField(1)
+    lat_dir        = NMEAField(2)
+    lon            = NMEAField(3)
+    lon_dir        = NMEAField(4)
+    gps_qual       = NMEAField(5, int)
+    num_sats       = NMEAField(6)
+    horizontal_dil = NMEAField(7)
+    altitude       = NMEAField(8, float)
+    altitude_units = NMEAField(9)
+    geo_sep        = NMEAField(10)
+    geo_sep_units  = NMEAField(11)
+    age_gps_data   = NMEAField(12)
+    ref_station_id = NMEAField(13)
+
+    @property
+    def is_valid(self)->bool:
+        return self.gps_qual is not None and self.gps_qual > 0
+
+class RMCRecord(LatLonRecord):
+    """
+    Recommended Minimum Specific GNSS Data.
+    """
+    __slots__ = ()
+    timestamp     = NMEAField(0, nmea_timestamp)
+    status        = NMEAField(1)
+    lat           = NMEAField(2)
+    lat_dir       = NMEAField(3)
+    lon           = NMEAField(4)
+    lon_dir       = NMEAField(5)
+    spd_over_grnd = NMEAField(6, float)
+    true_course   = NMEAField(7, float)
+    datestamp     = NMEAField(8, nmea_datestamp)
+    mag_variation = NMEAField(9)
+    mag_var_dir   = NMEAField(10)
+
+    @property
+    def is_valid(self)->bool:
+        return self.status == 'A'
+    @property
+    def datetime(self)->datetime.datetime:
+        return datetime.datetime.combine(self.datestamp, self.timestamp)
+
+class GLLRecord(LatLonRecord):
+    """
+    Geographic position, latitude and longitude (and time).
+    """
+    __slots__ = ()
+    lat       = NMEAField(0)
+    lat_dir   = NMEAField(1)
+    lon       = NMEAField(2)
+    lon_dir   = NMEAField(3)
+    timestamp = NMEAField(4, nmea_timestamp)
+    status    = NMEAField(5)
+    faa_mode  = NMEAField(6)
+
+    @property
+    def is_valid(self)->bool:
+        return self.status == 'A'
+
+class GSARecord(NMEARecord):
+    """
+    GNSS DOP and active satellites.
+    """
+    __slots__ = ()
+    mode          = NMEAField(0)
+    mode_fix_type = NMEAField(1)
+    sv_id01 = NMEAField(2);  sv_id02 = NMEAField(3);  sv_id03 = NMEAField(4)
+    sv_id04 = NMEAField(5);  sv_id05 = NMEAField(6);  sv_id06 = NMEAField(7)
+    sv_id07 = NMEAField(8);  sv_id08 = NMEAField(9);  sv_id09 = NMEAField(10)
+    sv_id10 = NMEAField(11); sv_id11 = NMEAField(12); sv_id12 = NMEAField(13)
+    pdop          = NMEAField(14)
+    hdop          = NMEAField(15)
+    vdop          = NMEAField(16)
+
+    @property
+    def is_valid(self)->bool:
+        return self.mode_fix_type in ('2', '3')
+    @property
+    def sv_ids(self)->List[str]:
+        """
+        Ids of the satellites used in the fix.
+        """
+        return [sv for sv in self.data[2:14] if (sv)]
+
+class GSVRecord(NMEARecord):
+    """
+    GNSS satellites in view, up to 4 satellites per sentence.
+    """
+    __slots__ = ()
+    num_messages    = NMEAField(0)
+    msg_num         = NMEAField(1)
+    num_sv_in_view  = NMEAField(2)
+    sv_prn_num_1 = NMEAField(3);  elevation_deg_1 = NMEAField(4);  azimuth_1 = NMEAField(5);  snr_1 = NMEAField(6)
+    sv_prn_num_2 = NMEAField(7);  elevation_deg_2 = NMEAField(8);  azimuth_2 = NMEAField(9);  snr_2 = NMEAField(10)
+    sv_prn_num_3 = NMEAField(11); elevation_deg_3 = NMEAField(12); azimuth_3 = NMEAField(13); snr_3 = NMEAField(14)
+    sv_prn_num_4 = NMEAField(15); elevation_deg_4 = NMEAField(16); azimuth_4 = NMEAField(17); snr_4 = NMEAField(18)
+
+# decoder ######################################################################
+class NMEADecoder():
+    """
+    Fast decoder for the NMEA sentences displayed by the monitor.
+
+    Decodes GGA, RMC, GSA, GSV and GLL frames into NMEARecords with an inline
+    checksum check. Other sentence types are not decoded so the caller can
+    fall back to pynmea2.
+
+    Attributes:
+        check : True to verify the checksum.
+    """
+    # constants ################################################################
+    RECORDS:Dict[bytes, type] = {
+        b'GGA' : GGARecord,
+        b'RMC' : RMCRecord,
+        b'GSA' : GSARecord,
+        b'GSV' : GSVRecord,
+        b'GLL' : GLLRecord,
+    }
+
+    # exceptions ###############################################################
+    class DecodeError(Exception):
+        """
+        Raised if decoding an NMEA frame fails.
+        """
+        pass
+    class ChecksumError(DecodeError):
+        """
+        Raised if an NMEA frame's checksum is missing or wrong.
+        """
+        pass
+
+    # constructor ##############################################################
+    def __init__(self, check:bool=True):
+        """
+        :param check: True to verify the checksum.
+        """
+        self.check = check
+
+    # methods ##################################################################
+    def decode(self, frame:bytes)->NMEARecord:
+        """
+        Decodes a raw NMEA frame (e.g. b'$GNGGA,...*77\\r\\n').
+
+        :param frame: the frame from '$' up to and including the line ending.
+        :exceptions:
+            DecodeError   : if the frame is malformed.
+            ChecksumError : if checking and the checksum is missing or wrong.
+        :return: the record, None if the sentence type is not decoded.
+        """
+        record_class = self.RECORDS.get(frame[3:6])
+        if (record_class is None or frame[6:7] != b','): return None
+        star = frame.rfind(b'*')
+        checksum = None
+        if (star < 0):
+            if (self.check): raise self.ChecksumError(f'Missing checksum in NMEA frame {frame}')
+            body = frame[1:].rstrip()
+        else:
+            body = frame[1:star]
+            if (self.check):
+                try: checksum = int(frame[star+1:star+3], 16)
+                except ValueError: raise self.ChecksumError(f'Bad checksum in NMEA frame {frame}')
+                if (checksum != nmea_checksum(body)):
+                    raise self.ChecksumError(f'Checksum mismatch in NMEA frame {frame}')
+        try: data = body.decode('ascii').split(',')
+        except UnicodeDecodeError: raise self.DecodeError(f'Non-ASCII NMEA frame {frame}')
+        address = data[0]
+        return record_class(address[:2], address[2:], data[1:], checksum)
+
+# Main #########################################################################
+def main():
+    from MonitorGPSReceiver import MonitorGPSReceiver
+    from MonitorTest import MonitorGPSReceiverTest
+    mtester = MonitorGPSReceiverTest(MonitorGPSReceiver())
+    mtester.test_nmea_decoder()
+    mtester.benchmark_parse_nmea()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+# Imports ######################################################################
+from MonitorFPGA import MonitorFPGA
+from MonitorTelemetry import TelemetryEngine, TelemetrySample, TelemetryStore
+
+import os
+import json
+import mmap
+import struct
+import numpy as np
+
+from time import perf_counter
+from typing import Dict, List
+
+# Globals ######################################################################
+
+
+# Library ######################################################################
+class TelemetryRecorder():
+    """
+    Append-only recorder of register telemetry into a fixed-record binary
+    file through a memory map.
+
+    The file is a HEADER_SIZE header followed by records of a NumPy
+    structured dtype: a float64 'timestamp', a uint64 'mask' with bit i set
+    if names[i] was read in the record, and one typed field per register. A
+    register that was not read keeps its previous value, like in
+    TelemetryStore.
+
+    A record is written into the map before the committed record count in
+    the header is incremented, so readers (also in other processes, see
+    load_recording) only see complete records. A crash of the process loses
+    nothing (the map is in the page cache), a crash of the system at most
+    the records of the last flush_period. The file grows by GROW_RECORDS
+    records at a time and an existing recording is appended to.
+
+    Usage:
+        recorder = TelemetryRecorder('telemetry.rec', TelemetryEngine.TELEMETRY)
+        engine.subscribe(recorder.extend)
+        ...
+        recorder.close()
+        records = load_recording('telemetry.rec')
+        records['reg127_phase_error']
+
+    Attributes:
+        path         : the recording file.
+        names        : the registers (command names) recorded.
+        dtype        : NumPy dtype of the records.
+        count        : number of committed records.
+        flush_period : seconds between flushes of the map to disk.
+    """
+    # constants ################################################################
+    MAGIC        = b'MONREC01'
+    HEADER_SIZE  = 4096 # one page, the records stay page aligned
+    # header: magic, committed record count, record size, dtype description size
+    HEADER_STRUCT = struct.Struct('<8sQII')
+    COUNT_OFFSET  = 8
+    GROW_RECORDS  = 1 << 16
+    MAX_NAMES     = 64 # bits of the mask
+
+    # exceptions ###############################################################
+    class RecordingFileError(Exception):
+        """
+        Raised if a recording file is not a recording or was recorded with
+        other registers.
+        """
+        pass
+
+    # constructor ##############################################################
+    def __init__(self, path:str, names:List[str]=TelemetryEngine.TELEMETRY,
+                       dtypes:Dict[str, str]=None, flush_period:float=1.0):
+        """
+        Creates the recording file, or opens it to append if it exists.
+
+        :param path: the recording file.
+        :param names: the registers (command names) to record.
+        :param dtypes: NumPy dtype by name, defaults to
+            TelemetryStore.dtype_for_command().
+        :param flush_period: seconds between flushes of the map to disk.
+        :raises:
+            RecordingFileError: if the existing file is not a recording of the
+                same registers.
+            ValueError: if there are more than MAX_NAMES registers.
+        """
+        if (len(names) > self.MAX_NAMES): raise ValueError(f'More than {self.MAX_NAMES} registers')
+        if (dtypes is None): dtypes = {}
+        self.path  = path
+        self.names = list(names)
+        self.dtype = self.make_dtype(self.names, dtypes)
+        self.bits  = {name: 1 << i for i, name in enumerate(self.names)}
+        self.last_values = {name:0 for name in self.names}
+        self.flush_period = flush_period
+        self.next_flush   = perf_counter() + flush_period
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if (os.fstat(self.fd).st_size == 0): self.write_header()
+        self.count = self.read_header(self.fd, self.dtype)
+        if (self.count):
+            # continue from the last record
+            last = load_recording(path)[-1]
+            self.last_values = {name: last[name].item() for name in self.names}
+        self.mm = None
+        self.map(max(os.fstat(self.fd).st_size, self.file_size(self.count + self.GROW_RECORDS)))
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+    def __len__(self)->int:
+        return self.count
+
+    # methods ##################################################################
+    def append(self, timestamp:float, values:Dict[str, int]):
+        """
+        Append a record. Registers missing from values keep their last value.
+
+        :param timestamp: time of the record.
+        :param values: register values by name.
+        """
+        if (self.count == self.capacity):
+            self.map(self.file_size(self.capacity + self.GROW_RECORDS))
+        mask = 0
+        for name, value in values.items():
+            bit = self.bits.get(name)
+            if (bit is None): continue
+            mask |= bit
+            self.last_values[name] = value
+        self.records[self.count] = (timestamp, mask, *self.last_values.values())
+        # commit after the record is written
+        self.count += 1
+        struct.pack_into('<Q', self.mm, self.COUNT_OFFSET, self.count)
+        if (perf_counter() >= self.next_flush): self.flush()
+    def extend(self, samples:List[TelemetrySample]):
+        """
+        Append TelemetrySamples (e.g. a TelemetryEngine batch). Consecutive
+        samples with the same timestamp form one record.
+        """
+        row, timestamp = {}, None
+        for sample in samples:
+            if (timestamp is not None and sample.timestamp != timestamp):
+                self.append(timestamp, row)
+                row = {}
+            timestamp = sample.timestamp
+            row[sample.name] = sample.value
+        if (timestamp is not None): self.append(timestamp, row)
+    def flush(self):
+        """
+        Flush the map to disk, the records before the header with their
+        count when the header is a whole number of pages.
+        """
+        if (self.HEADER_SIZE % mmap.PAGESIZE == 0):
+            self.mm.flush(self.HEADER_SIZE, len(self.mm) - self.HEADER_SIZE)
+            self.mm.flush(0, self.HEADER_SIZE)
+        else:
+            self.mm.flush()
+        self.next_flush = perf_counter() + self.flush_period
+    def close(self):
+        """
+        Flush and close the recording, trimming the file to the committed
+        records.
+        """
+        if (self.mm is None): return
+        self.flush()
+        self.records = None
+        self.mm.close()
+        self.mm = None
+        os.ftruncate(self.fd, self.file_size(self.count))
+        os.close(self.fd)
+
+    # file #####################################################################
+    def write_header(self):
+        """
+        Write the header of an empty recording.
+        """
+        descr = json.dumps(np.lib.format.dtype_to_descr(self.dtype)).encode()
+        header = self.HEADER_STRUCT.pack(self.MAGIC, 0, self.dtype.itemsize, len(descr)) + descr
+        if (len(header) > self.HEADER_SIZE): raise ValueError('Too many registers for the header')
+        os.write(self.fd, header.ljust(self.HEADER_SIZE, b'\0'))
+    def map(self, size:int):
+        """
+        Grow the file to size bytes and map it.
+        """
+        self.records = None
+        if (self.mm is not None): self.mm.close()
+        if (os.fstat(self.fd).st_size < size): os.ftruncate(self.fd, size)
+        self.mm = mmap.mmap(self.fd, size)
+        self.capacity = (size - self.HEADER_SIZE) // self.dtype.itemsize
+        self.records = np.ndarray((self.capacity,), dtype=self.dtype, buffer=self.mm,
+                                  offset=self.HEADER_SIZE)
+    def file_size(self, count:int)->int:
+        """
+        Returns the size of a file of count records.
+        """
+        return self.HEADER_SIZE + count * self.dtype.itemsize
+
+    # helper methods ###########################################################
+    @classmethod
+    def read_header(cls, fd:int, dtype:np.dtype=None)->int:
+        """
+        Reads a recording header.
+
+        :param fd: file descriptor of the recording.
+        :param dtype: expected record dtype, None to accept any.
+        :raises:
+            RecordingFileError: if not a recording or the dtype differs.
+        :return: the number of committed records, or (count, dtype) if dtype
+            is None.
+        """
+        header = os.pread(fd, cls.HEADER_SIZE, 0)
+        if (len(header) < cls.HEADER_STRUCT.size):
+            raise cls.RecordingFileError('Recording header is truncated')
+        magic, count, record_size, descr_size = cls.HEADER_STRUCT.unpack_from(header)
+        if (magic != cls.MAGIC): raise cls.RecordingFileError('Not a telemetry recording')
+        descr = header[cls.HEADER_STRUCT.size:cls.HEADER_STRUCT.size + descr_size]
+        file_dtype = np.lib.format.descr_to_dtype([tuple(field) for field in json.loads(descr)])
+        if (file_dtype.itemsize != record_size):
+            raise cls.RecordingFileError('Recording record size does not match its dtype')
+        # records past the end of a truncated file were never flushed
+        size = os.fstat(fd).st_size
+        count = min(count, max(0, size - cls.HEADER_SIZE) // record_size)
+        if (dtype is None): return count, file_dtype
+        if (file_dtype != dtype):
+            raise cls.RecordingFileError(f'Recording has fields {file_dtype.names}, expected {dtype.names}')
+        return count
+    @staticmethod
+    def make_dtype(names:List[str], dtypes:Dict[str, str])->np.dtype:
+        """
+        Returns the record dtype of the registers.
+        """
+        fields = [('timestamp', '<f8'), ('mask', '<u8')]
+        for name in names:
+            dtype = dtypes.get(name) or TelemetryStore.dtype_for_command(MonitorFPGA.commands[name])
+            fields.append((name, np.dtype(dtype).newbyteorder('<')))
+        return np.dtype(fields)
+
+def load_recording(path:str)->np.ndarray:
+    """
+    Opens a TelemetryRecorder file read-only as a zero-copy NumPy memmap of
+    its committed records, also while it is being recorded. Call again to
+    see records appended since.
+
+    :param path: the recording file.
+    :raises:
+        RecordingFileError: if the file is not a recording.
+    :return: structured array with 'timestamp', 'mask' and register fields.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try: count, dtype = TelemetryRecorder.read_header(fd)
+    finally: os.close(fd)
+    if (count == 0): return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=TelemetryRecorder.HEADER_SIZE,
+                     shape=(count,))
+
+
+# Main #########################################################################
+def main():
+    import tempfile
+    from MonitorTest import MonitorFPGATest
+
+    with tempfile.TemporaryDirectory() as directory:
+        mtester = MonitorFPGATest(MonitorFPGA())
+        mtester.test_telemetry_recorder(os.path.join(directory, 'telemetry.rec'))
+        mtester.benchmark_telemetry_recorder(os.path.join(directory, 'benchmark.rec'))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,414 @@
+# Imports ######################################################################
+from MonitorTelemetry import TelemetrySample
+
+import numpy as np
+
+from typing import Dict, List, Tuple
+
+# Globals ######################################################################
+
+
+# Library ######################################################################
+class RollupPyramid():
+    """
+    Multi-resolution min/max/mean rollups of one register series.
+
+    Level 0 has one bucket per 2**min_level samples, and each bucket of level
+    k+1 rolls up two buckets of level k, so level k has one bucket per
+    2**(min_level + k) samples and all levels together hold about
+    len/2**(min_level - 1) buckets. The pyramid is built incrementally: a
+    bucket is rolled up into the next level as soon as its sibling is
+    complete, in O(1) amortized time per sample. The samples of incomplete
+    buckets are rolled up into a tail bucket when queried, so the newest
+    samples are always included.
+
+    select() picks the coarsest level that still has at most max_buckets
+    buckets in a time range, so drawing any range at a fixed pixel width
+    costs the same regardless of the history length.
+
+    Usage:
+        pyramid = RollupPyramid()
+        pyramid.extend(times, values)
+        level, buckets = pyramid.select(start, stop, max_buckets=width)
+        x, y = RollupPyramid.envelope(buckets)
+
+    Attributes:
+        min_level : log2 of the number of samples of a level 0 bucket.
+        levels    : the buckets of each level (use level_buckets()).
+    """
+    # constants ################################################################
+    DTYPE = np.dtype([('t_first', 'f8'), ('t_last', 'f8'), ('min', 'f8'),
+                      ('max', 'f8'), ('mean', 'f8')])
+    MIN_CAPACITY = 64 # buckets allocated for a new level
+
+    # constructor ##############################################################
+    def __init__(self, min_level:int=2):
+        """
+        Creates an empty pyramid.
+
+        :param min_level: log2 of the number of samples of a level 0 bucket.
+        """
+        if (min_level < 0): raise ValueError(f'Invalid min_level={min_level}')
+        self.min_level = min_level
+        self.clear()
+    def __len__(self)->int:
+        """
+        Returns the number of samples rolled up.
+        """
+        return self.count
+
+    # methods ##################################################################
+    def append(self, timestamp:float, value:float):
+        """
+        Roll up a sample.
+
+        :param timestamp: time of the sample, non-decreasing.
+        :param value: the value.
+        """
+        self.pending_t.append(timestamp)
+        self.pending_v.append(value)
+        self.count += 1
+        if (len(self.pending_t) == 1 << self.min_level): self.push_pending()
+    def extend(self, timestamps:np.ndarray, values:np.ndarray):
+        """
+        Roll up samples, vectorized over the whole buckets.
+
+        :param timestamps: times of the samples, non-decreasing.
+        :param values: the values.
+        """
+        t = np.asarray(timestamps, dtype=np.float64)
+        v = np.asarray(values, dtype=np.float64)
+        size = 1 << self.min_level
+        # complete the pending bucket first
+        first = min(len(t), (size - len(self.pending_t)) % size)
+        for i in range(first): self.append(t[i], v[i])
+        t, v = t[first:], v[first:]
+        whole = len(t) // size * size
+        if (whole):
+            tb, vb = t[:whole].reshape(-1, size), v[:whole].reshape(-1, size)
+            buckets = np.empty(len(tb), dtype=self.DTYPE)
+            buckets['t_first'], buckets['t_last'] = tb[:, 0], tb[:, -1]
+            buckets['min'], buckets['max'] = vb.min(axis=1), vb.max(axis=1)
+            buckets['mean'] = vb.mean(axis=1)
+            self.count += whole
+            self.push_buckets(0, buckets)
+        for i in range(whole, len(t)): self.append(t[i], v[i])
+    def clear(self):
+        """
+        Remove all samples.
+        """
+        self.levels:List[np.ndarray] = []
+        self.lengths:List[int] = []
+        self.pending_t:List[float] = []
+        self.pending_v:List[float] = []
+        self.count = 0
+    def select(self, start:float, stop:float, max_buckets:int)->Tuple[int, np.ndarray]:
+        """
+        Returns the buckets overlapping [start, stop) of the finest level with
+        at most about max_buckets buckets in the range (plus the edges and
+        the tail bucket).
+
+        :param start: start time.
+        :param stop: end time.
+        :param max_buckets: maximum number of buckets, e.g. the pixel width.
+        :return: (level, buckets), a copy of DTYPE buckets oldest first.
+        """
+        level = 0
+        if (self.lengths):
+            first, last = self.bucket_range(0, start, stop)
+            if (last - first > max_buckets):
+                level = int(np.ceil(np.log2((last - first) / max(1, max_buckets))))
+                level = min(level, len(self.levels) - 1)
+        buckets = self.level_buckets(level)
+        first, last = self.bucket_range(level, start, stop) if (self.lengths) else (0, 0)
+        selected = buckets[first:last]
+        tail = self.tail(level)
+        if (tail is not None and tail['t_last'] >= start and tail['t_first'] < stop):
+            selected = np.concatenate((selected, tail[None]))
+        return level, selected.copy()
+    def level_buckets(self, level:int)->np.ndarray:
+        """
+        Returns a view of the complete buckets of a level, oldest first.
+        """
+        if (level >= len(self.levels)): return np.zeros(0, dtype=self.DTYPE)
+        return self.levels[level][:self.lengths[level]]
+    def bucket_size(self, level:int)->int:
+        """
+        Returns the number of samples of a bucket of a level.
+        """
+        return 1 << (self.min_level + level)
+    @property
+    def nbytes(self)->int:
+        """
+        Returns the bytes allocated for the buckets.
+        """
+        return sum(level.nbytes for level in self.levels)
+
+    # helper methods ###########################################################
+    def push_pending(self):
+        """
+        Roll the pending samples up into a level 0 bucket.
+        """
+        v = self.pending_v
+        bucket = np.array([(self.pending_t[0], self.pending_t[-1], min(v), max(v), sum(v) / len(v))],
+                          dtype=self.DTYPE)
+        self.pending_t, self.pending_v = [], []
+        self.push_buckets(0, bucket)
+    def push_buckets(self, level:int, buckets:np.ndarray):
+        """
+        Add complete buckets to a level and roll complete pairs up through the
+        levels above.
+        """
+        while (len(buckets)):
+            self.store(level, buckets)
+            # buckets of this level not yet rolled up
+            up = self.lengths[level + 1] if (level + 1 < len(self.lengths)) else 0
+            start = 2*up
+            end = start + (self.lengths[level] - start) // 2 * 2
+            if (end == start): break
+            a = self.levels[level][start:end:2]
+            b = self.levels[level][start + 1:end:2]
+            buckets = np.empty(len(a), dtype=self.DTYPE)
+            buckets['t_first'], buckets['t_last'] = a['t_first'], b['t_last']
+            buckets['min'] = np.minimum(a['min'], b['min'])
+            buckets['max'] = np.maximum(a['max'], b['max'])
+            buckets['mean'] = (a['mean'] + b['mean']) / 2
+            level += 1
+    def store(self, level:int, buckets:np.ndarray):
+        """
+        Append buckets to a level, growing its array by doubling.
+        """
+        if (level == len(self.levels)):
+            self.levels.append(np.zeros(max(self.MIN_CAPACITY, len(buckets)), dtype=self.DTYPE))
+            self.lengths.append(0)
+        n = self.lengths[level]
+        if (n + len(buckets) > len(self.levels[level])):
+            grown = np.zeros(max(2*len(self.levels[level]), n + len(buckets)), dtype=self.DTYPE)
+            grown[:n] = self.levels[level][:n]
+            self.levels[level] = grown
+        self.levels[level][n:n + len(buckets)] = buckets
+        self.lengths[level] = n + len(buckets)
+    def tail(self, level:int)->np.ndarray:
+        """
+        Returns the rollup of the samples after the last complete bucket of a
+        level, None if there are none.
+        """
+        parts = []
+        for i in range(min(level, len(self.levels))):
+            # a bucket of level i not yet rolled up into level i+1
+            up = self.lengths[i + 1] if (i + 1 < len(self.lengths)) else 0
+            if (self.lengths[i] > 2*up):
+                parts.append((self.levels[i][self.lengths[i] - 1], self.bucket_size(i)))
+        if (self.pending_t):
+            v = self.pending_v
+            pending = np.array((self.pending_t[0], self.pending_t[-1], min(v), max(v), sum(v) / len(v)),
+                               dtype=self.DTYPE)
+            parts.append((pending, len(v)))
+        if (not parts): return None
+        count = sum(n for _, n in parts)
+        return np.array((min(bucket['t_first'] for bucket, _ in parts),
+                         max(bucket['t_last'] for bucket, _ in parts),
+                         min(bucket['min'] for bucket, _ in parts),
+                         max(bucket['max'] for bucket, _ in parts),
+                         sum(bucket['mean'] * n for bucket, n in parts) / count), dtype=self.DTYPE)
+    def bucket_range(self, level:int, start:float, stop:float)->Tuple[int, int]:
+        """
+        Returns the index range [first, last) of the complete buckets of a
+        level overlapping [start, stop).
+        """
+        buckets = self.level_buckets(level)
+        first = np.searchsorted(buckets['t_last'], start, side='left')
+        last  = np.searchsorted(buckets['t_first'], stop, side='left')
+        return int(first), int(last)
+    @staticmethod
+    def envelope(buckets:np.ndarray)->Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the (x, y) line through the min and max of each bucket at its
+        center time, to draw the buckets as one curve.
+        """
+        x = np.repeat((buckets['t_first'] + buckets['t_last']) / 2, 2)
+        y = np.column_stack((buckets['min'], buckets['max'])).ravel()
+        return x, y
+
+class MinMaxDecimator():
+    """
+    Streaming peak-preserving decimator of the newest window seconds of a
+    register series to a fixed number of time buckets, e.g. one per pixel
+    of a live graph.
+
+    Each bucket keeps its minimum and maximum sample, which are drawn as two
+    points in the order they occurred, so a spike of a single sample stays
+    visible at any rate while a redraw never has more than 2*(buckets + 1)
+    points. Buckets are aligned to multiples of window/buckets seconds and
+    kept in a ring written twice, at i and i + capacity (like
+    TelemetryStore), so the points are always one contiguous slice.
+
+    Usage:
+        decimator = MinMaxDecimator(window=60, buckets=width)
+        decimator.append(timestamp, value)
+        x, y = decimator.envelope()
+
+    Attributes:
+        window  : seconds of history kept.
+        buckets : number of buckets in the window.
+        width   : seconds per bucket.
+    """
+    # constructor ##############################################################
+    def __init__(self, window:float, buckets:int):
+        """
+        :param window: seconds of history kept.
+        :param buckets: number of buckets in the window.
+        """
+        self.window = window
+        self.resize(buckets)
+
+    # methods ##################################################################
+    def resize(self, buckets:int):
+        """
+        Change the number of buckets, removing all samples.
+        """
+        if (buckets <= 0): raise ValueError(f'Invalid buckets={buckets}')
+        self.buckets  = buckets
+        self.width    = self.window / buckets
+        self.capacity = buckets + 1 # a window spans buckets + 1 partial buckets
+        self.x = np.zeros(4*self.capacity)
+        self.y = np.zeros(4*self.capacity)
+        self.clear()
+    def clear(self):
+        """
+        Remove all samples.
+        """
+        self.size = 0 # number of closed buckets
+        self.head = 0 # index of the oldest closed bucket
+        self.current:list = None # open bucket [index, t_min, v_min, t_max, v_max]
+    def append(self, timestamp:float, value:float):
+        """
+        Add a sample.
+
+        :param timestamp: time of the sample, non-decreasing.
+        :param value: the value.
+        """
+        index = int(timestamp // self.width)
+        current = self.current
+        if (current is not None and index <= current[0]):
+            if (value < current[2]): current[1], current[2] = timestamp, value
+            if (value > current[4]): current[3], current[4] = timestamp, value
+            return
+        if (current is not None): self.close_bucket()
+        self.current = [index, timestamp, value, timestamp, value]
+    def extend(self, timestamps:np.ndarray, values:np.ndarray):
+        """
+        Add samples.
+        """
+        for timestamp, value in zip(np.asarray(timestamps).tolist(), np.asarray(values).tolist()):
+            self.append(timestamp, value)
+    def envelope(self)->Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the (x, y) points of the window, oldest first: the minimum
+        and maximum of each bucket in the order they occurred.
+        """
+        end = 2*(self.head + self.size)
+        x, y = self.x[end - 2*self.size:end], self.y[end - 2*self.size:end]
+        if (self.current is not None):
+            x = np.concatenate((x, self.points(self.current)[0]))
+            y = np.concatenate((y, self.points(self.current)[1]))
+        if (len(x)):
+            first = np.searchsorted(x, x[-1] - self.window)
+            x, y = x[first:], y[first:]
+        return x, y
+
+    # helper methods ###########################################################
+    def close_bucket(self):
+        """
+        Move the open bucket into the ring, overwriting the oldest bucket.
+        """
+        if (self.size < self.capacity):
+            i = self.head + self.size
+            self.size += 1
+        else:
+            i = self.head
+            self.head = (self.head + 1) % self.capacity
+        x, y = self.points(self.current)
+        for j in (2*i, 2*(i + self.capacity)):
+            self.x[j:j + 2] = x
+            self.y[j:j + 2] = y
+    @staticmethod
+    def points(bucket:list)->Tuple[tuple, tuple]:
+        """
+        Returns the (x, y) of the minimum and maximum of a bucket in time
+        order.
+        """
+        _, t_min, v_min, t_max, v_max = bucket
+        if (t_max < t_min): return (t_max, t_min), (v_max, v_min)
+        return (t_min, t_max), (v_min, v_max)
+
+class TelemetryRollup():
+    """
+    A RollupPyramid per register, fed with TelemetryEngine batches or loaded
+    from a TelemetryRecorder recording or a TelemetryArchive.
+
+    Usage:
+        rollup = TelemetryRollup(TelemetryEngine.TELEMETRY)
+        rollup.extend_recording(load_recording('telemetry.rec'))
+        engine.subscribe(rollup.extend)
+        level, buckets = rollup.pyramids[MonitorFPGA.CMD_127].select(start, stop, 800)
+
+    Attributes:
+        names    : the registers (command names).
+        pyramids : RollupPyramid by name.
+    """
+    # constructor ##############################################################
+    def __init__(self, names:List[str], min_level:int=2):
+        """
+        :param names: the registers (command names).
+        :param min_level: log2 of the number of samples of a level 0 bucket.
+        """
+        self.names = list(names)
+        self.pyramids:Dict[str, RollupPyramid] = {name: RollupPyramid(min_level) for name in self.names}
+
+    # methods ##################################################################
+    def extend(self, samples:List[TelemetrySample]):
+        """
+        Roll up TelemetrySamples (e.g. a TelemetryEngine batch).
+        """
+        for sample in samples:
+            pyramid = self.pyramids.get(sample.name)
+            if (pyramid is not None): pyramid.append(sample.timestamp, sample.value)
+    def extend_recording(self, records:np.ndarray):
+        """
+        Roll up the registers read in TelemetryRecorder records (see
+        load_recording), skipping the values carried over from earlier reads.
+        """
+        names = [name for name in records.dtype.names if (name not in ('timestamp', 'mask'))]
+        for i, name in enumerate(names):
+            if (name not in self.pyramids): continue
+            read = (records['mask'] & np.uint64(1 << i)) != 0
+            self.pyramids[name].extend(records['timestamp'][read], records[name][read])
+    def extend_archive(self, archive):
+        """
+        Roll up the registers of a TelemetryArchive one chunk at a time.
+        """
+        for name in self.names:
+            if (name not in archive.index): continue
+            for chunk in archive.chunks(name):
+                times, values = archive.read_chunk(name, chunk)
+                self.pyramids[name].extend(times / archive.TIME_SCALE, values.astype(archive.dtypes[name]))
+    def clear(self):
+        """
+        Remove all samples.
+        """
+        for pyramid in self.pyramids.values(): pyramid.clear()
+
+
+# Main #########################################################################
+def main():
+    from MonitorFPGA import MonitorFPGA
+    from MonitorTest import MonitorFPGATest
+
+    mtester = MonitorFPGATest(MonitorFPGA())
+    mtester.test_rollup_pyramid()
+    mtester.test_minmax_decimator()
+    mtester.benchmark_rollup_pyramid()
+
+if __name__ == '__main__':
+    main()
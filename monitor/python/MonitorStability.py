@@ -0,0 +1,207 @@
+# Imports ######################################################################
+from MonitorFPGA import MonitorFPGA
+from MonitorTelemetry import TelemetrySample
+
+import numpy as np
+
+from typing import List, NamedTuple
+
+# Globals ######################################################################
+
+
+# Library ######################################################################
+class StabilityResult(NamedTuple):
+    """
+    Frequency stability of phase data at averaging times tau = m*tau0.
+
+    Attributes:
+        taus  : averaging times in seconds.
+        ms    : averaging factors.
+        adev  : overlapping Allan deviations.
+        mdev  : modified Allan deviations.
+        tdev  : time deviations (seconds, in phase units times scale).
+        terms : number of terms of the modified Allan variance sums.
+    """
+    taus  : np.ndarray
+    ms    : np.ndarray
+    adev  : np.ndarray
+    mdev  : np.ndarray
+    tdev  : np.ndarray
+    terms : np.ndarray
+
+class StabilityEngine():
+    """
+    Streaming overlapping Allan (ADEV), modified Allan (MDEV) and time
+    (TDEV) deviations of phase samples at octave averaging factors
+    m = 1, 2, 4, ... max_m.
+
+    For phase x[i] sampled every tau0 and tau = m*tau0:
+        AVAR(tau)  = sum_i (x[i+2m] - 2x[i+m] + x[i])^2 / (2 tau^2 (N-2m))
+        MVAR(tau)  = sum_j (C[j+3m] - 3C[j+2m] + 3C[j+m] - C[j])^2
+                     / (2 m^2 tau^2 (N-3m+1))
+        TVAR(tau)  = tau^2/3 MVAR(tau)
+    where C[k] = x[0] + ... + x[k-1], so the inner sums of the modified
+    Allan variance are differences of prefix sums. Each new sample adds one
+    term to every sum from the last 3*max_m samples and prefix sums, kept in
+    ring buffers, so an update is O(1) per tau and memory is O(max_m)
+    regardless of the run length.
+
+    Samples are assumed to be tau0 apart. A missed read shifts the later
+    samples by tau0, extend() counts these gaps in stats.
+
+    Usage:
+        engine = StabilityEngine(tau0=1.0, scale=PHASE_LSB_SECONDS)
+        telemetry.subscribe(engine.extend)
+        result = engine.result()
+        result.taus, result.adev
+
+    Attributes:
+        tau0  : seconds between samples.
+        scale : seconds per phase unit (e.g. per count of reg127).
+        name  : register (command name) taken from TelemetrySamples.
+        ms    : the averaging factors.
+        stats : sample and gap counters.
+    """
+    # constants ################################################################
+    MAX_M = 1 << 16
+
+    # constructor ##############################################################
+    def __init__(self, tau0:float=1.0, scale:float=1.0, max_m:int=MAX_M,
+                       name:str=MonitorFPGA.CMD_127):
+        """
+        :param tau0: seconds between samples.
+        :param scale: seconds per phase unit.
+        :param max_m: largest averaging factor, rounded down to a power of 2.
+        :param name: register (command name) taken from TelemetrySamples.
+        """
+        if (tau0 <= 0 or max_m < 1): raise ValueError(f'Invalid tau0={tau0} or max_m={max_m}')
+        self.tau0  = tau0
+        self.scale = scale
+        self.name  = name
+        self.ms    = [1 << k for k in range(max_m.bit_length())]
+        self.size  = 3*self.ms[-1] + 1 # ring length
+        self.clear()
+
+    # methods ##################################################################
+    def append(self, phase:float):
+        """
+        Add the next phase sample.
+        """
+        if (self.n == 0): self.offset = phase
+        # offset to the first sample keeps the prefix sums small
+        x = phase - self.offset
+        n, size = self.n, self.size
+        xs, cs = self.x_ring, self.c_ring
+        xs[n % size] = x
+        c = cs[n % size] + x
+        cs[(n + 1) % size] = c
+        self.n = n = n + 1
+        for k, m in enumerate(self.ms):
+            if (n < 2*m + 1): break
+            # x[n-1], x[n-1-m], x[n-1-2m]
+            d = x - 2*xs[(n - 1 - m) % size] + xs[(n - 1 - 2*m) % size]
+            self.adev_sums[k] += d*d
+            if (n < 3*m): continue
+            # C[n], C[n-m], C[n-2m], C[n-3m]
+            s = c - 3*cs[(n - m) % size] + 3*cs[(n - 2*m) % size] - cs[(n - 3*m) % size]
+            self.mdev_sums[k] += s*s
+    def extend(self, samples:List[TelemetrySample]):
+        """
+        Add the phase samples in TelemetrySamples (e.g. a TelemetryEngine
+        batch) of the register name.
+        """
+        for sample in samples:
+            if (sample.name != self.name): continue
+            if (self.last_time is not None and sample.timestamp - self.last_time > 1.5*self.tau0):
+                self.stats['gaps'] += 1
+            self.last_time = sample.timestamp
+            self.append(sample.value)
+    def clear(self):
+        """
+        Remove all samples.
+        """
+        self.n = 0
+        self.offset = 0.0
+        self.last_time = None
+        self.x_ring = [0.0] * self.size
+        self.c_ring = [0.0] * self.size
+        self.adev_sums = [0.0] * len(self.ms)
+        self.mdev_sums = [0.0] * len(self.ms)
+        self.stats = {'gaps': 0}
+    def result(self)->StabilityResult:
+        """
+        Returns the deviations of the averaging factors with at least one
+        modified Allan variance term.
+        """
+        ms = np.array([m for m in self.ms if (self.n >= 3*m)], dtype=np.int64)
+        k = len(ms)
+        adev_terms = self.n - 2*ms
+        terms = self.n - 3*ms + 1
+        taus = ms * self.tau0
+        scale = self.scale**2
+        avar = np.array(self.adev_sums[:k]) * scale / (2 * taus**2 * adev_terms)
+        mvar = np.array(self.mdev_sums[:k]) * scale / (2 * ms**2 * taus**2 * terms)
+        mdev = np.sqrt(mvar)
+        return StabilityResult(taus, ms, np.sqrt(avar), mdev, taus / np.sqrt(3) * mdev, terms)
+    def __len__(self)->int:
+        """
+        Returns the number of samples added.
+        """
+        return self.n
+
+def stability_batch(phase:np.ndarray, tau0:float=1.0, scale:float=1.0,
+                    ms:List[int]=None)->StabilityResult:
+    """
+    Vectorized overlapping ADEV, MDEV and TDEV of phase data, with the same
+    definitions as StabilityEngine.
+
+    :param phase: phase samples every tau0.
+    :param tau0: seconds between samples.
+    :param scale: seconds per phase unit.
+    :param ms: averaging factors, defaults to the octaves with at least one
+        modified Allan variance term.
+    """
+    x = (np.asarray(phase, dtype=np.float64) - phase[0]) * scale
+    n = len(x)
+    if (ms is None): ms = [1 << k for k in range(max(1, n // 3).bit_length()) if (3 << k <= n)]
+    ms = np.array([m for m in ms if (3*m <= n)], dtype=np.int64)
+    c = np.concatenate(([0.0], np.cumsum(x)))
+    adev, mdev, terms = [], [], []
+    for m in ms.tolist():
+        d = x[2*m:] - 2*x[m:n - m] + x[:n - 2*m]
+        adev.append(np.sqrt(np.dot(d, d) / (2 * (m*tau0)**2 * len(d))))
+        s = c[3*m:] - 3*c[2*m:n + 1 - m] + 3*c[m:n + 1 - 2*m] - c[:n + 1 - 3*m]
+        mdev.append(np.sqrt(np.dot(s, s) / (2 * m**2 * (m*tau0)**2 * len(s))))
+        terms.append(len(s))
+    taus = ms * tau0
+    mdev = np.array(mdev)
+    return StabilityResult(taus, ms, np.array(adev), mdev, taus / np.sqrt(3) * mdev, np.array(terms))
+
+def stability_from_recording(records:np.ndarray, name:str=MonitorFPGA.CMD_127,
+                             scale:float=1.0)->StabilityResult:
+    """
+    Batch deviations of a register in TelemetryRecorder records (see
+    load_recording), from the records where it was read. tau0 is the median
+    interval between the reads.
+
+    :param records: the records.
+    :param name: the phase register (command name).
+    :param scale: seconds per phase unit.
+    """
+    names = [field for field in records.dtype.names if (field not in ('timestamp', 'mask'))]
+    read = (records['mask'] & np.uint64(1 << names.index(name))) != 0
+    times = records['timestamp'][read]
+    tau0 = float(np.median(np.diff(times))) if (len(times) > 1) else 1.0
+    return stability_batch(records[name][read], tau0, scale)
+
+
+# Main #########################################################################
+def main():
+    from MonitorTest import MonitorFPGATest
+
+    mtester = MonitorFPGATest(MonitorFPGA())
+    mtester.test_stability()
+    mtester.benchmark_stability()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,440 @@
+# Imports ######################################################################
+from MonitorFPGA import MonitorFPGA
+
+import threading
+import serial
+import numpy as np
+
+from time import time, perf_counter, sleep
+from typing import Callable, Dict, List, NamedTuple
+
+# Globals ######################################################################
+
+
+# Library ######################################################################
+class TelemetrySample(NamedTuple):
+    """
+    A timestamped register value.
+
+    Attributes:
+        timestamp : time.time() the register was read.
+        name      : name of the command (e.g. MonitorFPGA.CMD_127).
+        value     : the read data.
+    """
+    timestamp : float
+    name      : str
+    value     : int
+
+class TelemetryEngine():
+    """
+    Acquisition engine that owns a MonitorFPGA and reads the telemetry
+    registers from its own thread.
+
+    Every register is read on its own schedule (rate in Hz). Registers that
+    are due together are read in one execute_commands batch, or with a group
+    read command when all of a group's members are due. Samples are
+    timestamped and published in batches to the subscribed consumers.
+
+    Other FPGA commands (e.g. from the GUI) are submitted to the engine and run
+    on its thread between reads, so nothing else touches the uart.
+
+    Usage:
+        engine = TelemetryEngine(monitor, rates={MonitorFPGA.CMD_127: 10})
+        engine.subscribe(lambda samples: print(samples))
+        engine.start()
+        ...
+        engine.stop()
+
+    Attributes:
+        monitor        : the FPGA monitor.
+        rates          : read rate in Hz of each register by command name.
+        publish_period : time in seconds between published batches.
+        timeout        : timeout in seconds of each uart transaction.
+        stats          : read, sample and error counters.
+    """
+    # constants ################################################################
+    TELEMETRY = [
+        MonitorFPGA.CMD_124, MonitorFPGA.CMD_125,
+        MonitorFPGA.CMD_126, MonitorFPGA.CMD_127,
+    ]
+    DEFAULT_RATE     = 1.0 # Hz
+    RECONNECT_PERIOD = 5.0 # seconds between connection attempts
+
+    # exceptions ###############################################################
+    class EngineStateError(Exception):
+        """
+        Raised when the engine is started or stopped in the wrong state.
+        """
+        pass
+
+    # constructor ##############################################################
+    def __init__(self, monitor:MonitorFPGA, rates:Dict[str, float]=None,
+                       publish_period:float=0.1, timeout:float=1.0,
+                       log:Callable[[str], None]=None):
+        """
+        Initializes the engine.
+
+        :param monitor: the FPGA monitor, only used from the engine thread.
+        :param rates: read rate in Hz by command name, defaults to all the
+            telemetry registers at DEFAULT_RATE.
+        :param publish_period: time in seconds between published batches.
+        :param timeout: timeout in seconds of each uart transaction.
+        :param log: called from the engine thread with read errors.
+        """
+        self.monitor        = monitor
+        self.rates:Dict[str, float] = {}
+        self.publish_period = publish_period
+        self.timeout        = timeout
+        self.log            = log
+        self.stats          = {'reads': 0, 'samples': 0, 'errors': 0, 'batches': 0}
+        # scheduling
+        self.next_read:Dict[str, float] = {}
+        self.lock   = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread:threading.Thread = None
+        self.running = threading.Event()
+        # consumers and submitted commands
+        self.subscribers:List[Callable] = []
+        self.submitted = []
+        self.pending:List[TelemetrySample] = []
+        if (rates is None): rates = {name:self.DEFAULT_RATE for name in self.TELEMETRY}
+        for name, rate in rates.items(): self.set_rate(name, rate)
+
+    # methods ##################################################################
+    # control ##################################################################
+    def start(self):
+        """
+        Start acquiring in a background thread.
+
+        :raises:
+            EngineStateError: if already started.
+        """
+        if (self.thread is not None):
+            raise self.EngineStateError("Tried starting engine when already running")
+        self.running.set()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    def stop(self):
+        """
+        Stop acquiring and wait for the thread to finish.
+
+        :raises:
+            EngineStateError: if not started.
+        """
+        if (self.thread is None):
+            raise self.EngineStateError("Tried stopping engine when not running")
+        self.running.clear()
+        self.wakeup.set()
+        self.thread.join()
+        self.thread = None
+    def is_running(self)->bool:
+        """
+        Returns True if the engine thread is running.
+        """
+        return self.thread is not None
+    def set_rate(self, name:str, rate:float):
+        """
+        Set the read rate of a register.
+
+        :param name: name of the command to read.
+        :param rate: rate in Hz, 0 or None to stop reading the register.
+        """
+        self.monitor.get_command(name) # raises KeyError if unknown
+        with self.lock:
+            if (not rate):
+                self.rates.pop(name, None)
+                self.next_read.pop(name, None)
+            else:
+                self.rates[name] = rate
+                self.next_read[name] = perf_counter()
+        self.wakeup.set()
+    def subscribe(self, callback:Callable[[List[TelemetrySample]], None]):
+        """
+        Subscribe to batches of samples. callback is called from the engine
+        thread with a list of TelemetrySample.
+        """
+        self.subscribers.append(callback)
+    def submit(self, requests:List[tuple], callback:Callable=None):
+        """
+        Submit FPGA commands to run on the engine thread.
+
+        :param requests: (cmd, rw) or (cmd, rw, write_bytes) tuples, see
+            MonitorFPGA.execute_commands.
+        :param callback: called from the engine thread with the executed
+            commands, or with the exception if executing failed.
+        """
+        with self.lock:
+            self.submitted.append((requests, callback))
+        self.wakeup.set()
+
+    # engine thread ############################################################
+    def run(self):
+        """
+        Engine thread loop.
+        """
+        next_publish = perf_counter() + self.publish_period
+        while (self.running.is_set()):
+            # clear before the work so a wakeup during it is not lost
+            self.wakeup.clear()
+            if (not self.monitor.is_connected()):
+                self.monitor.connect_uart()
+                if (not self.monitor.is_connected()):
+                    self.wakeup.wait(self.RECONNECT_PERIOD)
+                    continue
+            self.run_submitted()
+            self.read_due()
+            now = perf_counter()
+            if (now >= next_publish):
+                self.publish()
+                next_publish = now + self.publish_period
+            # sleep until the next read, publish or submitted command
+            with self.lock:
+                next_time = min([next_publish] + list(self.next_read.values()))
+            delay = next_time - perf_counter()
+            if (delay > 0): self.wakeup.wait(delay)
+        self.publish()
+    def run_submitted(self):
+        """
+        Execute the submitted commands.
+        """
+        with self.lock:
+            submitted, self.submitted = self.submitted, []
+        for requests, callback in submitted:
+            try: result = self.monitor.execute_commands(requests, self.timeout)
+            except (Exception) as e:
+                self.stats['errors'] += 1
+                result = e
+            if (callback): callback(result)
+    def read_due(self):
+        """
+        Read the registers that are due and reschedule them.
+        """
+        now = perf_counter()
+        with self.lock:
+            due = [name for name, t in self.next_read.items() if (t <= now)]
+            for name in due:
+                period = 1.0 / self.rates[name]
+                self.next_read[name] += period
+                # skip missed reads instead of bursting to catch up
+                if (self.next_read[name] < now): self.next_read[name] = now + period
+        if (not due): return
+        requests, names = self.plan_reads(due)
+        try:
+            tstart = time()
+            cmds = self.monitor.execute_commands(requests, self.timeout)
+            tend = time()
+        except (self.monitor.WriteUartFail, self.monitor.ReadUartFail,
+                serial.SerialException) as e:
+            self.stats['errors'] += 1
+            self.emit_log(f'Telemetry read failed: {e}')
+            return
+        timestamp = (tstart + tend) / 2
+        for cmd in cmds:
+            if (isinstance(cmd, MonitorFPGA.GroupCommand)):
+                values = cmd.get_read_data()
+                samples = [TelemetrySample(timestamp, name, values[name])
+                           for name in values if (name in names)]
+            else:
+                samples = [TelemetrySample(timestamp, cmd.name, cmd.get_read_data())]
+            self.pending.extend(samples)
+            self.stats['samples'] += len(samples)
+        self.stats['reads'] += len(cmds)
+    def plan_reads(self, due:List[str]):
+        """
+        Returns the read requests for the due registers, using a group read
+        command for groups whose members are all due.
+
+        :return: (requests, names of the due registers)
+        """
+        names = set(due)
+        remaining = set(due)
+        requests = []
+        for cmd in self.monitor.commands.values():
+            if (not isinstance(cmd, MonitorFPGA.GroupCommand)): continue
+            members = {member.name for member in cmd.members}
+            if (members <= remaining):
+                requests.append((cmd, cmd.READ))
+                remaining -= members
+        for name in due:
+            if (name in remaining):
+                cmd = self.monitor.get_command(name)
+                requests.append((cmd, cmd.READ))
+        return requests, names
+    def publish(self):
+        """
+        Publish the pending samples to the subscribers.
+        """
+        if (not self.pending): return
+        batch, self.pending = self.pending, []
+        self.stats['batches'] += 1
+        for callback in self.subscribers:
+            callback(batch)
+    def emit_log(self, message:str):
+        """
+        Pass a message to the log callback.
+        """
+        if (self.log): self.log(message)
+
+class TelemetryStore():
+    """
+    Fixed capacity ring buffer time series of register telemetry.
+
+    The store has one timestamp column and one typed NumPy column per
+    register. Each row is one sweep of samples taken at the same timestamp; a
+    register that was not read in a row keeps its previous value.
+
+    Every row is written twice, at i and i + capacity, so the newest rows are
+    always one contiguous slice. Appending is O(1) and times()/values() return
+    zero-copy views for plotting.
+
+    Usage:
+        store = TelemetryStore(TelemetryEngine.TELEMETRY, seconds=3600, rate=10)
+        engine.subscribe(store.extend)
+        times, values = store.series(MonitorFPGA.CMD_127)
+
+    Attributes:
+        names    : the registers (command names) stored.
+        capacity : maximum number of rows kept.
+    """
+    # constants ################################################################
+    TIME_DTYPE = np.float64
+
+    # constructor ##############################################################
+    def __init__(self, names:List[str], capacity:int=None, seconds:float=None,
+                       rate:float=None, dtypes:Dict[str, str]=None):
+        """
+        Allocates the store.
+
+        :param names: the registers (command names) to store.
+        :param capacity: number of rows to keep, or
+        :param seconds: seconds of history to keep at rate rows per second.
+        :param rate: rows per second, used with seconds.
+        :param dtypes: NumPy dtype by name, defaults to dtype_for_command().
+        :raises:
+            ValueError: if neither capacity nor seconds and rate are given.
+        """
+        if (capacity is None):
+            if (seconds is None or rate is None):
+                raise ValueError("capacity or seconds and rate required")
+            capacity = int(np.ceil(seconds * rate))
+        if (capacity <= 0): raise ValueError(f'Invalid capacity={capacity}')
+        if (dtypes is None): dtypes = {}
+        self.names    = list(names)
+        self.capacity = capacity
+        self.size     = 0 # number of rows stored
+        self.head     = 0 # index of the oldest row
+        self.time_col = np.zeros(2*capacity, dtype=self.TIME_DTYPE)
+        self.columns  = {}
+        for name in self.names:
+            dtype = dtypes.get(name) or self.dtype_for_command(MonitorFPGA.commands[name])
+            self.columns[name] = np.zeros(2*capacity, dtype=dtype)
+        self.last_values = {name:0 for name in self.names}
+    def __len__(self)->int:
+        return self.size
+
+    # methods ##################################################################
+    def append(self, timestamp:float, values:Dict[str, int]):
+        """
+        Append a row. Registers missing from values keep their last value.
+
+        :param timestamp: time of the row.
+        :param values: register values by name.
+        """
+        self.last_values.update((name, value) for name, value in values.items() 
+                                if (name in self.columns))
+        if (self.size < self.capacity):
+            i = self.size
+            self.size += 1
+        else:
+            # overwrite the oldest row
+            i = self.head
+            self.head = (self.head + 1) % self.capacity
+        j = i + self.capacity
+        self.time_col[i] = self.time_col[j] = timestamp
+        for name, column in self.columns.items():
+            column[i] = column[j] = self.last_values[name]
+    def extend(self, samples:List[TelemetrySample]):
+        """
+        Append TelemetrySamples (e.g. a TelemetryEngine batch). Consecutive
+        samples with the same timestamp form one row.
+        """
+        row, timestamp = {}, None
+        for sample in samples:
+            if (timestamp is not None and sample.timestamp != timestamp):
+                self.append(timestamp, row)
+                row = {}
+            timestamp = sample.timestamp
+            row[sample.name] = sample.value
+        if (timestamp is not None): self.append(timestamp, row)
+    def clear(self):
+        """
+        Remove all rows.
+        """
+        self.size = 0
+        self.head = 0
+        self.last_values = {name:0 for name in self.names}
+    def times(self, last:int=None)->np.ndarray:
+        """
+        Returns a view of the timestamps, oldest first.
+
+        :param last: only the newest last rows.
+        """
+        return self.time_col[self.window(last)]
+    def values(self, name:str, last:int=None)->np.ndarray:
+        """
+        Returns a view of a register's values, oldest first.
+
+        :param name: the register (command name).
+        :param last: only the newest last rows.
+        """
+        return self.columns[name][self.window(last)]
+    def series(self, name:str, last:int=None):
+        """
+        Returns views (times, values) of a register, oldest first.
+        """
+        window = self.window(last)
+        return self.time_col[window], self.columns[name][window]
+    def window(self, last:int=None)->slice:
+        """
+        Returns the slice of the mirrored columns holding the newest last rows.
+        """
+        n = self.size if (last is None) else min(last, self.size)
+        end = self.head + self.size
+        return slice(end - n, end)
+
+    # helper methods ###########################################################
+    @staticmethod
+    def dtype_for_command(cmd:MonitorFPGA.Command)->str:
+        """
+        Returns the smallest NumPy integer dtype that holds a command's data.
+        """
+        no_bytes = 1
+        while (no_bytes < cmd.no_rbytes): no_bytes *= 2
+        kind = 'i' if (cmd.data_type == cmd.SIGNED_INT) else 'u'
+        return f'{kind}{no_bytes}'
+
+
+# Main #########################################################################
+def main():
+    from MonitorFPGAEmulator import FPGAEmulator
+
+    emulator = FPGAEmulator(realtime=True)
+    emulator.start()
+    monitor = MonitorFPGA(config=emulator.make_config())
+    rates = {name:20.0 for name in TelemetryEngine.TELEMETRY}
+    engine = TelemetryEngine(monitor, rates=rates, publish_period=0.25, log=print)
+    engine.subscribe(lambda batch: print(f'{len(batch)} samples, last {batch[-1]}'))
+    engine.start()
+    try:
+        for i in range(8):
+            emulator.set_register(127, i)
+            sleep(0.25)
+    except KeyboardInterrupt:
+        pass
+    engine.stop()
+    print(engine.stats)
+    monitor.close_uart()
+    emulator.stop()
+
+if __name__ == '__main__':
+    main()
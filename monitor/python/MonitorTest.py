@@ -1,9 +1,23 @@
 # Imports ######################################################################
 from distutils import command
-from time import sleep
+from time import sleep, perf_counter, process_time
 
 
 # Globals ######################################################################
+# one epoch of NMEA output recorded from the U-blox receiver
+NMEA_RECORDING = [
+    b'$GNRMC,002448.00,A,5208.71026,N,10642.83221,W,0.022,,200222,,,D,V*0F\r\n',
+    b'$GNVTG,,T,,M,0.022,N,0.041,K,D*3D\r\n',
+    b'$GNGGA,002448.00,5208.71026,N,10642.83221,W,2,12,0.55,501.4,M,-22.6,M,,0000*77\r\n',
+    b'$GNGSA,A,3,03,19,06,12,02,14,17,24,44,51,,,1.00,0.55,0.83,1*06\r\n',
+    b'$GNGSA,A,3,68,78,67,69,77,,,,,,,,1.00,0.55,0.83,2*07\r\n',
+    b'$GPGSV,3,1,12,02,36,291,40,03,11,035,29,06,71,291,44,12,18,243,35,1*61\r\n',
+    b'$GPGSV,3,2,12,14,12,177,31,17,50,108,43,19,59,063,45,24,27,303,38,1*66\r\n',
+    b'$GPGSV,3,3,12,44,29,209,39,46,29,196,,48,32,198,,51,29,203,37,1*6D\r\n',
+    b'$GLGSV,2,1,07,67,28,318,33,68,77,307,38,69,34,219,31,77,52,065,36,1*7D\r\n',
+    b'$GLGSV,2,2,07,78,64,300,40,79,16,336,,86,03,035,,1*41\r\n',
+    b'$GNGLL,5208.71026,N,10642.83221,W,002448.00,A,D*6C\r\n',
+]
 
 
 # Library ######################################################################
@@ -183,6 +197,663 @@ class MonitorFPGATest(MonitorTest):
         self.monitor.execute_command(cmd, rw, wbytes, timeout=None)
         print(cmd)
 
+    # benchmarks ###############################################################
+    def benchmark_execute_command(self, names:list=None, iterations:int=100):
+        """
+        Measures the latency and throughput of reading commands one at a time
+        (e.g. against MonitorFPGAEmulator).
+
+        :param names: names of the commands to read, defaults to reg124-reg127.
+        :param iterations: number of times to read every command.
+        """
+        if (names is None):
+            names = [self.monitor.CMD_124, self.monitor.CMD_125,
+                     self.monitor.CMD_126, self.monitor.CMD_127]
+        cmds = [self.monitor.get_command(name) for name in names]
+        tstart = perf_counter()
+        for _ in range(iterations):
+            for cmd in cmds:
+                self.monitor.execute_command(cmd, cmd.READ, timeout=1.0)
+        dt = perf_counter() - tstart
+        no_cmds = iterations * len(cmds)
+        print(f'execute_command: {no_cmds} reads in {dt:.3f}s | '
+              f'{no_cmds/dt:.1f} cmd/s | {1e3*dt/no_cmds:.3f} ms/cmd | '
+              f'{1e3*dt/iterations:.3f} ms/sweep')
+    def benchmark_execute_commands(self, names:list=None, iterations:int=100):
+        """
+        Measures the latency and throughput of reading commands in batches
+        with execute_commands.
+
+        :param names: names of the commands to read, defaults to reg124-reg127.
+        :param iterations: number of batches to read.
+        """
+        if (names is None):
+            names = [self.monitor.CMD_124, self.monitor.CMD_125,
+                     self.monitor.CMD_126, self.monitor.CMD_127]
+        requests = [(self.monitor.get_command(name), 'r') for name in names]
+        tstart = perf_counter()
+        for _ in range(iterations):
+            self.monitor.execute_commands(requests, timeout=1.0)
+        dt = perf_counter() - tstart
+        no_cmds = iterations * len(requests)
+        print(f'execute_commands: {no_cmds} reads in {dt:.3f}s | '
+              f'{no_cmds/dt:.1f} cmd/s | {1e3*dt/no_cmds:.3f} ms/cmd | '
+              f'{1e3*dt/iterations:.3f} ms/sweep')
+    def benchmark_cts_wait(self, iterations:int=100):
+        """
+        Measures the host CPU time spent in RTS/CTS handshakes while reading
+        a register (e.g. against MonitorFPGAEmulator with a cts_delay).
+
+        :param iterations: number of register reads.
+        """
+        cmd = self.monitor.get_command(self.monitor.CMD_127)
+        self.monitor.cts_stats.reset()
+        tstart, cstart = perf_counter(), process_time()
+        for _ in range(iterations):
+            self.monitor.execute_command(cmd, cmd.READ, timeout=1.0)
+        dt, dcpu = perf_counter() - tstart, process_time() - cstart
+        print(f'cts wait: {iterations} reads in {dt:.3f}s | cpu {dcpu:.3f}s '
+              f'({100*dcpu/dt:.1f}% of a core)')
+        print(f'   {self.monitor.cts_stats}')
+    def benchmark_write_payload(self, iterations:int=100):
+        """
+        Compares writing a 4 byte register payload one byte at a time against
+        a single block write with write_bytes_uart_flow.
+
+        :param iterations: number of register writes per mode.
+        """
+        cmd = self.monitor.get_command(self.monitor.CMD_4)
+        wbytes = b'\x01\x02\x03\x04'
+        self.monitor.prepare_command(cmd, cmd.WRITE, wbytes)
+        no_bytes = cmd.rw_no_bytes(cmd.no_wbytes)
+        for block in (False, True):
+            self.monitor.cts_stats.reset()
+            dt = 0.0
+            for _ in range(iterations):
+                self.monitor.flush_buffers_uart()
+                self.monitor.write_byte_uart_flow(cmd.cbyte, timeout=1.0)
+                self.monitor.write_byte_uart_flow(no_bytes, timeout=1.0)
+                tstart = perf_counter()
+                self.monitor.write_bytes_uart_flow(wbytes, timeout=1.0, 
+                                                   big_endian=False, block=block)
+                dt += perf_counter() - tstart
+            handshakes = self.monitor.cts_stats.no_waits / iterations
+            print(f'write payload block={block}: {1e3*dt/iterations:.3f} ms/write | '
+                  f'{1e6*dt/(iterations*len(wbytes)):.1f} us/byte | '
+                  f'{handshakes:.0f} handshakes/write')
+    def benchmark_read_telemetry(self, iterations:int=100):
+        """
+        Measures the latency of reading reg124-reg127 with the group read
+        command.
+
+        :param iterations: number of group reads.
+        """
+        tstart = perf_counter()
+        for _ in range(iterations):
+            cmd = self.monitor.read_telemetry(timeout=1.0)
+        dt = perf_counter() - tstart
+        print(f'read_telemetry: {iterations} group reads in {dt:.3f}s | '
+              f'{1e3*dt/iterations:.3f} ms/sweep')
+        print(cmd)
+
+    def test_telemetry_recorder(self, path:str, no_records:int=1000):
+        """
+        Test a TelemetryRecorder: records read back while recording, from a
+        recorder that crashed without closing, and after appending to the
+        file again.
+
+        :param path: recording file to create, must not exist.
+        :param no_records: number of records written by each recorder.
+        """
+        import os
+        import numpy as np
+        from MonitorRecorder import TelemetryRecorder, load_recording
+        from MonitorTelemetry import TelemetryEngine, TelemetrySample
+        names = TelemetryEngine.TELEMETRY
+        def batch(t):
+            # every register each 10th record, else only the phase error
+            due = names if (t % 10 == 0) else [self.monitor.CMD_127]
+            return [TelemetrySample(float(t), name, (t * (i + 1)) % 1000)
+                    for i, name in enumerate(names) if (name in due)]
+
+        pid = os.fork()
+        if (pid == 0):
+            # child crashes after recording, without closing
+            try:
+                recorder = TelemetryRecorder(path, names)
+                for t in range(no_records): recorder.extend(batch(t))
+            finally: os._exit(0)
+        os.waitpid(pid, 0)
+        records = load_recording(path)
+        assert len(records) == no_records and records['timestamp'][-1] == no_records - 1
+        phase = (np.arange(no_records) * (names.index(self.monitor.CMD_127) + 1)) % 1000
+        assert (records[self.monitor.CMD_127] == phase).all()
+        # registers not read keep their last value
+        assert records[names[0]][no_records - 1] == records[names[0]][(no_records - 1) // 10 * 10]
+        assert records['mask'][10] == 2**len(names) - 1
+        assert records['mask'][11] == 1 << names.index(self.monitor.CMD_127)
+
+        # append, readable while recording
+        with TelemetryRecorder(path, names) as recorder:
+            for t in range(no_records, 2*no_records):
+                recorder.extend(batch(t))
+                if (t == no_records + 10): assert len(load_recording(path)) == no_records + 11
+        records = load_recording(path)
+        assert len(records) == 2*no_records and (np.diff(records['timestamp']) == 1).all()
+        assert os.path.getsize(path) == TelemetryRecorder.HEADER_SIZE + 2*no_records*records.itemsize
+        try:
+            TelemetryRecorder(path, names[:2])
+            assert False, 'opened recording with other registers'
+        except TelemetryRecorder.RecordingFileError: pass
+        print(f'test_telemetry_recorder: {len(records)} records of {records.itemsize} bytes read back')
+
+    def test_capture_replay(self, path:str, no_reads:int=20):
+        """
+        Test capturing telemetry reads from an FPGAEmulator and replaying the
+        capture: the replayed reads return the same values and the replayed
+        writes match the captured ones.
+
+        :param path: capture file to create.
+        :param no_reads: number of telemetry group reads.
+        """
+        from MonitorCapture import load_capture, make_replay_config
+        from MonitorFPGA import MonitorFPGA
+        emulator = self.monitor.config.uart_class.emulator
+        capture = self.monitor.start_capture(path)
+        values = []
+        for i in range(no_reads):
+            emulator.set_register(127, i)
+            values.append(self.monitor.read_telemetry(timeout=1.0).get_read_data())
+        self.monitor.stop_capture()
+        _, events = load_capture(path)
+        assert sum(len(event.data) for event in events) == \
+               capture.stats['read_bytes'] + capture.stats['write_bytes']
+
+        for speed in (None, 10.0):
+            replay = MonitorFPGA(config=make_replay_config(path, self.monitor.config, speed))
+            replayed = [replay.read_telemetry(timeout=1.0).get_read_data() for _ in range(no_reads)]
+            stats = replay.uart.stats
+            assert replayed == values, f'replay at speed {speed} returned other values'
+            assert stats['read_bytes'] == capture.stats['read_bytes'] and stats['write_mismatches'] == 0
+            replay.close_uart()
+        print(f'test_capture_replay: {len(events)} events, {no_reads} telemetry reads replayed')
+
+    def benchmark_telemetry_recorder(self, path:str, no_records:int=200000):
+        """
+        Measures the time to append records of reg124-reg127 to a
+        TelemetryRecorder and to load the recording.
+
+        :param path: recording file to create, must not exist.
+        :param no_records: number of records appended.
+        """
+        from MonitorRecorder import TelemetryRecorder, load_recording
+        from MonitorTelemetry import TelemetryEngine
+        names = TelemetryEngine.TELEMETRY
+        values = {name: i for i, name in enumerate(names)}
+        with TelemetryRecorder(path, names) as recorder:
+            tstart, cstart = perf_counter(), process_time()
+            for t in range(no_records): recorder.append(float(t), values)
+            dt, dcpu = perf_counter() - tstart, process_time() - cstart
+        tstart = perf_counter()
+        phase = load_recording(path)[self.monitor.CMD_127].mean()
+        dt_load = perf_counter() - tstart
+        print(f'TelemetryRecorder: {no_records} records in {dt:.3f}s | '
+              f'{1e6*dcpu/no_records:.2f} us cpu/record | {no_records*recorder.dtype.itemsize/1e6:.1f} MB | '
+              f'load and mean in {1e3*dt_load:.2f} ms')
+
+    def test_telemetry_archive(self, directory:str, chunk_size:int=256):
+        """
+        Test a TelemetryArchive: round trips of irregular timestamps and
+        extreme values, range queries only decoding the chunks they overlap,
+        appending after a crash cut a chunk short, and archiving a
+        TelemetryRecorder recording.
+
+        :param directory: directory for the archive files.
+        :param chunk_size: samples per chunk.
+        """
+        import os
+        import numpy as np
+        from MonitorArchive import TelemetryArchive, archive_recording
+        from MonitorRecorder import TelemetryRecorder, load_recording
+        from MonitorTelemetry import TelemetryEngine, TelemetrySample
+        rng = np.random.default_rng(1)
+        n = 10*chunk_size + 7
+        # 1 Hz with jitter, a gap and a repeated timestamp
+        times = 1.6e9 + np.arange(n) + rng.integers(-500, 500, n) * 1e-6
+        times[n//2:] += 3600
+        times[n//3] = times[n//3 - 1]
+        series = {
+            'reg124_integral'   : rng.integers(-2**31, 2**31, n),
+            'reg125_dac_out'    : np.cumsum(rng.integers(-3, 4, n)) + 30000,
+            'reg127_phase_error': np.round(rng.normal(0, 50, n)),
+            'reg_u64'           : np.array([0, 2**64 - 1] * (n // 2) + [2**63], dtype=np.uint64),
+        }
+        dtypes = {'reg124_integral': 'i4', 'reg125_dac_out': 'u2',
+                  'reg127_phase_error': 'i2', 'reg_u64': 'u8'}
+        path = os.path.join(directory, 'test.arc')
+        with TelemetryArchive(path, list(series), dtypes, chunk_size) as archive:
+            for name, values in series.items():
+                archive.extend_series(name, times[:-1], values[:-1])
+            # the last sample of every register in one append
+            archive.append(times[-1], {name: values[-1].item() for name, values in series.items()})
+        archive = TelemetryArchive(path, readonly=True)
+        for name, values in series.items():
+            t, v = archive.query(name)
+            assert v.dtype == np.dtype(dtypes[name]) and (v == values.astype(dtypes[name])).all(), name
+            assert (np.abs(t - times) < 1e-6).all(), name
+            assert [chunk.count for chunk in archive.chunks(name)] == [chunk_size]*10 + [7]
+            assert min(chunk.v_min for chunk in archive.chunks(name)) == values.astype(dtypes[name]).min()
+        # a range inside one chunk decodes one chunk
+        name = 'reg125_dac_out'
+        start, stop = times[chunk_size + 10], times[chunk_size + 20]
+        decoded = archive.stats['chunks_decoded']
+        t, v = archive.query(name, start, stop)
+        assert archive.stats['chunks_decoded'] - decoded == 1
+        assert len(t) == 10 and (v == series[name][chunk_size + 10:chunk_size + 20]).all()
+        assert len(archive.query(name, times[-1] + 1)[0]) == 0
+        assert len(archive.chunks(name, start, times[3*chunk_size])) == 2
+        archive.close()
+
+        # a crash cut the last chunk short, appending drops it
+        size = os.path.getsize(path)
+        with open(path, 'r+b') as file: file.truncate(size - 3)
+        with TelemetryArchive(path, chunk_size=chunk_size) as archive:
+            assert len(archive) == 4*(n - 7) + 3*7
+            archive.extend([TelemetrySample(times[-1] + 1, name, 1) for name in series])
+        with TelemetryArchive(path, readonly=True) as archive:
+            assert archive.query('reg_u64')[1][-1] == 1 and len(archive) == 4*n - 3
+        try:
+            TelemetryArchive(path, list(series)[:2])
+            assert False, 'opened archive with other registers'
+        except TelemetryArchive.ArchiveFileError: pass
+
+        # archive a recording, only the reads of each register
+        names = TelemetryEngine.TELEMETRY
+        recording = os.path.join(directory, 'test.rec')
+        with TelemetryRecorder(recording, names) as recorder:
+            for t in range(n):
+                due = names if (t % 10 == 0) else [self.monitor.CMD_127]
+                recorder.append(float(t), {name: (t * (i + 1)) % 1000 for i, name in enumerate(names)
+                                           if (name in due)})
+        records = load_recording(recording)
+        archive = archive_recording(recording, os.path.join(directory, 'test_rec.arc'), chunk_size)
+        with TelemetryArchive(archive.path, readonly=True) as archive:
+            t, v = archive.query(self.monitor.CMD_127)
+            assert (t == records['timestamp']).all() and (v == records[self.monitor.CMD_127]).all()
+            t, v = archive.query(self.monitor.CMD_124)
+            assert (t == records['timestamp'][::10]).all() and (v == records[self.monitor.CMD_124][::10]).all()
+        print(f'test_telemetry_archive: {len(series)} series of {n} samples round tripped')
+
+    def benchmark_telemetry_archive(self, path:str, days:float=7, rate:float=1.0):
+        """
+        Measures the size and the encoding and query speed of a
+        TelemetryArchive of synthetic phase error and DAC traces.
+
+        The phase error is white noise on a random walk, the DAC a slow
+        drift with small steps, sampled at rate with 1 ms timestamp jitter.
+
+        :param path: archive file to create, must not exist.
+        :param days: length of the traces.
+        :param rate: samples per second.
+        """
+        import os
+        import numpy as np
+        from MonitorArchive import TelemetryArchive
+        rng = np.random.default_rng(0)
+        n = int(days * 86400 * rate)
+        times = 1.6e9 + np.arange(n) / rate + rng.uniform(0, 1e-3, n)
+        phase = np.clip(np.cumsum(rng.normal(0, 0.5, n)) + rng.normal(0, 20, n), -2**15, 2**15 - 1)
+        dac = 30000 + np.cumsum(rng.choice([-1, 0, 0, 0, 0, 1], n))
+        traces = {self.monitor.CMD_127: phase.astype(np.int16), self.monitor.CMD_125: dac.astype(np.uint16)}
+        for name, values in traces.items():
+            single = os.path.splitext(path)[0] + f'_{name}.arc'
+            tstart = perf_counter()
+            with TelemetryArchive(single, [name]) as archive:
+                archive.extend_series(name, times, values)
+            dt_write = perf_counter() - tstart
+            size = os.path.getsize(single)
+            with TelemetryArchive(single, readonly=True) as archive:
+                tstart = perf_counter()
+                archive.query(name)
+                dt_read = perf_counter() - tstart
+                # one hour from the middle of the trace
+                start = times[n // 2]
+                tstart = perf_counter()
+                for _ in range(100): archive.query(name, start, start + 3600)
+                dt_hour = (perf_counter() - tstart) / 100
+            raw = n * (times.itemsize + values.itemsize)
+            print(f'TelemetryArchive {name:20}: {n} samples | {size/n:.2f} bytes/sample | '
+                  f'{raw/size:.1f}x smaller than raw | encode {1e9*dt_write/n:.0f} ns/sample | '
+                  f'decode {1e9*dt_read/n:.0f} ns/sample | 1 hour query {1e3*dt_hour:.2f} ms')
+
+    def test_rollup_pyramid(self, no_samples:int=5000, min_level:int=2):
+        """
+        Test a RollupPyramid built from a mix of single samples and arrays:
+        every bucket and the tail bucket match the min/max/mean of their
+        samples, select() stays within max_buckets, and TelemetryRollup
+        builds the same pyramids from a recording and an archive.
+
+        :param no_samples: number of samples rolled up.
+        :param min_level: log2 of the samples of a level 0 bucket.
+        """
+        import os
+        import tempfile
+        import numpy as np
+        from MonitorArchive import archive_recording
+        from MonitorRecorder import TelemetryRecorder, load_recording
+        from MonitorRollup import RollupPyramid, TelemetryRollup
+        rng = np.random.default_rng(2)
+        times = np.cumsum(rng.uniform(0.5, 1.5, no_samples))
+        values = np.cumsum(rng.integers(-10, 11, no_samples)).astype(np.float64)
+        pyramid = RollupPyramid(min_level)
+        i = 0
+        while (i < no_samples):
+            n = int(rng.integers(1, 40))
+            if (n < 10):
+                for j in range(i, min(i + n, no_samples)): pyramid.append(times[j], values[j])
+            else:
+                pyramid.extend(times[i:i + n], values[i:i + n])
+            i += n
+        assert len(pyramid) == no_samples
+        for level in range(len(pyramid.levels)):
+            size = pyramid.bucket_size(level)
+            buckets = pyramid.level_buckets(level)
+            assert len(buckets) == no_samples // size, f'level {level}'
+            v = values[:len(buckets)*size].reshape(-1, size)
+            assert (buckets['min'] == v.min(axis=1)).all() and (buckets['max'] == v.max(axis=1)).all()
+            assert np.allclose(buckets['mean'], v.mean(axis=1))
+            assert (buckets['t_first'] == times[:len(buckets)*size:size]).all()
+            # the complete buckets and the tail cover all the samples
+            rest, tail = values[len(buckets)*size:], pyramid.tail(level)
+            if (len(rest)):
+                assert tail['min'] == rest.min() and tail['max'] == rest.max() and np.isclose(tail['mean'], rest.mean())
+                assert tail['t_first'] == times[len(buckets)*size] and tail['t_last'] == times[-1]
+            else:
+                assert tail is None
+        for max_buckets in (1, 10, 100, 1000):
+            for start, stop in ((times[0], times[-1]), (times[100], times[200]), (times[-50], times[-1] + 1)):
+                level, selected = pyramid.select(start, stop, max_buckets)
+                assert len(selected) <= max_buckets + 3 or level == len(pyramid.levels) - 1
+                assert selected['min'].min() <= values[(times >= start) & (times < stop)].min()
+
+        # same rollups from a recording, an archive and the engine samples
+        names = [self.monitor.CMD_127, self.monitor.CMD_125]
+        with tempfile.TemporaryDirectory() as directory:
+            recording = os.path.join(directory, 'test.rec')
+            with TelemetryRecorder(recording, names) as recorder:
+                for t in range(no_samples):
+                    recorder.append(float(t), {self.monitor.CMD_127: int(values[t])} if (t % 3) else
+                                              {name: int(values[t]) + 10000 for name in names})
+            records = load_recording(recording)
+            from_recording = TelemetryRollup(names, min_level)
+            from_recording.extend_recording(records)
+            archive = archive_recording(recording, os.path.join(directory, 'test.arc'), chunk_size=333)
+            from_archive = TelemetryRollup(names, min_level)
+            with type(archive)(archive.path, readonly=True) as archive:
+                from_archive.extend_archive(archive)
+            for name in names:
+                a, b = from_recording.pyramids[name], from_archive.pyramids[name]
+                assert len(a) == len(b) == (no_samples if (name == self.monitor.CMD_127) else (no_samples + 2) // 3)
+                assert all((a.level_buckets(level) == b.level_buckets(level)).all() for level in range(len(a.levels)))
+        print(f'test_rollup_pyramid: {no_samples} samples in {len(pyramid.levels)} levels checked')
+
+    def test_minmax_decimator(self, no_samples:int=20000, rate:float=100.0, buckets:int=50):
+        """
+        Test a MinMaxDecimator: the envelope has the min and max of every
+        bucket of the window in time order, keeps a single sample spike and
+        never has more than 2*(buckets + 1) points.
+
+        :param no_samples: number of samples added.
+        :param rate: samples per second.
+        :param buckets: buckets in the window.
+        """
+        import numpy as np
+        from MonitorRollup import MinMaxDecimator
+        rng = np.random.default_rng(3)
+        times = 1000.0 + np.arange(no_samples) / rate + rng.uniform(0, 0.5/rate, no_samples)
+        values = rng.normal(0, 10, no_samples)
+        spike = no_samples - int(rate)
+        values[spike] = 1000
+        decimator = MinMaxDecimator(window=10.0, buckets=buckets)
+        for i in range(0, no_samples, 97):
+            decimator.extend(times[i:i + 97], values[i:i + 97])
+            x, y = decimator.envelope()
+            assert len(x) <= 2*(buckets + 1) and (np.diff(x) >= 0).all()
+        assert 1000 in y and times[spike] in x
+        # brute force min/max of the buckets in the window
+        index = (times // decimator.width).astype(np.int64)
+        keep = index >= index[-1] - buckets
+        for b in np.unique(index[keep])[1:]:
+            t, v = times[index == b], values[index == b]
+            assert v.min() in y and v.max() in y and t[v.argmin()] in x and t[v.argmax()] in x
+        decimator.resize(10)
+        assert len(decimator.envelope()[0]) == 0
+        print(f'test_minmax_decimator: {no_samples} samples decimated to {len(x)} points')
+
+    def benchmark_rollup_pyramid(self, days:float=7, rate:float=1.0, pixels:int=1000):
+        """
+        Measures building a RollupPyramid of synthetic phase error samples in
+        bulk and one sample at a time, and selecting the buckets to draw
+        ranges from an hour to the whole history at a pixel width. Also
+        measures a MinMaxDecimator of the live window at 1 kHz.
+
+        :param days: length of the history.
+        :param rate: samples per second.
+        :param pixels: width of the graph in pixels (max_buckets).
+        """
+        import numpy as np
+        from MonitorRollup import MinMaxDecimator, RollupPyramid
+        rng = np.random.default_rng(0)
+        n = int(days * 86400 * rate)
+        times = np.arange(n) / rate
+        values = np.cumsum(rng.normal(0, 0.5, n)) + rng.normal(0, 20, n)
+        pyramid = RollupPyramid()
+        tstart = perf_counter()
+        pyramid.extend(times, values)
+        dt_bulk = perf_counter() - tstart
+        live = RollupPyramid()
+        tstart = perf_counter()
+        for t, v in zip(times[:100000].tolist(), values[:100000].tolist()): live.append(t, v)
+        dt_live = (perf_counter() - tstart) / 100000
+        print(f'RollupPyramid: {n} samples in {len(pyramid.levels)} levels | {pyramid.nbytes/n:.1f} bytes/sample | '
+              f'bulk {1e9*dt_bulk/n:.0f} ns/sample | live {1e6*dt_live:.2f} us/sample')
+        decimator = MinMaxDecimator(window=60, buckets=pixels)
+        tstart = perf_counter()
+        for t, v in zip(times[:100000].tolist(), values[:100000].tolist()): decimator.append(t / 1000, v)
+        dt_live = (perf_counter() - tstart) / 100000
+        tstart = perf_counter()
+        for _ in range(100): x, _ = decimator.envelope()
+        dt = (perf_counter() - tstart) / 100
+        print(f'MinMaxDecimator: 1 kHz into {pixels} px | live {1e6*dt_live:.2f} us/sample | '
+              f'envelope of {len(x)} points {1e6*dt:.1f} us')
+        for seconds in (3600, 86400, n / rate):
+            start = times[-1] - seconds
+            tstart = perf_counter()
+            for _ in range(100):
+                level, buckets = pyramid.select(start, times[-1] + 1, pixels)
+                RollupPyramid.envelope(buckets)
+            dt = (perf_counter() - tstart) / 100
+            print(f'select {seconds/3600:7.1f} h at {pixels} px: level {level:2} | {len(buckets):4} buckets | '
+                  f'{1e6*dt:.1f} us')
+
+    def test_stability(self, no_samples:int=3000, max_m:int=256):
+        """
+        Test the stability statistics: the batch path against the NIST
+        SP 1065 1000 point test suite (overlapping ADEV, MDEV and TDEV at
+        m = 1, 10, 100), and a StabilityEngine fed one sample at a time
+        against the batch path, also through TelemetrySamples and a
+        recording.
+
+        :param no_samples: number of random phase samples.
+        :param max_m: largest averaging factor of the engine.
+        """
+        import os
+        import tempfile
+        import numpy as np
+        from MonitorRecorder import TelemetryRecorder, load_recording
+        from MonitorStability import StabilityEngine, stability_batch, stability_from_recording
+        from MonitorTelemetry import TelemetrySample
+        # NIST SP 1065 test suite: fractional frequency n(i)/(2^31 - 1) with
+        # n(1) = 1234567890, n(i+1) = 16807 n(i) mod (2^31 - 1), tau0 = 1
+        n, frequency = 1234567890, []
+        for _ in range(1000):
+            frequency.append(n / 2147483647)
+            n = 16807*n % 2147483647
+        phase = np.concatenate(([0.0], np.cumsum(frequency)))
+        result = stability_batch(phase, ms=[1, 10, 100])
+        assert np.allclose(result.adev, [2.922319e-01, 9.159953e-02, 3.241343e-02], rtol=2e-6, atol=0)
+        assert np.allclose(result.mdev, [2.922319e-01, 6.172376e-02, 2.170921e-02], rtol=2e-6, atol=0)
+        assert np.allclose(result.tdev, [1.687202e-01, 3.563623e-01, 1.253382e+00], rtol=2e-6, atol=0)
+
+        # streaming matches batch on white and random walk phase
+        rng = np.random.default_rng(4)
+        phase = np.round(rng.normal(0, 30, no_samples) + np.cumsum(rng.normal(0, 2, no_samples))) + 5000
+        engine = StabilityEngine(tau0=0.5, scale=1e-9, max_m=max_m)
+        for i, x in enumerate(phase.tolist()):
+            engine.append(x)
+            if (i == 10): assert engine.result().ms.tolist() == [1, 2]
+        streamed, batch = engine.result(), stability_batch(phase, 0.5, 1e-9, engine.ms)
+        assert streamed.ms.tolist() == batch.ms.tolist() == [1 << k for k in range(max_m.bit_length())]
+        for field in ('taus', 'adev', 'mdev', 'tdev', 'terms'):
+            assert np.allclose(getattr(streamed, field), getattr(batch, field), rtol=1e-9, atol=0), field
+
+        # engine samples with a missed read, and a recording
+        engine = StabilityEngine(tau0=1.0, max_m=max_m)
+        times = np.arange(no_samples, dtype=np.float64)
+        times[no_samples // 2:] += 1
+        engine.extend([TelemetrySample(t, name, int(x)) for t, x in zip(times, phase)
+                       for name in (self.monitor.CMD_125, self.monitor.CMD_127)])
+        assert len(engine) == no_samples and engine.stats['gaps'] == 1
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'test.rec')
+            with TelemetryRecorder(path, [self.monitor.CMD_125, self.monitor.CMD_127]) as recorder:
+                for t, x in zip(times, phase): recorder.append(t, {self.monitor.CMD_127: int(x)})
+            recorded = stability_from_recording(load_recording(path))
+        assert np.allclose(recorded.adev[:len(engine.ms)], engine.result().adev, rtol=1e-9, atol=0)
+        print(f'test_stability: NIST reference values and {no_samples} streamed samples checked')
+
+    def benchmark_stability(self, days:float=7, max_m:int=1 << 16):
+        """
+        Measures a StabilityEngine update per sample and the batch path over
+        days of synthetic 1 Hz phase error.
+
+        :param days: length of the batch trace.
+        :param max_m: largest averaging factor.
+        """
+        import numpy as np
+        from MonitorStability import StabilityEngine, stability_batch
+        rng = np.random.default_rng(0)
+        n = int(days * 86400)
+        phase = np.round(rng.normal(0, 20, n) + np.cumsum(rng.normal(0, 0.5, n)))
+        engine = StabilityEngine(tau0=1.0, max_m=max_m)
+        no_stream = min(n, 3*max_m + 100000)
+        values = phase[:no_stream].tolist()
+        tstart = perf_counter()
+        for x in values: engine.append(x)
+        dt_stream = (perf_counter() - tstart) / no_stream
+        tstart = perf_counter()
+        result = stability_batch(phase)
+        dt_batch = perf_counter() - tstart
+        print(f'StabilityEngine: {len(engine.ms)} taus | {1e6*dt_stream:.2f} us/sample | '
+              f'batch of {n} samples, {len(result.ms)} taus in {1e3*dt_batch:.0f} ms')
+
+    def test_holdover_predictor(self, days:float=2, period:float=10.0):
+        """
+        Test a HoldoverPredictor learning a synthetic locked loop: a DAC
+        following a linear drift with aging plus proportional noise, and an
+        integral proportional to the noise-free DAC. The holdover predictions
+        up to a day ahead stay within their bounds, beat holding the last
+        DAC, and the fit learns the integral gain and offset.
+
+        :param days: days of locked samples learned.
+        :param period: seconds between samples.
+        """
+        import numpy as np
+        from MonitorHoldover import HoldoverPredictor
+        from MonitorTelemetry import TelemetrySample
+        rng = np.random.default_rng(5)
+        n = int(days * 86400 / period)
+        times = 1.6e9 + np.arange(n) * period
+        def steady(t):
+            # drift of 1e-3 DAC/s with aging of 2e-9 DAC/s^2
+            t = t - times[0]
+            return 30000 + 1e-3*t + 1e-9*t**2
+        integral = np.round((steady(times) - 29000) / 0.5)
+        dac = np.round(steady(times) + rng.normal(0, 3, n))
+        predictor = HoldoverPredictor()
+        predictor.extend([TelemetrySample(t, name, int(value)) for t, d, i in zip(times, dac, integral)
+                          for name, value in ((predictor.INTEGRAL, i), (predictor.DAC, d))])
+        assert predictor.stats['updates'] == predictor.stats['fits'] == n
+        assert np.allclose(predictor.theta, [0.5, 29000], rtol=1e-3)
+        assert np.isclose(predictor.drift[1], 2e-9, rtol=0.2)
+        without_integral = HoldoverPredictor(use_integral=False)
+        for t, d in zip(times, dac): without_integral.update(t, d)
+        horizons = np.array([600, 3600, 12*3600, 86400]) + times[-1]
+        for model in (predictor, without_integral):
+            predicted, bounds = model.trajectory(horizons)
+            errors = np.abs(predicted - steady(horizons))
+            assert (errors <= bounds).all() and (np.diff(bounds) > 0).all()
+            assert errors[2] < np.abs(dac[-1] - steady(horizons[2])) / 4
+            assert model.predict(horizons[1]) == (predicted[1], bounds[1])
+        assert predictor.dac_word(horizons[0]) == round(predictor.predict(horizons[0])[0])
+        assert predictor.dac_word(times[-1] + 1e7) == 2**16 - 1
+        print(f'test_holdover_predictor: {n} samples, 12 h holdover error {errors[2]:.2f} '
+              f'(bound {bounds[2]:.2f}) vs {np.abs(dac[-1] - steady(horizons[2])):.1f} holding the DAC')
+
+    def test_holdover_long_run(self, days:float=14):
+        """
+        Test that a HoldoverPredictor stays stable over weeks of 1 Hz
+        samples of the test_holdover_predictor loop: the integral fit keeps
+        the gain and offset, both covariances stay positive semi-definite
+        and the holdover bounds still contain the truth at the end.
+
+        :param days: days of locked samples learned.
+        """
+        import numpy as np
+        from MonitorHoldover import HoldoverPredictor
+        rng = np.random.default_rng(7)
+        n = int(days * 86400)
+        times = np.arange(n, dtype=np.float64)
+        steady = lambda t: 30000 + 1e-3*t + 1e-9*t**2
+        integral = np.round((steady(times) - 29000) / 0.5).tolist()
+        dac = np.round(steady(times) + rng.normal(0, 3, n)).tolist()
+        predictor = HoldoverPredictor()
+        min_eigenvalue = np.inf
+        tstart = perf_counter()
+        for i, t in enumerate(times.tolist()):
+            predictor.update(t, dac[i], integral[i])
+            if (i % 86400 == 86399):
+                min_eigenvalue = min(min_eigenvalue, np.linalg.eigvalsh(predictor.fit_P).min(),
+                                     np.linalg.eigvalsh(predictor.P).min())
+                # within the noise of a fit over the forgetting window
+                assert np.allclose(predictor.theta, [0.5, 29000], rtol=0, atol=(5e-3, 10)), predictor.theta
+        dt = perf_counter() - tstart
+        assert min_eigenvalue >= 0, f'covariance not positive semi-definite: {min_eigenvalue}'
+        horizons = np.array([600, 3600, 12*3600, 86400]) + times[-1]
+        predicted, bounds = predictor.trajectory(horizons)
+        errors = np.abs(predicted - steady(horizons))
+        assert (errors <= bounds).all(), f'errors {errors} outside bounds {bounds}'
+        print(f'test_holdover_long_run: {n} samples in {dt:.1f} s, theta {predictor.theta}, '
+              f'12 h holdover error {errors[2]:.2f} (bound {bounds[2]:.2f})')
+
+    def benchmark_holdover_predictor(self, no_samples:int=100000):
+        """
+        Measures a HoldoverPredictor update and a day long trajectory.
+
+        :param no_samples: number of updates.
+        """
+        import numpy as np
+        from MonitorHoldover import HoldoverPredictor
+        predictor = HoldoverPredictor()
+        tstart = perf_counter()
+        for i in range(no_samples): predictor.update(float(i), 30000 + 1e-3*i, 2000 + 2e-3*i)
+        dt = (perf_counter() - tstart) / no_samples
+        tstart = perf_counter()
+        predictor.trajectory(no_samples + np.arange(86400, dtype=np.float64))
+        dt_trajectory = perf_counter() - tstart
+        print(f'HoldoverPredictor: {1e6*dt:.1f} us/update | 86400 point trajectory in '
+              f'{1e3*dt_trajectory:.1f} ms')
+
 class MonitorGPSReceiverTest(MonitorTest):
     """
     Test class for the MonitorGPSReceiver class.
@@ -227,6 +898,503 @@ class MonitorGPSReceiverTest(MonitorTest):
         # packet = self.monitor.readNMEAFramesSelect(talkers, sentence_types)
         print(f'NMEA Frame: {packet}')
 
+    def test_nmea_decoder(self, recording:list=NMEA_RECORDING):
+        """
+        Test that the native NMEA decoder gives the same fields as pynmea2.
+        """
+        import pynmea2
+        for frame in recording:
+            record = self.monitor.nmeaDecoder.decode(frame)
+            sentence = pynmea2.parse(frame.decode())
+            if (record is None): continue # not decoded, parsed by pynmea2
+            for name in [field[1] for field in sentence.fields]:
+                assert getattr(record, name) == getattr(sentence, name), f'{frame} {name}'
+            for name in ['latitude', 'longitude', 'is_valid']:
+                if (hasattr(sentence, name)):
+                    assert getattr(record, name) == getattr(sentence, name), f'{frame} {name}'
+            assert str(record) == str(sentence)
+        print(f'test_nmea_decoder: decoded frames match pynmea2')
+
+    def test_ubx_decoder(self, recording:list=NMEA_RECORDING):
+        """
+        Test splitting and decoding a synthetic stream of UBX messages mixed
+        with NMEA frames, noise and a corrupt UBX frame, fed in uneven chunks.
+        """
+        from MonitorUBX import NavPvt, NavClock, NavSat, NavSatSv, TimTp, UBXDecoder, ubx_frame
+        messages = [
+            NavPvt(86400000, 2022, 2, 20, 0, 24, 48, 0x37, 25, -12345, 3, 0x01, 0x00, 12,
+                   -1067138870, 521451710, 478800, 501400, 850, 1200, -5, 3, 1, 6, 0,
+                   150, 3200000, 100, 0, 0, 0),
+            NavClock(86400000, 123456, -42, 20, 310),
+            NavSat(86400000, 1, 3, [NavSatSv(0, 2, 40, 36, 291, -12, 0x1f),
+                                    NavSatSv(0, 6, 44, 71, 291, 5, 0x1f),
+                                    NavSatSv(6, 68, 38, 77, 307, 0, 0x17)]),
+            TimTp(86401000, 2147483648, -350, 2198, 0x03, 0x00),
+        ]
+        def payload(message):
+            if (isinstance(message, NavSat)):
+                svs = b''.join(UBXDecoder.NAV_SAT_SV_STRUCT.pack(*sv) for sv in message.svs)
+                return UBXDecoder.NAV_SAT_STRUCT.pack(*message[:3]) + svs
+            structs = {NavPvt: UBXDecoder.NAV_PVT_STRUCT, NavClock: UBXDecoder.NAV_CLOCK_STRUCT,
+                       TimTp: UBXDecoder.TIM_TP_STRUCT}
+            return structs[type(message)].pack(*message)
+        ids = {NavPvt: UBXDecoder.NAV_PVT, NavClock: UBXDecoder.NAV_CLOCK,
+               NavSat: UBXDecoder.NAV_SAT, TimTp: UBXDecoder.TIM_TP}
+        ubx_frames = [ubx_frame(*ids[type(m)], payload(m)) for m in messages]
+        corrupt = bytearray(ubx_frames[0])
+        corrupt[10] ^= 0xff
+        # interleave UBX frames between NMEA frames with noise and a corrupt frame
+        expected = []
+        for i, frame in enumerate(recording):
+            expected.append(frame)
+            if (i < len(ubx_frames)): expected.append(ubx_frames[i])
+        stream = b'\x00\xb5noise' + bytes(corrupt) + b''.join(expected)
+        # feed the stream in uneven chunks
+        splitter = self.monitor.GPSFrameSplitter(self.monitor.NMEA_FRAME_START_SEQ,
+                                                 self.monitor.NMEA_FRAME_END_SEQ,
+                                                 self.monitor.NMEA_MAX_FRAME_SIZE,
+                                                 self.monitor.UBX_FRAME_START_SEQ,
+                                                 self.monitor.UBX_MAX_FRAME_SIZE)
+        frames, pos, step = [], 0, 1
+        while pos < len(stream):
+            splitter.feed(stream[pos:pos + step])
+            frames.extend(iter(splitter.next_frame, None))
+            pos += step
+            step = step % 23 + 1
+        assert frames == expected, 'split frames differ'
+        assert splitter.no_dropped == 1, f'dropped {splitter.no_dropped} frames'
+        decoded = [self.monitor.parseGPSFrame(frame) for frame in frames]
+        assert [m for m in decoded if (m in messages)] == messages, 'decoded messages differ'
+        try:
+            self.monitor.parseUBXFrame(bytes(corrupt))
+            assert False, 'corrupt frame decoded'
+        except self.monitor.ParseUBXFrameError: pass
+        print(f'test_ubx_decoder: {len(frames)} frames split, {len(messages)} UBX messages decoded')
+
+    def test_configure_receiver(self, emulator):
+        """
+        Test the exact UBX configuration bytes sent to a GPSReceiverEmulator
+        and the receiver output after configuration and baud rate upgrade.
+
+        :param emulator: the GPSReceiverEmulator the monitor is connected to.
+        """
+        from MonitorUBX import UBX_NMEA_MESSAGES
+        rates = {
+            UBX_NMEA_MESSAGES['GGA'] : 1,
+            UBX_NMEA_MESSAGES['GSV'] : 5,
+            UBX_NMEA_MESSAGES['VTG'] : 0,
+        }
+        for message in UBX_NMEA_MESSAGES.values(): rates.setdefault(message, 0)
+        self.monitor.configureReceiver(rates, baudrate=115200)
+        expected = [
+            'b5 62 06 01 03 00 f0 00 01 fb 10', # CFG-MSG GGA every epoch
+            'b5 62 06 01 03 00 f0 03 05 02 1a', # CFG-MSG GSV every 5 epochs
+            'b5 62 06 01 03 00 f0 05 00 ff 19', # CFG-MSG VTG off
+        ]
+        assert [frame.hex(' ') for frame in emulator.received[:3]] == expected, 'CFG-MSG bytes differ'
+        assert len(emulator.received) == len(rates) + 2
+        expected = [
+            # CFG-PRT UART1 8N1 115200 baud, UBX+NMEA in and out
+            'b5 62 06 00 14 00 01 00 00 00 d0 08 00 00 00 c2 01 00 03 00 03 00 00 00 00 00 bc 5e',
+            'b5 62 06 00 01 00 01 08 22',       # CFG-PRT poll UART1
+        ]
+        assert [frame.hex(' ') for frame in emulator.received[-2:]] == expected, 'CFG-PRT bytes differ'
+        assert emulator.baudrate == self.monitor.uart.baudrate == 115200
+        # only the enabled sentences are output after configuration
+        epochs = emulator.stats['epochs']
+        types = [self.monitor.readNMEAFrame(timeout=2.0).sentence_type for _ in range(12)]
+        epochs = emulator.stats['epochs'] - epochs
+        assert set(types) == {'GGA', 'GSV'}, f'unexpected sentences {set(types)}'
+        print(f'test_configure_receiver: {len(emulator.received)} frames match, '
+              f'{len(types)} sentences over {epochs} epochs at {emulator.baudrate} baud')
+
+    def test_reconnect_upgraded(self, emulator, seconds:float=1.0):
+        """
+        Test that a GPSDrain reconnects at the baud rate the receiver was
+        switched to, and falls back to config.baudrate when the receiver is
+        reset to it. The receiver must have been switched to another baud rate
+        (e.g. by test_configure_receiver).
+
+        :param emulator: the GPSReceiverEmulator the monitor is connected to.
+        :param seconds: time to drain for after each reconnect.
+        """
+        from MonitorGPSTelemetry import GPSDrain
+        upgraded = emulator.baudrate
+        assert upgraded != self.monitor.config.baudrate, 'receiver baud rate not upgraded'
+        # reconnect at the upgraded baud rate
+        self.monitor.close_uart()
+        messages = []
+        # the addresses View parses
+        addresses = self.monitor.formAddresses(self.monitor.TALKER_IDS, self.monitor.SENTENCE_TYPES)
+        drain = GPSDrain(self.monitor, addresses=addresses, log=messages.append)
+        drain.start()
+        sleep(seconds)
+        drain.stop()
+        assert self.monitor.uart.baudrate == emulator.baudrate == upgraded
+        assert not [message for message in messages if (message.startswith('Failed'))], messages
+        assert drain.stats['connects'] == 1 and drain.stats['frames'] > 0
+        assert drain.stats['parse_errors'] == 0
+        # the receiver still outputs RMC after configuration, with the date
+        assert drain.state.snapshot is not None and drain.state.snapshot.date is not None
+        frames = drain.stats['frames']
+        # receiver reset to the default baud rate
+        emulator.baudrate = self.monitor.config.baudrate
+        self.monitor.close_uart()
+        messages.clear()
+        drain.start()
+        sleep(seconds + self.monitor.config.io_slice)
+        drain.stop()
+        assert self.monitor.uart.baudrate == emulator.baudrate == self.monitor.config.baudrate
+        assert len([message for message in messages if (message.startswith('Failed'))]) == 1, messages
+        assert drain.stats['connects'] == 3 and drain.stats['frames'] > frames
+        print(f'test_reconnect_upgraded: {frames} frames at {upgraded} baud, '
+              f'{drain.stats["frames"] - frames} frames after falling back to {emulator.baudrate} baud')
+
+    def test_gps_drain(self, emulator, seconds:float=2.0):
+        """
+        Test that a GPSDrain reads every frame a GPSReceiverEmulator outputs
+        and keeps the latest sentence of each address. The emulator must
+        output its NMEA messages every epoch or not at all.
+
+        :param emulator: the GPSReceiverEmulator the monitor is connected to.
+        :param seconds: time to drain for.
+        """
+        from MonitorGPSTelemetry import GPSDrain
+        from MonitorUBX import UBX_NMEA_MESSAGES
+        drain = GPSDrain(self.monitor, configure=False)
+        epochs = emulator.stats['epochs']
+        drain.start()
+        sleep(seconds)
+        drain.stop()
+        epochs = emulator.stats['epochs'] - epochs
+        assert drain.stats['frames'] == sum(drain.counts.values())
+        assert drain.stats['dropped'] == drain.stats['parse_errors'] == drain.stats['read_errors'] == 0
+        # every output frame was read, the first and last epochs may be partial
+        addresses = [frame[1:6].decode() for frame in emulator.nmea_epoch
+                     if (emulator.rates.get(UBX_NMEA_MESSAGES[frame[3:6].decode()]) == 1)]
+        for address in set(addresses):
+            count = addresses.count(address)
+            assert count*(epochs - 2) <= drain.counts[address] <= count*epochs, \
+                f'{drain.counts[address]} {address} frames over {epochs} epochs'
+            latest = drain.latest(address)
+            assert latest is not None and latest.address == address, f'no {address} in table'
+            assert latest.frame in emulator.nmea_epoch
+            assert str(latest.message) == str(self.monitor.parseNMEAFrame(latest.frame))
+        print(f'test_gps_drain: {drain.stats["frames"]} frames over {epochs} epochs, '
+              f'{len(drain.table)} addresses in table')
+
+    def test_gps_drain_reconnect(self, seconds:float=1.0):
+        """
+        Test that a GPSDrain without a receiver waits RECONNECT_PERIOD
+        between connection attempts and that stop() interrupts the wait.
+
+        :param seconds: time to drain for, less than RECONNECT_PERIOD.
+        """
+        from MonitorGPSReceiver import MonitorGPSReceiver
+        from MonitorGPSTelemetry import GPSDrain
+        monitor = MonitorGPSReceiver() # no receiver attached
+        assert not monitor.is_connected()
+        messages = []
+        drain = GPSDrain(monitor, log=messages.append)
+        drain.start()
+        sleep(seconds)
+        tstart = perf_counter()
+        drain.stop()
+        dt = perf_counter() - tstart
+        attempts = messages.count('Attempting to connect to GPS...')
+        assert attempts == 1, f'{attempts} connection attempts in {seconds} s'
+        assert dt < 0.5, f'stop took {dt:.3f} s'
+        print(f'test_gps_drain_reconnect: {attempts} attempt in {seconds} s, stopped in {1e3*dt:.1f} ms')
+
+    def test_gnss_state(self, epochs:int=5, recording:list=NMEA_RECORDING):
+        """
+        Test the GNSSState snapshots from recorded epochs: one snapshot per
+        epoch, assembled GSV groups, dropped incomplete groups and epochs
+        ended by a new fix time when the epoch end sentence is missing.
+
+        :param epochs: number of epochs replayed.
+        :param recording: one epoch of raw NMEA frames with a GLL last.
+        """
+        from MonitorGPSTelemetry import GNSSState
+        from MonitorNMEA import nmea_checksum
+        def epoch_frames(second):
+            # the recording with its fix time moved by second seconds
+            frames = []
+            for frame in recording:
+                body = frame[1:frame.rindex(b'*')].replace(b'002448.00', b'0024%02d.00' % (48 + second))
+                frames.append(b'$%s*%02X\r\n' % (body, nmea_checksum(body)))
+            return frames
+        parse = self.monitor.parseNMEAFrame
+        sentences = [parse(frame) for frame in recording]
+        in_view = {(s.talker, s.data[-1]): int(s.num_sv_in_view) for s in sentences if (s.sentence_type == 'GSV')}
+        used = {int(sv) for s in sentences if (s.sentence_type == 'GSA') for sv in s.sv_ids}
+
+        state, snapshots = GNSSState(), []
+        state.subscribe(snapshots.append)
+        for second in range(epochs):
+            published = [state.update(parse(frame)) for frame in epoch_frames(second)]
+            # only the epoch end sentence publishes
+            assert [snapshot is not None for snapshot in published] == [False]*(len(published)-1) + [True]
+        assert len(snapshots) == epochs == state.stats['epochs']
+        snapshot = snapshots[-1]
+        assert snapshot.time.second == 48 + epochs - 1 and snapshot.date.year == 2022
+        assert snapshot.fix_quality == 2 and snapshot.fix_type == 3 and snapshot.num_sats == 12
+        assert (snapshot.pdop, snapshot.hdop, snapshot.vdop, snapshot.altitude) == (1.0, 0.55, 0.83, 501.4)
+        assert abs(snapshot.latitude - 52.145171) < 1e-6 and abs(snapshot.longitude + 106.713870) < 1e-6
+        assert snapshot.used == used
+        assert len(snapshot.satellites) == sum(in_view.values())
+        assert {sat.prn for sat in snapshot.satellites if (sat.talker == 'GP')} >= {2, 3, 44, 51}
+        assert state.stats['gsv_groups'] == epochs * len(in_view) and state.stats['gsv_dropped'] == 0
+
+        # a GSV group missing a part keeps the previous group
+        frames = [frame for frame in epoch_frames(epochs) if (not frame.startswith(b'$GPGSV,3,2'))]
+        for frame in frames: state.update(parse(frame))
+        assert state.stats['gsv_dropped'] == 1 and state.snapshot.satellites == snapshot.satellites
+
+        # without the epoch end sentence, the next fix time ends the epoch
+        state = GNSSState(epoch_end='ZDA')
+        for second in range(epochs):
+            for frame in epoch_frames(second): state.update(parse(frame))
+        assert state.stats['epochs'] == epochs - 1 and state.snapshot.time.second == 48 + epochs - 2
+        print(f'test_gnss_state: {epochs} snapshots, {len(snapshot.satellites)} satellites in view, '
+              f'{len(snapshot.used)} used')
+
+    def test_satellite_history(self, capacity:int=100, recording:list=NMEA_RECORDING):
+        """
+        Test the SatelliteHistory rows and SNR queries from recorded GSV
+        snapshots and synthetic UBX-NAV-SAT messages, past the capacity.
+
+        :param capacity: rows kept, capacity + 10 rows are appended.
+        :param recording: one epoch of raw NMEA frames with a GLL last.
+        """
+        from MonitorGPSTelemetry import GNSSState, SatelliteHistory
+        from MonitorUBX import NavSat, NavSatSv
+        import math
+        import numpy as np
+        state, history = GNSSState(), SatelliteHistory(capacity=capacity)
+        state.subscribe(history.extend_snapshot)
+        for frame in recording: state.update(self.monitor.parseNMEAFrame(frame), timestamp=0.0)
+        satellites = state.snapshot.satellites
+        # per satellite means from the recording
+        above = [sat.snr for sat in satellites if (sat.snr and sat.elevation >= 15)]
+        assert history.mean_snr(min_elevation=15) == sum(above) / len(above)
+        assert history.series(('GP', 2))[1][-1] == 40 and history.series(('GL', 86))[1][-1] == history.NO_SNR
+        assert len(history.keys()) == len(satellites)
+
+        # NAV-SAT rows, one per second, GPS 2 fading and GLONASS slot 14 (prn 78)
+        for t in range(1, capacity + 10):
+            svs = [NavSatSv(0, 2, 40 - t % 10, 36, 291, 0, 0), NavSatSv(6, 14, 20, 10, 300, 0, 0),
+                   NavSatSv(1, 123, 30, 30, 200, 0, 0)]
+            history.extend_nav_sat(NavSat(t*1000, 1, len(svs), svs), timestamp=float(t))
+        assert len(history) == capacity and history.times()[0] == 10.0
+        assert history.mean_snr(15, keys=[('GP', 2)]) == np.mean([40 - t % 10 for t in range(10, capacity + 10)])
+        # GLONASS below 15 degrees, SBAS 123 is NMEA prn 36
+        assert math.isnan(history.mean_snr(15, keys=[('GL', 78)])) and history.mean_snr(0, keys=[('GL', 78)]) == 20
+        assert history.mean_snr(15, keys=[('GP', 36)]) == 30
+        last = history.mean_snr_by_satellite(15, seconds=4)
+        assert last == {('GP', 2): np.mean([40 - t % 10 for t in range(capacity + 5, capacity + 10)]), ('GP', 36): 30.0}
+        print(f'test_satellite_history: {len(history)} rows of {len(history.keys())} satellites, '
+              f'{(history.snr.nbytes + history.elevation.nbytes + history.time_col.nbytes)/1e3:.0f} kB')
+
+    # benchmarks ###############################################################
+    def benchmark_parse_nmea(self, epochs:int=2000, recording:list=NMEA_RECORDING):
+        """
+        Measures NMEA sentences parsed per second by parseNMEAFrame (native
+        decoder with pynmea2 fallback) against pynmea2 only on recorded data,
+        converting the fields sentenceToStr displays.
+
+        :param epochs: number of times the recording is decoded.
+        :param recording: list of raw NMEA frames.
+        """
+        import pynmea2
+        frames = recording * epochs
+        parsers = [
+            ('pynmea2', lambda frame: pynmea2.parse(frame.decode(), check=True)),
+            ('parseNMEAFrame', self.monitor.parseNMEAFrame),
+        ]
+        for name, parse in parsers:
+            tstart = perf_counter()
+            for frame in frames: self.monitor.sentenceToStr(parse(frame))
+            dt = perf_counter() - tstart
+            print(f'{name:14}: {len(frames)} sentences in {dt:.3f}s | '
+                  f'{len(frames)/dt:9.0f} sentences/s')
+
+    def test_capture_replay(self, path:str, seconds:float=1.0):
+        """
+        Test capturing the output of a GPSReceiverEmulator and replaying the
+        capture in real time and as fast as possible.
+
+        :param path: capture file to create.
+        :param seconds: time to capture for.
+        """
+        from MonitorCapture import make_replay_config
+        from MonitorGPSReceiver import MonitorGPSReceiver
+        self.monitor.start_capture(path)
+        frames = list(self.monitor.readGPSFrames(timeout=seconds))
+        self.monitor.stop_capture()
+        assert frames, 'no frames captured'
+        for speed in (1.0, None):
+            replay = MonitorGPSReceiver(config=make_replay_config(path, self.monitor.config, speed))
+            tstart = perf_counter()
+            replayed = list(replay.readGPSFrames(timeout=seconds + 0.5))
+            dt = perf_counter() - tstart
+            # the first frame may have been partial when the capture started
+            assert replayed[-len(frames)+1:] == frames[-len(frames)+1:], f'replay at speed {speed} differs'
+            replay.close_uart()
+        print(f'test_capture_replay: {len(frames)} frames captured and replayed')
+
+    def benchmark_replay_nmea(self, path:str, repeats:int=200):
+        """
+        Measures NMEA frames read and parsed per second from a capture
+        replayed as fast as possible, against the real time rate.
+
+        :param path: capture of NMEA output (see test_capture_replay).
+        :param repeats: number of times the capture is replayed.
+        """
+        from MonitorCapture import load_capture, make_replay_config
+        from MonitorGPSReceiver import MonitorGPSReceiver
+        _, events = load_capture(path)
+        duration = events[-1].time - events[0].time
+        replay = MonitorGPSReceiver(config=make_replay_config(path, self.monitor.config))
+        no_frames = 0
+        tstart = perf_counter()
+        for _ in range(repeats):
+            replay.uart.rewind()
+            while (not replay.uart.at_end()):
+                for frame in replay.readGPSFrames(timeout=0):
+                    replay.parseGPSFrame(frame)
+                    no_frames += 1
+        dt = perf_counter() - tstart
+        replay.close_uart()
+        print(f'replay: {no_frames} frames in {dt:.3f}s | {no_frames/dt:9.0f} frames/s | '
+              f'{repeats*duration/dt:7.0f}x real time')
+
+    def benchmark_satellite_history(self, hours:float=4, rate:float=1.0,
+                                          no_satellites:int=40, iterations:int=100):
+        """
+        Measures SatelliteHistory append and mean SNR query times over hours
+        of synthetic history.
+
+        :param hours: hours of history.
+        :param rate: rows per second.
+        :param no_satellites: satellites in each row.
+        :param iterations: number of each query timed.
+        """
+        from MonitorGPSTelemetry import SatelliteHistory
+        history = SatelliteHistory(seconds=hours*60*60, rate=rate)
+        rows = [[(('GP' if (n < 32) else 'GL', n + 1), (n*7) % 90, 20 + n % 30)
+                 for n in range(no_satellites)]]
+        tstart = perf_counter()
+        for i in range(history.capacity): history.append(i / rate, rows[0])
+        dt_append = (perf_counter() - tstart) / history.capacity
+        queries = [
+            ('mean_snr 10 min > 15 deg', lambda: history.mean_snr(15, seconds=10*60)),
+            ('mean_snr all > 15 deg', lambda: history.mean_snr(15)),
+            ('mean_snr_by_satellite 10 min', lambda: history.mean_snr_by_satellite(15, seconds=10*60)),
+        ]
+        size = history.snr.nbytes + history.elevation.nbytes + history.time_col.nbytes
+        print(f'{history.capacity} rows x {no_satellites} satellites | {size/1e6:.1f} MB | '
+              f'{1e6*dt_append:.1f} us/append')
+        for name, query in queries:
+            tstart = perf_counter()
+            for _ in range(iterations): query()
+            dt = (perf_counter() - tstart) / iterations
+            print(f'{name:30}: {1e3*dt:8.3f} ms')
+
+    def benchmark_read_nmea(self, epochs:int=2000, recording:list=NMEA_RECORDING):
+        """
+        Measures NMEA frame read throughput on recorded data replayed through a
+        pseudo-terminal, comparing byte-wise read_uart_until calls against the
+        bulk readNMEAFrames splitter. The monitor must not be connected.
+
+        :param epochs: number of times the recording is replayed.
+        :param recording: list of raw NMEA frames.
+        """
+        import os, threading, tty
+        data = b''.join(recording) * epochs
+        no_frames = len(recording) * epochs
+        def replay(fd):
+            view = memoryview(data)
+            while view: view = view[os.write(fd, view[:4096]):]
+
+        def bytewise(no_frames):
+            for _ in range(no_frames):
+                self.monitor.read_uart_until(self.monitor.NMEA_FRAME_START_SEQ, 1.0)
+                self.monitor.read_uart_until(self.monitor.NMEA_FRAME_END_SEQ, 1.0)
+            return no_frames
+        def bulk(no_frames):
+            frames = 0
+            for frame in self.monitor.readNMEAFrames(timeout=None):
+                frames += 1
+                if (frames == no_frames): break
+            return frames
+
+        for name, read in [('read_uart_until', bytewise), ('readNMEAFrames', bulk)]:
+            master_fd, slave_fd = os.openpty()
+            tty.setraw(slave_fd)
+            # opened directly, a pseudo-terminal has no RTS line for create_uart
+            config = self.monitor.config
+            self.monitor.uart = config.uart_class(port=os.ttyname(slave_fd),
+                baudrate=config.baudrate, parity=config.parity, timeout=config.io_slice)
+            writer = threading.Thread(target=replay, args=(master_fd,), daemon=True)
+            tstart, cstart = perf_counter(), process_time()
+            writer.start()
+            frames = read(no_frames)
+            dt, dcpu = perf_counter() - tstart, process_time() - cstart
+            writer.join()
+            self.monitor.close_uart()
+            os.close(master_fd)
+            os.close(slave_fd)
+            print(f'{name:16}: {frames} frames in {dt:.3f}s | '
+                  f'{len(data)/dt/1e6:6.2f} MB/s | {1e6*dcpu/frames:7.2f} us cpu/frame')
+
+class ViewTest():
+    """
+    Test class for the GUI View.
+    """
+    def __init__(self, view):
+        """
+        Initialize the test class.
+        """
+        self.view = view
+    
+    # benchmarks ###############################################################
+    def benchmark_render(self, hours:float=4, rate:float=1.0, frames:int=10):
+        """
+        Feeds hours of synthetic telemetry to the view and measures the cost of
+        a graph redraw at evenly spaced points of the run, following the
+        newest samples and zoomed out to the whole history.
+
+        :param hours: simulated run length.
+        :param rate: telemetry sweeps per second.
+        :param frames: number of redraws measured.
+        """
+        from PyQt5.QtWidgets import QApplication
+        from MonitorTelemetry import TelemetrySample
+        names = list(self.view.graphs.keys())
+        no_sweeps = int(hours * 3600 * rate)
+        frame_every = max(1, no_sweeps // frames)
+        tsim = self.view.plotStart
+        def render():
+            self.view.dirtyGraphs.update(names)
+            tstart = perf_counter()
+            self.view.renderPlots()
+            QApplication.processEvents()
+            return perf_counter() - tstart
+        for i in range(no_sweeps):
+            tsim += 1.0 / rate
+            self.view.plotSamples([TelemetrySample(tsim, name, i % 1000) for name in names])
+            if (i % frame_every == frame_every - 1):
+                dt = render()
+                for graph in self.view.graphs.values():
+                    graph.getPlotItem().setXRange(0, tsim - self.view.plotStart, padding=0)
+                dt_all = render()
+                points = sum(len(curve.xData) for curve in self.view.curves.values())
+                for graph in self.view.graphs.values(): graph.getPlotItem().enableAutoRange(x=True)
+                items = sum(len(graph.getPlotItem().listDataItems()) for graph in self.view.graphs.values())
+                print(f'render at {(i+1)/(3600*rate):5.2f}h: {1e3*dt:7.3f} ms/frame | '
+                      f'whole history {1e3*dt_all:7.3f} ms/frame, {points} points | {items} plot items')
+
 
 # Main #########################################################################
 def main():
@@ -0,0 +1,353 @@
+# Imports ######################################################################
+import struct
+from itertools import accumulate
+from typing import Dict, List, NamedTuple
+
+# Globals ######################################################################
+
+
+# Library ######################################################################
+# framing ######################################################################
+UBX_SYNC          = b'\xb5\x62'
+UBX_HEADER_SIZE   = 6 # sync, class, id, length
+UBX_CHECKSUM_SIZE = 2
+
+def ubx_checksum(data:bytes)->bytes:
+    """
+    Returns the 8-bit Fletcher checksum (CK_A, CK_B) of data, the bytes from
+    the message class up to the end of the payload.
+
+    CK_B is the sum of the running sums of CK_A, so both are computed with C
+    level sum/accumulate instead of a Python loop over the bytes.
+    """
+    return bytes((sum(data) & 0xff, sum(accumulate(data)) & 0xff))
+def ubx_frame(msg_class:int, msg_id:int, payload:bytes=b'')->bytes:
+    """
+    Returns a complete UBX frame for a message.
+
+    :param msg_class: UBX message class (e.g. 0x01 for NAV).
+    :param msg_id: UBX message id (e.g. 0x07 for PVT).
+    :param payload: message payload.
+    """
+    body = struct.pack('<BBH', msg_class, msg_id, len(payload)) + payload
+    return UBX_SYNC + body + ubx_checksum(body)
+def ubx_frame_size(header:bytes)->int:
+    """
+    Returns the size of a UBX frame from its first UBX_HEADER_SIZE bytes.
+    """
+    return UBX_HEADER_SIZE + (header[4] | header[5] << 8) + UBX_CHECKSUM_SIZE
+
+# configuration ################################################################
+# UBX message class and id of the NMEA sentences, for CFG-MSG
+UBX_NMEA_MESSAGES = {
+    'GGA' : b'\xf0\x00',
+    'GLL' : b'\xf0\x01',
+    'GSA' : b'\xf0\x02',
+    'GSV' : b'\xf0\x03',
+    'RMC' : b'\xf0\x04',
+    'VTG' : b'\xf0\x05',
+    'GRS' : b'\xf0\x06',
+    'GST' : b'\xf0\x07',
+    'ZDA' : b'\xf0\x08',
+    'GBS' : b'\xf0\x09',
+    'DTM' : b'\xf0\x0a',
+    'GNS' : b'\xf0\x0d',
+    'VLW' : b'\xf0\x0f',
+}
+# receiver port ids
+UBX_PORT_UART1 = 1
+UBX_PORT_UART2 = 2
+UBX_PORT_USB   = 3
+# CFG-PRT UART mode, 8 data bits, no parity, 1 stop bit
+UBX_UART_MODE_8N1 = 0x000008D0
+# CFG-PRT protocol masks
+UBX_PROTO_UBX  = 0x0001
+UBX_PROTO_NMEA = 0x0002
+
+def ubx_message(message:bytes, payload:bytes=b'')->bytes:
+    """
+    Returns a complete UBX frame for a message given by its class and id
+    bytes (e.g. UBXDecoder.CFG_MSG). An empty payload polls the message.
+    """
+    return ubx_frame(message[0], message[1], payload)
+def ubx_cfg_msg(message:bytes, rate:int)->bytes:
+    """
+    Returns a UBX-CFG-MSG frame setting the output rate of a message on the
+    port the frame is sent over.
+
+    :param message: class and id bytes of the message (e.g. UBX_NMEA_MESSAGES['GGA']).
+    :param rate: output every rate navigation solutions, 0 disables the message.
+    """
+    return ubx_message(UBXDecoder.CFG_MSG, message + bytes((rate,)))
+def ubx_cfg_prt_uart(port_id:int, baudrate:int, 
+                     in_proto:int=UBX_PROTO_UBX | UBX_PROTO_NMEA,
+                     out_proto:int=UBX_PROTO_UBX | UBX_PROTO_NMEA)->bytes:
+    """
+    Returns a UBX-CFG-PRT frame configuring a UART port of the receiver for
+    8N1 at baudrate.
+
+    :param port_id: UBX_PORT_UART1 or UBX_PORT_UART2.
+    :param baudrate: the new baud rate.
+    :param in_proto: protocols accepted on the port.
+    :param out_proto: protocols output on the port.
+    """
+    payload = UBXDecoder.CFG_PRT_STRUCT.pack(port_id, 0, UBX_UART_MODE_8N1, baudrate,
+                                             in_proto, out_proto, 0)
+    return ubx_message(UBXDecoder.CFG_PRT, payload)
+
+# records ######################################################################
+class NavPvt(NamedTuple):
+    """
+    UBX-NAV-PVT navigation position velocity time solution. Fields and units
+    follow the u-blox M8 protocol specification.
+    """
+    iTOW    : int # ms, GPS time of week of the navigation epoch
+    year    : int
+    month   : int
+    day     : int
+    hour    : int
+    min     : int
+    sec     : int
+    valid   : int # validity flags
+    tAcc    : int # ns, time accuracy estimate
+    nano    : int # ns, fraction of second
+    fixType : int # 0 no fix, 2 2D, 3 3D, 5 time only
+    flags   : int
+    flags2  : int
+    numSV   : int # satellites used in the solution
+    lon     : int # 1e-7 deg
+    lat     : int # 1e-7 deg
+    height  : int # mm above ellipsoid
+    hMSL    : int # mm above mean sea level
+    hAcc    : int # mm
+    vAcc    : int # mm
+    velN    : int # mm/s
+    velE    : int # mm/s
+    velD    : int # mm/s
+    gSpeed  : int # mm/s
+    headMot : int # 1e-5 deg
+    sAcc    : int # mm/s
+    headAcc : int # 1e-5 deg
+    pDOP    : int # 0.01
+    headVeh : int # 1e-5 deg
+    magDec  : int # 1e-2 deg
+    magAcc  : int # 1e-2 deg
+
+    @property
+    def latitude(self)->float:
+        """
+        Latitude in degrees.
+        """
+        return self.lat * 1e-7
+    @property
+    def longitude(self)->float:
+        """
+        Longitude in degrees.
+        """
+        return self.lon * 1e-7
+
+class NavClock(NamedTuple):
+    """
+    UBX-NAV-CLOCK receiver clock solution.
+    """
+    iTOW : int # ms
+    clkB : int # ns, clock bias
+    clkD : int # ns/s, clock drift
+    tAcc : int # ns, time accuracy estimate
+    fAcc : int # ps/s, frequency accuracy estimate
+
+class NavSatSv(NamedTuple):
+    """
+    One satellite of a UBX-NAV-SAT message.
+    """
+    gnssId : int # 0 GPS, 1 SBAS, 2 Galileo, 3 BeiDou, 5 QZSS, 6 GLONASS
+    svId   : int
+    cno    : int # dBHz, carrier to noise ratio
+    elev   : int # deg
+    azim   : int # deg
+    prRes  : int # 0.1 m, pseudorange residual
+    flags  : int
+
+class NavSat(NamedTuple):
+    """
+    UBX-NAV-SAT satellite information.
+    """
+    iTOW    : int # ms
+    version : int
+    numSvs  : int
+    svs     : List[NavSatSv]
+
+class TimTp(NamedTuple):
+    """
+    UBX-TIM-TP time pulse time data, the time of the next time pulse.
+    """
+    towMS    : int # ms, time pulse time of week
+    towSubMS : int # 2^-32 ms, sub-millisecond part of towMS
+    qErr     : int # ps, quantization error of the time pulse
+    week     : int # weeks
+    flags    : int
+    refInfo  : int
+
+    @property
+    def tow(self)->float:
+        """
+        Time of week of the time pulse in seconds.
+        """
+        return (self.towMS + self.towSubMS / 2**32) * 1e-3
+
+class CfgPrt(NamedTuple):
+    """
+    UBX-CFG-PRT port configuration.
+    """
+    portID       : int
+    txReady      : int
+    mode         : int # UART character framing
+    baudRate     : int
+    inProtoMask  : int
+    outProtoMask : int
+    flags        : int
+
+class AckAck(NamedTuple):
+    """
+    UBX-ACK-ACK, a configuration message was accepted.
+    """
+    clsID : int
+    msgID : int
+
+    @property
+    def message(self)->bytes:
+        """
+        Class and id bytes of the acknowledged message.
+        """
+        return bytes((self.clsID, self.msgID))
+
+class AckNak(NamedTuple):
+    """
+    UBX-ACK-NAK, a configuration message was rejected.
+    """
+    clsID : int
+    msgID : int
+
+    @property
+    def message(self)->bytes:
+        """
+        Class and id bytes of the rejected message.
+        """
+        return bytes((self.clsID, self.msgID))
+
+# decoder ######################################################################
+class UBXDecoder():
+    """
+    Decoder for UBX binary frames from the U-blox receiver (navigation and
+    timing messages, port configuration and acknowledgements).
+
+    Payloads are unpacked with precompiled structs straight from the frame
+    buffer (struct.unpack_from / iter_unpack on a memoryview), without
+    slicing copies.
+
+    u-blox M8 protocol ->
+        https://www.u-blox.com/sites/default/files/products/documents/u-blox8-M8_ReceiverDescrProtSpec_UBX-13003221.pdf#page=145&zoom=100,0,0
+
+    Attributes:
+        check    : True to verify the checksum.
+        decoders : message class and id bytes -> decode method.
+    """
+    # constants ################################################################
+    # message class and id
+    NAV_PVT   = b'\x01\x07'
+    NAV_CLOCK = b'\x01\x22'
+    NAV_SAT   = b'\x01\x35'
+    TIM_TP    = b'\x0d\x01'
+    CFG_PRT   = b'\x06\x00'
+    CFG_MSG   = b'\x06\x01'
+    ACK_NAK   = b'\x05\x00'
+    ACK_ACK   = b'\x05\x01'
+    # payload structs
+    NAV_PVT_STRUCT    = struct.Struct('<IHBBBBBBIiBBBBiiiiIIiiiiiIIH6xihH')
+    NAV_CLOCK_STRUCT  = struct.Struct('<IiiII')
+    NAV_SAT_STRUCT    = struct.Struct('<IBB2x')
+    NAV_SAT_SV_STRUCT = struct.Struct('<BBBbhhI')
+    TIM_TP_STRUCT     = struct.Struct('<IIiHBB')
+    CFG_PRT_STRUCT    = struct.Struct('<BxHIIHHH2x')
+    ACK_STRUCT        = struct.Struct('<BB')
+
+    # exceptions ###############################################################
+    class DecodeError(Exception):
+        """
+        Raised if decoding a UBX frame fails.
+        """
+        pass
+    class ChecksumError(DecodeError):
+        """
+        Raised if a UBX frame's checksum is wrong.
+        """
+        pass
+
+    # constructor ##############################################################
+    def __init__(self, check:bool=True):
+        """
+        :param check: True to verify the checksum.
+        """
+        self.check = check
+        self.decoders:Dict[bytes, callable] = {
+            self.NAV_PVT   : self.decode_nav_pvt,
+            self.NAV_CLOCK : self.decode_nav_clock,
+            self.NAV_SAT   : self.decode_nav_sat,
+            self.TIM_TP    : self.decode_tim_tp,
+            self.CFG_PRT   : self.decode_cfg_prt,
+            self.ACK_ACK   : self.decode_ack_ack,
+            self.ACK_NAK   : self.decode_ack_nak,
+        }
+
+    # methods ##################################################################
+    def decode(self, frame:bytes)->NamedTuple:
+        """
+        Decodes a complete UBX frame.
+
+        :param frame: the frame from the sync bytes up to the checksum.
+        :exceptions:
+            DecodeError   : if the frame is malformed.
+            ChecksumError : if checking and the checksum is wrong.
+        :return: the message record, None if the message is not decoded.
+        """
+        if (len(frame) < UBX_HEADER_SIZE + UBX_CHECKSUM_SIZE or
+            ubx_frame_size(frame) != len(frame)):
+            raise self.DecodeError(f'Bad UBX frame length {len(frame)}')
+        view = memoryview(frame)
+        if (self.check and ubx_checksum(view[2:-2]) != frame[-2:]):
+            raise self.ChecksumError(f'Checksum mismatch in UBX frame {bytes(frame[2:4]).hex()}')
+        decoder = self.decoders.get(bytes(view[2:4]))
+        if (decoder is None): return None
+        try: return decoder(view)
+        except struct.error as e:
+            raise self.DecodeError(f'Failed decoding UBX frame {bytes(frame[2:4]).hex()}: {e}')
+    def decode_nav_pvt(self, frame:memoryview)->NavPvt:
+        return NavPvt._make(self.NAV_PVT_STRUCT.unpack_from(frame, UBX_HEADER_SIZE))
+    def decode_nav_clock(self, frame:memoryview)->NavClock:
+        return NavClock._make(self.NAV_CLOCK_STRUCT.unpack_from(frame, UBX_HEADER_SIZE))
+    def decode_tim_tp(self, frame:memoryview)->TimTp:
+        return TimTp._make(self.TIM_TP_STRUCT.unpack_from(frame, UBX_HEADER_SIZE))
+    def decode_cfg_prt(self, frame:memoryview)->CfgPrt:
+        return CfgPrt._make(self.CFG_PRT_STRUCT.unpack_from(frame, UBX_HEADER_SIZE))
+    def decode_ack_ack(self, frame:memoryview)->AckAck:
+        return AckAck._make(self.ACK_STRUCT.unpack_from(frame, UBX_HEADER_SIZE))
+    def decode_ack_nak(self, frame:memoryview)->AckNak:
+        return AckNak._make(self.ACK_STRUCT.unpack_from(frame, UBX_HEADER_SIZE))
+    def decode_nav_sat(self, frame:memoryview)->NavSat:
+        iTOW, version, numSvs = self.NAV_SAT_STRUCT.unpack_from(frame, UBX_HEADER_SIZE)
+        start = UBX_HEADER_SIZE + self.NAV_SAT_STRUCT.size
+        svs = frame[start:start + numSvs*self.NAV_SAT_SV_STRUCT.size]
+        if (len(svs) != numSvs*self.NAV_SAT_SV_STRUCT.size):
+            raise struct.error(f'payload too short for {numSvs} satellites')
+        svs = [NavSatSv._make(sv) for sv in self.NAV_SAT_SV_STRUCT.iter_unpack(svs)]
+        return NavSat(iTOW, version, numSvs, svs)
+
+# Main #########################################################################
+def main():
+    from MonitorGPSReceiver import MonitorGPSReceiver
+    from MonitorTest import MonitorGPSReceiverTest
+    mtester = MonitorGPSReceiverTest(MonitorGPSReceiver())
+    mtester.test_ubx_decoder()
+
+if __name__ == '__main__':
+    main()
@@ -1,74 +1,94 @@
 # Imports ######################################################################
-import sys, time
-from threading import Thread, Lock
+import os, sys, time
 
+import numpy as np
 import pyqtgraph as pg
 from PyQt5.QtWidgets import QMainWindow
-from PyQt5.QtCore import pyqtSignal, pyqtSlot, QObject, QThread
+from PyQt5.QtCore import pyqtSignal, pyqtSlot, QObject, QTimer
 
 from MainWindow import Ui_MainWindow
+from MonitorGPSTelemetry import GPSDrain
+from MonitorRecorder import TelemetryRecorder, load_recording
+from MonitorRollup import MinMaxDecimator, RollupPyramid, TelemetryRollup
+from MonitorTelemetry import TelemetryEngine, TelemetryStore
 
 # Globals ######################################################################
 
 # Library ######################################################################
-class GraphThread(QThread):
-    signal = pyqtSignal(int, int)
-    def __init__(self, parent=None):
-        super(GraphThread, self).__init__(parent)
-        self.xval = 0
-        self.yval = 0
-    
-    def run(self):
-        while(1):
-            time.sleep(1)
-            # self.GraphWidget.plot(xval, yval)
-            # self.signal.emit([self.xval, self.yval])
-            self.signal.emit(self.xval, self.yval)
-            # self.xval = self.xval + 1
-            # self.yval = self.yval + 1
-
-class GPSThread(QThread):
-    log = pyqtSignal(str)
-    def __init__(self, GPSMonitor, parent=None):
-        super(GPSThread, self).__init__(parent)
-        self.GPSMonitor = GPSMonitor
+class TelemetryBridge(QObject):
+    """
+    Forwards TelemetryEngine and GPSDrain callbacks from their threads to the
+    GUI thread through queued Qt signals.
+    """
+    samples  = pyqtSignal(list)
+    log      = pyqtSignal(str)
+    snapshot = pyqtSignal(object)
+
+class TextLogBuffer():
+    """
+    Bounded, batched writer for a QPlainTextEdit log pane.
+
+    Lines are queued and written with one append per flush (once per UI
+    frame), and the pane keeps at most maxLines lines. Repetitive lines can
+    be rate limited per key with appendLimited.
+    """
+    def __init__(self, textLog, maxLines):
+        """
+        :param textLog: the QPlainTextEdit to write to.
+        :param maxLines: maximum number of lines kept in the pane.
+        """
+        self.textLog = textLog
+        self.textLog.setMaximumBlockCount(maxLines)
+        self.pending = []
+        self.lastTimes = {}
 
-    def run(self):
-        timeout = 1
-        counter = 0
-
-        # Attempt to connect to GPS if not connected
-        while not self.GPSMonitor.is_connected():
-            time.sleep(timeout)
-            print("Attemping to Connect to GPS...")
-            self.log.emit("Attemping to Connect to GPS...")
-            self.GPSMonitor.connect_uart()
-            counter += 1
-            if (counter == 5) and (not timeout >= 120):
-                counter = 0
-                timeout += 5
-
-
-        talkers = self.GPSMonitor.TALKER_IDS
-        sentence_types = self.GPSMonitor.SENTENCE_TYPES
-        while(1):
-            time.sleep(1)
-            # self.log.emit('HelloWorld!')
-            # TODO print GPS sentences
-            # Read GGA sentence
-            # sentence = self.GPSMonitor.readNMEAFrameSelect(self.GPSMonitor.TALKER_ID_GPS,
-            #     self.GPSMonitor.GGA)
-            
-            try:
-                sentence = self.GPSMonitor.readNMEAFramesSelect(talkers, sentence_types, timeout=5.0)
-                self.log.emit(self.GPSMonitor.sentenceToStr(sentence))
-            except self.GPSMonitor.ReadNMEAFrameError:
-                print(f'Failed to get NMEA sentence before timeout')
+    def append(self, line):
+        """
+        Queue a line for the next flush.
+        """
+        self.pending.append(line)
+
+    def appendLimited(self, key, line, period):
+        """
+        Queue a line unless a line with the same key was queued less than
+        period seconds ago. A period of 0 queues every line.
+        """
+        now = time.monotonic()
+        if period and now - self.lastTimes.get(key, -period) < period: return
+        self.lastTimes[key] = now
+        self.pending.append(line)
+
+    def flush(self):
+        """
+        Write the queued lines to the pane in one append.
+        """
+        if not self.pending: return
+        self.textLog.appendPlainText('\n'.join(self.pending))
+        self.pending.clear()
 
 class View(QMainWindow, Ui_MainWindow):
+    # telemetry read rates in Hz
+    TELEMETRY_RATES = {
+        'reg127_phase_error' : 1.0,
+        'reg125_dac_out'     : 1.0,
+        'reg126_pid_out'     : 1.0,
+        'reg124_integral'    : 1.0,
+    }
+    # file the telemetry is appended to (see MonitorRecorder), None to not record
+    TELEMETRY_RECORDING = None
+    # seconds of telemetry history kept
+    HISTORY_SECONDS = 4*60*60
+    # seconds shown per graph while following the newest samples
+    GRAPH_SECONDS = 100
+    # maximum graph redraws per second
+    MAX_FPS = 30
+    # maximum lines kept in the text logs
+    LOG_MAX_LINES = 1000
+    # minimum seconds between logged samples of the same register (0 logs all)
+    TELEMETRY_LOG_PERIOD = 1.0
+
     def __init__(self, FPGAMonitor, GPSMonitor):
         super().__init__()
-        self.cmdLock = Lock()
 
         self.FPGAMonitor = FPGAMonitor
         self.GPSMonitor = GPSMonitor
@@ -82,6 +102,8 @@ class View(QMainWindow, Ui_MainWindow):
         # self._ui = Ui_MainWindow()
         # self._ui.setupUi(self)
         self.setupUi(self)
+        self.FPGALog = TextLogBuffer(self.FPGATextLog, self.LOG_MAX_LINES)
+        self.GPSLog = TextLogBuffer(self.GPSTextLog, self.LOG_MAX_LINES)
         self.setupGPSLogging()
 
         # TODO. See connection Frame TODO in MainWindow.py
@@ -94,34 +116,34 @@ class View(QMainWindow, Ui_MainWindow):
 
         self.CommandComboBox.addItems(self.commandList)
 
-        # TODO make a Graph class
-        self.graph1XVals = []
-        self.graph1YVals = []
-        self.setupGraph1()
-
-        self.graph2XVals = []
-        self.graph2YVals = []
-        self.setupGraph2()
-        
-        self.graph3XVals = []
-        self.graph3YVals = []
-        self.setupGraph3()
-
-        self.graph4XVals = []
-        self.graph4YVals = []
-        self.setupGraph4()
-
-        self.plotTime = 0
+        # graph of each telemetry register
+        self.graphs = {
+            self.FPGAMonitor.CMD_127 : self.Graph1Widget,
+            self.FPGAMonitor.CMD_125 : self.Graph2Widget,
+            self.FPGAMonitor.CMD_126 : self.Graph3Widget,
+            self.FPGAMonitor.CMD_124 : self.Graph4Widget,
+        }
+        self.telemetryStore = TelemetryStore(self.graphs.keys(), seconds=self.HISTORY_SECONDS,
+                                             rate=max(self.TELEMETRY_RATES.values()))
+        # rollups of the whole history, including an earlier recording
+        self.telemetryRollup = TelemetryRollup(self.graphs.keys())
+        if self.TELEMETRY_RECORDING and os.path.exists(self.TELEMETRY_RECORDING):
+            self.telemetryRollup.extend_recording(load_recording(self.TELEMETRY_RECORDING))
+        self.plotStart = time.time()
+        self.setupGraphs()
+        self.setupTelemetry()
 
     def resetCommand(self):
         """
         Reset
         """
         if self.FPGAMonitor.is_connected():
-            self.FPGATextLog.appendPlainText('RESET FPGA')
+            self.FPGALog.append('RESET FPGA')
             cmd = self.FPGAMonitor.get_command(self.FPGAMonitor.CMD_0)
-            self.executeCommand(cmd, self.FPGAMonitor.Command.WRITE, self.FPGAMonitor.CMD_0_RESET_HIGH)
-            self.executeCommand(cmd, self.FPGAMonitor.Command.WRITE, self.FPGAMonitor.CMD_0_RESET_LOW)
+            self.telemetryEngine.submit([
+                (cmd, self.FPGAMonitor.Command.WRITE, self.FPGAMonitor.CMD_0_RESET_HIGH),
+                (cmd, self.FPGAMonitor.Command.WRITE, self.FPGAMonitor.CMD_0_RESET_LOW),
+            ])
             self.clearPlots()
 
     def setupUI(self, MainWindow):
@@ -130,148 +152,196 @@ class View(QMainWindow, Ui_MainWindow):
 
     def setupGPSLogging(self):
         """
-        Set up a thread for displaying GPS logging data
-        """
-        self.worker = GPSThread(self.GPSMonitor)
-        self.worker.log.connect(self.toGPSLog)
-        self.worker.started.connect(lambda: self.toGPSLog('Starting GPS Logging...'))
-        self.worker.finished.connect(lambda: self.toGPSLog('Stopping GPS Logging...'))
-        self.worker.start()
-
-    def setupGraph1(self):
-        self.Graph1worker = GraphThread()
-        self.Graph1worker.signal.connect(self.plotGraph1)
-        self.Graph1worker.started.connect(lambda: print("Start Graph1"))
-        self.Graph1worker.finished.connect(lambda: print("End Graph1"))
-        self.Graph1worker.start()
-
-    def setupGraph2(self):
-        self.Graph2worker = GraphThread()
-        self.Graph2worker.signal.connect(self.plotGraph2)
-        self.Graph2worker.started.connect(lambda: print("Start Graph2"))
-        self.Graph2worker.finished.connect(lambda: print("End Graph2"))
-        self.Graph2worker.start()
-
-    def setupGraph3(self):
-        self.Graph3worker = GraphThread()
-        self.Graph3worker.signal.connect(self.plotGraph3)
-        self.Graph3worker.started.connect(lambda: print("Start Graph3"))
-        self.Graph3worker.finished.connect(lambda: print("End Graph3"))
-        self.Graph3worker.start()
-
-    def setupGraph4(self):
-        self.Graph4worker = GraphThread()
-        self.Graph4worker.signal.connect(self.plotGraph4)
-        self.Graph4worker.started.connect(lambda: print("Start Graph4"))
-        self.Graph4worker.finished.connect(lambda: print("End Graph4"))
-        self.Graph4worker.start()
-
-    def plotGraph1(self, xval, yval):
-        # TODO replace with plotGraph wrapper 
-        if self.FPGAMonitor.is_connected():
-            cmd = self.FPGAMonitor.get_command(self.FPGAMonitor.CMD_127)
-            self.executeCommand(cmd, self.FPGAMonitor.Command.READ)
-            self.FPGATextLog.appendPlainText(str(cmd))
-            # print(cmd)
-            if len(self.graph1XVals) > 100:
-                self.graph1XVals = self.graph1XVals[-100:]
-                self.graph1YVals = self.graph1YVals[-100:]
-            self.graph1YVals.append(cmd.get_read_data())
-            self.graph1XVals.append(self.plotTime)
-            self.Graph1Widget.plot(self.graph1XVals,  self.graph1YVals, pen=pg.mkPen('b', width=3))
-            self.plotTime = self.plotTime + 1
-
-    def plotGraph2(self, xval, yval):
-        # TODO replace with plotGraph wrapper 
-        if self.FPGAMonitor.is_connected():
-            cmd = self.FPGAMonitor.get_command(self.FPGAMonitor.CMD_125)
-            self.executeCommand(cmd, self.FPGAMonitor.Command.READ)
-            self.FPGATextLog.appendPlainText(str(cmd))
-            # print(cmd)
-            if len(self.graph2XVals) > 100:
-                self.graph2XVals = self.graph2XVals[-100:]
-                self.graph2YVals = self.graph2YVals[-100:]
-            self.graph2YVals.append(cmd.get_read_data())
-            self.graph2XVals.append(self.plotTime)
-            self.Graph2Widget.plot(self.graph2XVals,  self.graph2YVals, pen=pg.mkPen('b', width=3))
-
-    def plotGraph3(self, xval, yval):
-        # TODO replace with plotGraph wrapper 
-        if self.FPGAMonitor.is_connected():
-            cmd = self.FPGAMonitor.get_command(self.FPGAMonitor.CMD_126)
-            self.executeCommand(cmd, self.FPGAMonitor.Command.READ)
-            self.FPGATextLog.appendPlainText(str(cmd))
-            # print(cmd)
-            if len(self.graph3XVals) > 100:
-                # print("shifting!")
-                self.graph3XVals = self.graph3XVals[-100:]
-                self.graph3YVals = self.graph3YVals[-100:]
-            self.graph3YVals.append(cmd.get_read_data())
-            self.graph3XVals.append(self.plotTime)
-            self.Graph3Widget.plot(self.graph3XVals,  self.graph3YVals, pen=pg.mkPen('b', width=3))
-
-    def plotGraph4(self, xval, yval):
-        # TODO replace with plotGraph wrapper 
-        if self.FPGAMonitor.is_connected():
-            cmd = self.FPGAMonitor.get_command(self.FPGAMonitor.CMD_124)
-            self.executeCommand(cmd, self.FPGAMonitor.Command.READ)
-            self.FPGATextLog.appendPlainText(str(cmd))
-            # print(cmd)
-            if len(self.graph3XVals) > 100:
-                self.graph4XVals = self.graph4XVals[-100:]
-                self.graph4YVals = self.graph4YVals[-100:]
-            self.graph4YVals.append(cmd.get_read_data())
-            self.graph4XVals.append(self.plotTime)
-            self.Graph4Widget.plot(self.graph4XVals,  self.graph4YVals, pen=pg.mkPen('b', width=3))
-
-    def plotGraph(self, cmd, graphWidget, xval, yval):
-        """
-        Plots a graph widget with the list of values from xvals and yvals
-        """
-        # if self.FPGAMonitor.is_connected():
-        #     cmd = self.FPGAMonitor.get_command(self.FPGAMonitor.CMD_126)
-        #     self.executeCommand(cmd, self.FPGAMonitor.Command.READ)
-        #     print(cmd)
-        #     graphWidget.yVals.append(cmd.get_read_data())
-        #     graphWidget.xVals.append(self.plotTime)
-        #     if len(self.graph3XVals) > 100:
-        #         self.graph3XVals = self.graph3XVals[-100:]
-        #         self.graph3YVals = self.graph3YVals[-100:]
-        #     self.Graph3Widget.plot(self.graph3XVals,  self.graph3YVals)
-        pass
+        Set up the drain that reads the GPS receiver in its own thread and
+        log the receiver state once per navigation epoch.
+        """
+        self.gpsAddresses = self.GPSMonitor.formAddresses(self.GPSMonitor.TALKER_IDS,
+                                                          self.GPSMonitor.SENTENCE_TYPES)
+        self.gpsBridge = TelemetryBridge()
+        self.gpsBridge.log.connect(self.toGPSLog)
+        self.gpsBridge.snapshot.connect(self.displayGNSS)
+        self.gpsDrain = GPSDrain(self.GPSMonitor, addresses=self.gpsAddresses,
+                                 log=self.gpsBridge.log.emit)
+        self.gpsDrain.state.subscribe(self.gpsBridge.snapshot.emit)
+        self.toGPSLog('Starting GPS Logging...')
+        self.gpsDrain.start()
+
+    def displayGNSS(self, snapshot):
+        """
+        Log a GNSSSnapshot of the receiver state on the GPS text log.
+        """
+        tracked = sum(1 for satellite in snapshot.satellites if satellite.snr)
+        self.toGPSLog(f'TIME: {snapshot.time}, FIX: {snapshot.fix_quality}/{snapshot.fix_type}, '
+                      f'LAT: {snapshot.latitude}, LON: {snapshot.longitude}, ALT: {snapshot.altitude}, '
+                      f'SATS: {snapshot.num_sats} used/{tracked} tracked/{len(snapshot.satellites)} in view, '
+                      f'PDOP: {snapshot.pdop}, HDOP: {snapshot.hdop}, VDOP: {snapshot.vdop}')
+
+    def setupTelemetry(self):
+        """
+        Set up the engine that reads the FPGA telemetry in its own thread.
+        """
+        self.telemetryBridge = TelemetryBridge()
+        self.telemetryBridge.samples.connect(self.plotSamples)
+        self.telemetryBridge.log.connect(self.FPGALog.append)
+        self.telemetryEngine = TelemetryEngine(self.FPGAMonitor, rates=self.TELEMETRY_RATES,
+                                               log=self.telemetryBridge.log.emit)
+        self.telemetryEngine.subscribe(self.telemetryBridge.samples.emit)
+        if self.TELEMETRY_RECORDING:
+            # written from the engine thread, independent of the GUI
+            self.telemetryRecorder = TelemetryRecorder(self.TELEMETRY_RECORDING,
+                                                       list(self.TELEMETRY_RATES))
+            self.telemetryEngine.subscribe(self.telemetryRecorder.extend)
+        self.telemetryEngine.start()
+
+    def closeEvent(self, event):
+        """
+        Stop the telemetry engine and the GPS drain threads, then close the
+        recording they write to.
+        """
+        self.renderTimer.stop()
+        if self.telemetryEngine.is_running():
+            self.telemetryEngine.stop()
+        if self.gpsDrain.is_running():
+            self.gpsDrain.stop()
+        if hasattr(self, 'telemetryRecorder'):
+            self.telemetryRecorder.close()
+        super().closeEvent(event)
+
+    def setupGraphs(self):
+        """
+        Create one persistent curve per graph and a timer that redraws the
+        graphs with new samples and flushes the logs at most MAX_FPS times
+        per second. A graph is also redrawn when it is zoomed or panned.
+        """
+        self.curves = {
+            name: graphWidget.plot(pen=pg.mkPen('b', width=3))
+            for name, graphWidget in self.graphs.items()
+        }
+        for name, graphWidget in self.graphs.items():
+            graphWidget.getPlotItem().getViewBox().sigXRangeChanged.connect(
+                lambda viewBox, xRange, name=name: self.graphRangeChanged(name))
+        # live window of each graph at one bucket per pixel, resized on redraw
+        self.decimators = {
+            name: MinMaxDecimator(self.GRAPH_SECONDS, max(1, graphWidget.width()))
+            for name, graphWidget in self.graphs.items()
+        }
+        self.dirtyGraphs = set()
+        self.renderTimer = QTimer(self)
+        self.renderTimer.timeout.connect(self.renderFrame)
+        self.renderTimer.start(int(1000 / self.MAX_FPS))
+
+    def plotSamples(self, samples):
+        """
+        Stores a batch of TelemetrySamples from the telemetry engine and marks
+        their graphs for the next redraw.
+        """
+        self.telemetryStore.extend(samples)
+        self.telemetryRollup.extend(samples)
+        for sample in samples:
+            if sample.name not in self.graphs: continue
+            self.decimators[sample.name].append(sample.timestamp, sample.value)
+            self.FPGALog.appendLimited(sample.name, f'{sample.name} read={sample.value}',
+                                       self.TELEMETRY_LOG_PERIOD)
+            self.dirtyGraphs.add(sample.name)
+
+    def renderFrame(self):
+        """
+        Redraw the graphs and flush the text logs.
+        """
+        self.renderPlots()
+        self.FPGALog.flush()
+        self.GPSLog.flush()
+
+    def renderPlots(self):
+        """
+        Redraw the graphs that have new samples or a new range by updating
+        their curves.
+        """
+        for name in self.dirtyGraphs:
+            self.renderGraph(name)
+        self.dirtyGraphs.clear()
+
+    def renderGraph(self, name):
+        """
+        Update the curve of a graph.
+
+        While the x axis auto ranges, the graph follows the newest
+        GRAPH_SECONDS, decimated to the min/max of each pixel so spikes stay
+        visible at any telemetry rate. Once zoomed or panned, it shows the
+        visible range: the samples if there are at most two per pixel and
+        they are still in the store, else the min/max envelope of the rollup
+        level with about one bucket per pixel. Either way a redraw costs at
+        most a few points per pixel.
+        """
+        viewBox = self.graphs[name].getPlotItem().getViewBox()
+        pixels = max(1, int(viewBox.width()))
+        if viewBox.autoRangeEnabled()[0]:
+            decimator = self.decimators[name]
+            if decimator.buckets != pixels:
+                # the graph was resized, decimate the window again
+                decimator.resize(pixels)
+                times, values = self.telemetryStore.series(name)
+                first = np.searchsorted(times, times[-1] - self.GRAPH_SECONDS) if len(times) else 0
+                decimator.extend(times[first:], values[first:])
+            times, values = decimator.envelope()
+            self.curves[name].setData(times - self.plotStart, values)
+            return
+        start, stop = (x + self.plotStart for x in viewBox.viewRange()[0])
+        times, values = self.telemetryStore.series(name)
+        if len(times) and times[0] <= start:
+            first, last = np.searchsorted(times, [start, stop])
+            if last - first <= 2*pixels:
+                # one more sample on each side to draw the lines to the edges
+                window = slice(max(0, first - 1), last + 1)
+                self.curves[name].setData(times[window] - self.plotStart, values[window])
+                return
+        _, buckets = self.telemetryRollup.pyramids[name].select(start, stop, pixels)
+        x, y = RollupPyramid.envelope(buckets)
+        self.curves[name].setData(x - self.plotStart, y)
+
+    def graphRangeChanged(self, name):
+        """
+        Redraw a zoomed or panned graph with the samples of its new range.
+        """
+        if not self.graphs[name].getPlotItem().getViewBox().autoRangeEnabled()[0]:
+            self.dirtyGraphs.add(name)
 
     def clearPlots(self):
         """
         Clear the Plots on the GUI
         """
-        if self.FPGAMonitor.is_connected():
-            self.Graph1Widget.clear()
-            self.Graph2Widget.clear()
-            self.Graph3Widget.clear()
-            self.Graph4Widget.clear()
-            self.graph1XVals = []
-            self.graph1YVals = []
-            self.graph2XVals = []
-            self.graph2YVals = []
-            self.graph3XVals = []
-            self.graph3YVals = []
-            self.graph4XVals = []
-            self.graph4YVals = []
-            self.plotTime = 0
+        self.telemetryStore.clear()
+        self.telemetryRollup.clear()
+        for decimator in self.decimators.values():
+            decimator.clear()
+        self.plotStart = time.time()
+        for curve in self.curves.values():
+            curve.setData([], [])
+        self.dirtyGraphs.clear()
 
     def toGPSLog(self, txt):
         """
         Display a message on the GPS plain text widget.
         """
-        self.GPSTextLog.appendPlainText(txt)
+        self.GPSLog.append(txt)
 
-    def executeCommand(self, cmd, cmdType, data=None):
-        if self.FPGAMonitor.is_connected():
-            self.cmdLock.acquire()
-            self.FPGAMonitor.execute_command(cmd, cmdType, data)
-            self.cmdLock.release()
+    def executeCommand(self, cmd, cmdType, data=None, log=False):
+        """
+        Submits a command to run on the telemetry engine thread.
+
+        :param log: True to log the command on the FPGA text log when done.
+        """
+        request = (cmd, cmdType) if data is None else (cmd, cmdType, data)
+        self.telemetryEngine.submit([request], self.commandDone if log else None)
+
+    def commandDone(self, result):
+        """
+        Called from the telemetry engine thread when a submitted command is done.
+        """
+        if isinstance(result, Exception):
+            self.telemetryBridge.log.emit(f'Command failed: {result}')
         else:
-            print("Not Connected")
+            self.telemetryBridge.log.emit(str(result[-1]))
 
     @pyqtSlot(bool)
     def pressConnectButton(self):
@@ -282,12 +352,12 @@ class View(QMainWindow, Ui_MainWindow):
             self.FPGAMonitor.connect_uart()
             if self.FPGAMonitor.is_connected():
                 print("Connected!")
-                self.FPGATextLog.appendPlainText("Connected to FPGA!")
+                self.FPGALog.append("Connected to FPGA!")
             else:
-                self.FPGATextLog.appendPlainText("Failed to connect to FPGA!")
+                self.FPGALog.append("Failed to connect to FPGA!")
         else:
             print("Already connected")
-            self.FPGATextLog.appendPlainText("Already connected to FPGA!")
+            self.FPGALog.append("Already connected to FPGA!")
     
     @pyqtSlot(bool)
     def pressDisconnectButton(self):
@@ -296,10 +366,10 @@ class View(QMainWindow, Ui_MainWindow):
         """
         if (self.FPGAMonitor.is_connected()):
             print("Disconnected!")
-            self.FPGATextLog.appendPlainText("Disconnected!")
+            self.FPGALog.append("Disconnected!")
         else:
             print("Not connected")
-            self.FPGATextLog.appendPlainText("Not connected to FPGA")
+            self.FPGALog.append("Not connected to FPGA")
 
     @pyqtSlot(bool)
     def sendCommand(self):
@@ -314,7 +384,7 @@ class View(QMainWindow, Ui_MainWindow):
         if (command == f'Read {self.FPGAMonitor.CMD_0}'):
             cmd = self.FPGAMonitor.get_command_by_id(0)
             # self.FPGAMonitor.execute_command(cmd, self.FPGAMonitor.Command.READ)
-            self.executeCommand(cmd, self.FPGAMonitor.Command.READ)
+            self.executeCommand(cmd, self.FPGAMonitor.Command.READ, log=True)
 
         # Write REG0
         # elif (command == "Write Reg0"):
@@ -337,6 +407,26 @@ class View(QMainWindow, Ui_MainWindow):
         #     self.FPGAMonitor.execute_command(cmd, self.FPGAMonitor.Command.WRITE,
         #         commandVal.encode('utf-8'))
         #     self.FPGATextLog.appendPlainText(str(cmd))
-        self.FPGATextLog.appendPlainText(str(cmd))
         # print("Sent: " + commandVal + command)
         # self.FPGATextLog.appendPlainText("Sent: " + commandVal + command)
+
+
+# Main #########################################################################
+def main():
+    from PyQt5.QtWidgets import QApplication
+    from MonitorFPGA import MonitorFPGA
+    from MonitorFPGAEmulator import FPGAEmulator
+    from MonitorGPSReceiver import MonitorGPSReceiver
+    from MonitorTest import ViewTest
+
+    app = QApplication(sys.argv)
+    emulator = FPGAEmulator()
+    emulator.start()
+    view = View(MonitorFPGA(config=emulator.make_config()), MonitorGPSReceiver())
+    vtester = ViewTest(view)
+    vtester.benchmark_render(hours=4, rate=1.0)
+    view.close()
+    emulator.stop()
+
+if __name__ == '__main__':
+    main()